@@ -1,12 +1,15 @@
 import os
 from ..schema import AgentState
-from ..tools.pptx_parser import get_element_shape_map
+from ..tools.pptx_parser import get_element_shape_map, update_poster_json
 from pptx import Presentation
 from ..tools.pptx_execuator import API_executor
 from typing import List
 import json
 from ..tools import pptx_execuator
-from ..tools.image_tools import convert_pptx_to_png
+from ..tools.image_tools import submit_background_render
+from ..tools.pptx_artifact import PptxArtifact
+from ..tools.image_ingest import clean_media
+from ..config import REVIEW_RENDER_ENGINE, API_PLAN_ATOMIC, KEEP_INTERMEDIATE_PPTX, API_PROFILE
 from pptx.util import Inches, Cm, Pt
 
 
@@ -66,7 +69,19 @@ def code_generation_execution_agent_api(state: AgentState) -> dict:
         api_lines = state.api_list
 
     # 执行
-    error_info = API_executor(api_lines, api_context=None, prs = prs, logger=logger)
+    error_info = API_executor(api_lines, api_context=None, prs = prs, logger=logger, atomic=API_PLAN_ATOMIC,
+                              streamed=state.streamed_api_count, streamed_errors=state.streamed_api_errors)
+    if API_PROFILE:
+        # Per-call timing of this job so far (all iterations), next to plan_apis.json
+        pptx_execuator.get_current_state().profiler.write_json(state.output_dir / "api_profile.json")
+    # Update the poster JSON from the in-memory slide: only the shapes this batch changed are re-extracted
+    poster_changes = pptx_execuator.get_current_state().changes()
+    try:
+        current_poster_json = update_poster_json(state.current_poster_json, poster_changes)
+        logger.info(f"Poster changes: {poster_changes}")
+    except Exception as e:
+        logger.warning(f"Incremental poster JSON update failed, the reviewer will re-parse: {e}")
+        current_poster_json, poster_changes = state.current_poster_json, None
     '''
     for op in sorted_ops:
         try:
@@ -81,13 +96,27 @@ def code_generation_execution_agent_api(state: AgentState) -> dict:
             return {"error": f"Failed to apply operation {op.op_type} on {op.params}: {str(e)}"} # op.params?
         
     '''
-    prs.save(output_path)
-    convert_pptx_to_png(output_path)
+    media_changes = clean_media(prs)
+    if any(media_changes.values()):
+        logger.info(f"Media cleanup: {media_changes}")
+    # Hand the poster on in memory; only kept intermediates go to disk now (the final one in finalize)
+    artifact = PptxArtifact.from_presentation(prs, output_path)
+    # poster_v1.pptx is always written: iterate_debug runs start from it (see graph.parse_pptx_node)
+    if KEEP_INTERMEDIATE_PPTX or iteration == 0:
+        artifact.persist()
+    # Render while the graph moves on; the reviewer awaits it
+    pending_render = submit_background_render(artifact, engine=REVIEW_RENDER_ENGINE)
 
     
     # print(f"\n✓ Successfully applied {len(state.action_plan.operations)} operations")
     return {
         "current_pptx_path": output_path,
+        "current_pptx": artifact,
+        "pending_render": pending_render,
+        "current_poster_json": current_poster_json,
+        "poster_changes": poster_changes,
+        "streamed_api_count": 0,  # the next batch (review adaption) is not streamed
+        "streamed_api_errors": {},
         # "operations_applied": state.action_plan.operations,
         "iteration_count": iteration + 1
     }
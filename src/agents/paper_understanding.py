@@ -5,21 +5,20 @@ from ..schema import AgentState, PaperContent, PaperUnderstandingToolInput, Pape
 from ..prompts.content_prompts import PAPER_UNDERSTANDING_PROMPT_TOOL_GEMINI
 
 # Use Qwen-VL or Qwen-Plus for paper understanding
-from langchain_openai import ChatOpenAI
+from ..tools.llm_clients import get_chat_model
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
 
-from ..config import QWEN3_VL_8B_LOCAL_ENDPOINT, PAPER_UNDERSTANDING_MODEL
+from ..config import QWEN3_VL_8B_LOCAL_ENDPOINT, PAPER_UNDERSTANDING_MODEL, PAPER_TOOL_RENDER_ENGINE, PAPER_TOOL_IMAGE_LEVEL, PAPER_TOOL_IMAGE_MAX_BYTES
 import os   
 import base64
 from pdf2image import convert_from_path
 import asyncio
-_MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "100"))
-_LLM_SEM = asyncio.Semaphore(_MAX_CONCURRENCY)
 from ..tools.utils import _invoke_with_retries, _ainvoke_with_retries
 from io import BytesIO
 from langchain_core.callbacks import UsageMetadataCallbackHandler
 from ..tools.pdf_parser import extract_paper_content
-from ..tools.image_tools import convert_pptx_to_png, encode_image_to_base64
+from ..tools.image_tools import aconvert_pptx_to_png
+from ..tools.render_pyramid import image_data_url
 import json
 from PIL import Image
 from dotenv import load_dotenv
@@ -53,7 +52,8 @@ def create_paper_understanding_tool(state: AgentState):
         logger.info("="*60)
         if not state.no_vlm_in_paper_understanding_tool:
             if 'qwen' in state.model or 'Qwen' in state.model:
-                paper_understanding_llm = ChatOpenAI(
+                paper_understanding_llm = get_chat_model(
+                    "openai",
                     model=state.model or PAPER_UNDERSTANDING_MODEL,
                     temperature=0.1,    
                     base_url=state.base_url or os.getenv("ALIBABA_BASE_URL", "EMPTY"),
@@ -62,8 +62,8 @@ def create_paper_understanding_tool(state: AgentState):
                     # frequency_penalty=0.1
                 )
             elif state.model.startswith('gemini'):
-                from langchain_google_genai import ChatGoogleGenerativeAI
-                paper_understanding_llm = ChatGoogleGenerativeAI(
+                paper_understanding_llm = get_chat_model(
+                    "google",
                     model=state.model or PAPER_UNDERSTANDING_MODEL,
                     temperature=0.1,
                     api_key=os.getenv("GOOGLE_API_KEY", state.api_key or "EMPTY"),
@@ -97,8 +97,8 @@ def create_paper_understanding_tool(state: AgentState):
         )
 
         # Step 2: Prepare prompt with poster + instruction + (optional) plan summary # TODO: remove or replace poster_json, filterout position info? png image?
-        png_with_labels_path = convert_pptx_to_png(state.current_pptx_path)
-        image_base64 = encode_image_to_base64(png_with_labels_path)            # TODO: message's order? prompt_text first?
+        png_with_labels_path = await aconvert_pptx_to_png(state.current_pptx or state.current_pptx_path, engine=PAPER_TOOL_RENDER_ENGINE)
+        image_url = await asyncio.to_thread(image_data_url, png_with_labels_path, PAPER_TOOL_IMAGE_LEVEL, PAPER_TOOL_IMAGE_MAX_BYTES)            # TODO: message's order? prompt_text first?
         if 'qwen' in state.model or 'Qwen' in state.model:    # TODO: poster_json? image's resolution?
             ocr = True # for qwen-vl-30B
             if not ocr:
@@ -111,7 +111,7 @@ def create_paper_understanding_tool(state: AgentState):
                 )
                 prompt = [
                     HumanMessage(content=[{"type": "text", "text": prompt_text},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}])
+                    {"type": "image_url", "image_url": {"url": image_url}}])
                 ]
             else:
                 paper_content_extract_result = PaperContentExtractionResult(
@@ -138,7 +138,7 @@ def create_paper_understanding_tool(state: AgentState):
                         content= image_list + [
                             {"type": "text", "text": prompt_text},
                         ] + [{"type": "text", "text": "Poster image:"}] + 
-                        [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}]
+                        [{"type": "image_url", "image_url": {"url": image_url}}]
                     )
                 ]
             if state.no_vlm_in_paper_understanding_tool:
@@ -203,7 +203,7 @@ def create_paper_understanding_tool(state: AgentState):
                             {"type": "file", "source_type": "base64", "name": os.path.basename(state.pdf_path), "data": pdf_base64},
                             {"type": "text", "text": prompt_text},
                             {"type": "text", "text": "Poster image:"},
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}
+                            {"type": "image_url", "image_url": {"url": image_url}}
                             ])
                     ]
                     if state.no_vlm_in_paper_understanding_tool:
@@ -254,7 +254,7 @@ def create_paper_understanding_tool(state: AgentState):
                             content= image_list + [
                                 {"type": "text", "text": prompt_text},
                             ] + [{"type": "text", "text": "Poster image:"}] + 
-                            [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}]
+                            [{"type": "image_url", "image_url": {"url": image_url}}]
                         )
                     ]
                     if state.no_vlm_in_paper_understanding_tool:
@@ -303,7 +303,7 @@ def create_paper_understanding_tool(state: AgentState):
                             content= image_list + [
                                 {"type": "text", "text": prompt_text},
                             ] + [{"type": "text", "text": "Poster image:"}] + 
-                            [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}]
+                            [{"type": "image_url", "image_url": {"url": image_url}}]
                         )
                     ]
                     if state.no_vlm_in_paper_understanding_tool:
@@ -339,28 +339,24 @@ def create_paper_understanding_tool(state: AgentState):
             try:
                 cb = UsageMetadataCallbackHandler()
                 structured = paper_understanding_llm.with_structured_output(PaperUnderstandingToolOutput) # TODO: when structured output, how the model know the detailed meaning of each field??
-                async with _LLM_SEM:
-
-                    result: PaperUnderstandingToolOutput = await _ainvoke_with_retries(
-                        structured,
-                        prompt,
-                        logger=logger,
-                        max_retries=10,
-                        config={"callbacks": [cb]},
-                    )
+                result: PaperUnderstandingToolOutput = await _ainvoke_with_retries(
+                    structured,
+                    prompt,
+                    logger=logger,
+                    max_retries=10,
+                    config={"callbacks": [cb]},
+                )
                 logger.info(cb.usage_metadata)
             except:
                 cb = UsageMetadataCallbackHandler()
                 structured = paper_understanding_llm.with_structured_output(PaperUnderstandingToolOutput)
-                async with _LLM_SEM:
-
-                    result: PaperUnderstandingToolOutput = await _ainvoke_with_retries(
-                        structured,
-                        prompt,
-                        logger=logger,
-                        max_retries=10,
-                        config={"callbacks": [cb]},
-                    )
+                result: PaperUnderstandingToolOutput = await _ainvoke_with_retries(
+                    structured,
+                    prompt,
+                    logger=logger,
+                    max_retries=10,
+                    config={"callbacks": [cb]},
+                )
                 logger.info(cb.usage_metadata)
             # Extract detailed info for selected figures/tables
             if result.extracted_figures_tables:
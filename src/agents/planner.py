@@ -4,20 +4,19 @@ from ..schema import AgentState, Plan_APIs
 from ..prompts.planner_toolcall_prompts import (
     PLANNER_APICODE_WITH_TOOL_USER_PROMPT_WITHOUT_FILTER_WITHOUT_ID_POSTION,
 )
-from ..tools.image_tools import convert_pptx_to_png, encode_image_to_base64
+from ..tools.image_tools import aconvert_pptx_to_png
+from ..tools.render_pyramid import image_data_url
 from ..tools.utils import _invoke_with_retries, _ainvoke_with_retries
 
 # Initialize Qwen model for planning
 # Note: You can also use vllm or other Qwen deployment methods
-from langchain_openai import ChatOpenAI
+from ..tools.llm_clients import get_chat_model
 from langchain_community.chat_models import ChatZhipuAI
-from ..config import QWEN3_8B_LOCAL_ENDPOINT, QWEN3_VL_8B_LOCAL_ENDPOINT, PLANNER_MODEL
+from ..config import QWEN3_8B_LOCAL_ENDPOINT, QWEN3_VL_8B_LOCAL_ENDPOINT, PLANNER_MODEL, PLANNER_RENDER_ENGINE, PLANNER_IMAGE_LEVEL, PLANNER_IMAGE_MAX_BYTES, PLAN_DRY_RUN_RETRIES, PLAN_STREAMING
 import os
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-from langchain_google_genai import ChatGoogleGenerativeAI, Modality
+from langchain_google_genai import Modality
 import asyncio
-_MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "100"))
-_LLM_SEM = asyncio.Semaphore(_MAX_CONCURRENCY)
 import base64
 
 from dotenv import load_dotenv
@@ -28,11 +27,61 @@ import json
 from ..tools.pptx_parser import PosterFilter
 from ..tools.api_doc import generate_api_documentation
 from .paper_understanding import create_paper_understanding_tool
+from ..tools.plan_validator import validate_plan, format_violations
+from ..tools.plan_stream import PlanStreamExecutor, astream_plan
+from ..tools import pptx_execuator
 from pydantic import parse_obj_as
 from dotenv import load_dotenv
 load_dotenv()
 
 
+async def _ainvoke_planner(llm, messages: list, streamer: Optional[PlanStreamExecutor], logger):
+    """Planner call that may answer with Plan_APIs; streamed into `streamer` when PLAN_STREAMING is on."""
+    if streamer is None:
+        return await _ainvoke_with_retries(llm, messages, logger=logger, max_retries=10)
+    return await astream_plan(llm, messages, streamer, logger=logger, max_retries=10)
+
+
+async def _repair_plan(plan: Plan_APIs, messages: list, planner_llm, state: AgentState, logger) -> Plan_APIs:
+    """Dry-run the plan against the poster JSON; re-prompt with every violation until it is clean or retries run out."""
+    pptx_folder = os.path.dirname(str(state.pptx_path))
+    for attempt in range(PLAN_DRY_RUN_RETRIES + 1):
+        violations = validate_plan(plan.api_list, state.current_poster_json or state.poster_json, pptx_folder)
+        if not violations:
+            return plan
+        report = format_violations(violations)
+        logger.info(f"Plan dry run found {len(violations)} violation(s):\n{report}")
+        if attempt == PLAN_DRY_RUN_RETRIES:
+            return plan
+        # The Plan_APIs tool message may follow no AIMessage with that tool call (direct Plan_APIs answer):
+        # replace it by the plan as plain assistant text so the follow-up request is a valid conversation
+        if messages and isinstance(messages[-1], ToolMessage) and not any(
+                isinstance(m, AIMessage) and any(c['id'] == messages[-1].tool_call_id for c in m.tool_calls) for m in messages):
+            messages[-1] = AIMessage(content=plan.model_dump_json())
+        messages.append(HumanMessage(content=(
+            "A dry run of your api_list against the poster JSON found these problems "
+            "(nothing has been executed yet):\n" + report +
+            "\nReturn the complete corrected plan with Plan_APIs."
+        )))
+        response = await _ainvoke_with_retries(
+            planner_llm.bind_tools([Plan_APIs], tool_choice='Plan_APIs'),
+            messages,
+            logger=logger,
+            max_retries=10,
+        )
+        if not getattr(response, 'tool_calls', None):
+            logger.warning("Planner did not return a corrected plan, keeping the previous one.")
+            return plan
+        tool_call = response.tool_calls[0]
+        plan = Plan_APIs(**tool_call['args'])
+        messages.append(response)
+        messages.append(ToolMessage(
+            content="Here is your structured response: " + str(tool_call['args']),
+            tool_call_id=tool_call['id']
+        ))
+    return plan
+
+
 async def planning_code_with_tools(state: AgentState) -> dict:
     """
     Planning Agent with Paper Understanding Tool.
@@ -47,7 +96,8 @@ async def planning_code_with_tools(state: AgentState) -> dict:
     
     # Create LLM with tool binding
     if 'qwen' in state.model or 'Qwen' in state.model:
-        planner_llm = ChatOpenAI(
+        planner_llm = get_chat_model(
+            "openai",
             model=state.model or PLANNER_MODEL,
             temperature=0.1, # 0.1
             base_url=state.base_url or os.getenv("ALIBABA_BASE_URL", "EMPTY"),
@@ -55,7 +105,8 @@ async def planning_code_with_tools(state: AgentState) -> dict:
             max_tokens=4096,
         )
     elif state.model.startswith('gemini'):
-        planner_llm = ChatGoogleGenerativeAI(
+        planner_llm = get_chat_model(
+            "google",
             model=state.model or PLANNER_MODEL,
             temperature=0.1,
             max_output_tokens=4096,
@@ -71,10 +122,10 @@ async def planning_code_with_tools(state: AgentState) -> dict:
     paper_tool = create_paper_understanding_tool(state)
     query_paper = None
     # Prepare image
-    png_with_labeled_path = convert_pptx_to_png(
-        state.current_pptx_path
+    png_with_labeled_path = await aconvert_pptx_to_png(
+        state.current_pptx or state.current_pptx_path, engine=PLANNER_RENDER_ENGINE
     )    
-    image_base64 = encode_image_to_base64(png_with_labeled_path)
+    image_url = await asyncio.to_thread(image_data_url, png_with_labeled_path, PLANNER_IMAGE_LEVEL, PLANNER_IMAGE_MAX_BYTES)
 
     # Bind tool to LLM
     if 'qwen' in state.model or 'Qwen' in state.model:
@@ -91,7 +142,7 @@ async def planning_code_with_tools(state: AgentState) -> dict:
         user_instruction=state.user_instruction,
         python_functions_api = generate_api_documentation()
     )                  
-    example_image_base64 =  encode_image_to_base64("./benchmark_withpostergen_flat_final/ICLR-2024-4-Butterfly_Effects_of_SGD_Noise_Error_Amplification_in_Behavior_Cloning_and_Autoregression/ByPosterGen.png")
+    example_image_url = await asyncio.to_thread(image_data_url, "./benchmark_withpostergen_flat_final/ICLR-2024-4-Butterfly_Effects_of_SGD_Noise_Error_Amplification_in_Behavior_Cloning_and_Autoregression/ByPosterGen.png", PLANNER_IMAGE_LEVEL, PLANNER_IMAGE_MAX_BYTES)
     text_image_description = ""
 
     
@@ -104,14 +155,14 @@ async def planning_code_with_tools(state: AgentState) -> dict:
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{image_base64}"}
+                    "image_url": {"url": image_url}
                 },
                 {
                     "type": "text", "text": f"Image #2: Example poster format{text_image_description}:"
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{example_image_base64}"}
+                    "image_url": {"url": example_image_url}
                 }
         ])
     ]
@@ -122,27 +173,18 @@ async def planning_code_with_tools(state: AgentState) -> dict:
 
     # Track paper understanding results
     paper_understanding_result = None
+    # Execute api_list lines while the Plan_APIs call is still streaming (see tools/plan_stream)
+    streamer = PlanStreamExecutor(
+        pptx_execuator.get_current_state().prs, state.current_poster_json or state.poster_json,
+        os.path.dirname(str(state.pptx_path)), logger,
+    ) if PLAN_STREAMING else None
     
     try:
         # First call - may include tool calls
         try:
-            async with _LLM_SEM:
-
-                response = await _ainvoke_with_retries(
-                    llm_with_tools,
-                    messages,
-                    logger=logger,
-                    max_retries=10,
-                )
+            response = await _ainvoke_planner(llm_with_tools, messages, streamer, logger)
         except:
-            async with _LLM_SEM:
-
-                response = await _ainvoke_with_retries(
-                    llm_with_tools,
-                    messages,
-                    logger=logger,
-                    max_retries=10,
-                )
+            response = await _ainvoke_planner(llm_with_tools, messages, streamer, logger)
             logger.info(f"Initial planner response received after retry.")
         logger.info(f"Initial planner response received. {response}")
         # Check if tool was called
@@ -208,25 +250,12 @@ async def planning_code_with_tools(state: AgentState) -> dict:
                     
                     llm_with_tools = planner_llm.bind_tools([Plan_APIs], tool_choice='Plan_APIs')
                     try:
-                        async with _LLM_SEM:
-
-                            response = await _ainvoke_with_retries(
-                                llm_with_tools,
-                                messages,
-                                logger=logger,
-                                max_retries=10,
-                            )
+                        response = await _ainvoke_planner(llm_with_tools, messages, streamer, logger)
                     except:
                         with open(state.output_dir / "planner_code_with_tools_prompt_for_GeminiChat_error.txt", "w", encoding="utf-8") as f:
                             for msg in messages:
                                 f.write(msg.model_dump_json() + "\n")
-                        async with _LLM_SEM:
-                            response = await _ainvoke_with_retries(
-                                llm_with_tools,
-                                messages,
-                                logger=logger,
-                                max_retries=10,
-                            )
+                        response = await _ainvoke_planner(llm_with_tools, messages, streamer, logger)
                     logger.info(f"Second planner response received after paper understanding tool.{response}")
                 if not (state.output_dir/ "poster_v1_image.png").exists():
                     # os.remove(state.output_dir/ "poster_v1_image.png")
@@ -254,6 +283,13 @@ async def planning_code_with_tools(state: AgentState) -> dict:
             messages.append(response)
         
         plan = response
+        if isinstance(plan, Plan_APIs):
+            plan = await _repair_plan(plan, messages, planner_llm, state, logger)
+        streamed, streamed_errors = 0, {}
+        if streamer is not None:
+            streamed, streamed_errors = streamer.finish(plan.api_list if isinstance(plan, Plan_APIs) else None)
+            with open(state.output_dir / "plan_stream.json", "w", encoding="utf-8") as f:
+                json.dump(streamer.stats(), f, indent=2)
 
         
         logger.info(f"Plan_code created: {plan.model_dump_json(indent=2)}")
@@ -265,6 +301,8 @@ async def planning_code_with_tools(state: AgentState) -> dict:
             "plan_apis": plan,
             # "action_plan": ActionPlan(operations=plan.operations),
             "api_list": plan.api_list,
+            "streamed_api_count": streamed,
+            "streamed_api_errors": streamed_errors,
             "query_paper": query_paper,
             "messages": messages
             }
@@ -286,5 +324,11 @@ async def planning_code_with_tools(state: AgentState) -> dict:
         return result
         
     except Exception as e:
+        if streamer is not None:
+            streamer.abort(f"planning failed: {e}")
         logger.error(f"Planning with tools failed: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+    except BaseException:
+        if streamer is not None:
+            streamer.cancel("planning cancelled")
+        raise
\ No newline at end of file
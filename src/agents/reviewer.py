@@ -2,12 +2,14 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from ..schema import AgentState, PosterJSON, ReviewAdaptionResultNew
 from ..prompts.review_layout_prompts import REVIEW_ADAPTION_PROMPT_ITERATIVE_SIGNIFICANTLY_new
-from ..tools.image_tools import convert_pptx_to_png, encode_image_to_base64
-from ..tools.pptx_parser import parse_pptx_to_json, PosterFilter, parse_pptx_to_json_for_review
-from ..tools.utils import extract_llm_result
+from ..tools.image_tools import aconvert_pptx_to_png
+from ..tools.render_pyramid import image_data_url
+from ..tools.pptx_parser import parse_pptx_to_json, PosterFilter, parse_pptx_to_json_for_review, write_poster_layout
+from ..tools.utils import aextract_llm_result
+from ..tools.poster_diff import diff_posters, skeleton
 # Use Qwen-VL for visual review
-from langchain_openai import ChatOpenAI
-from ..config import QWEN3_VL_8B_LOCAL_ENDPOINT, REVIEW_MODEL, PLANNER_MODEL
+from ..tools.llm_clients import get_chat_model
+from ..config import QWEN3_VL_8B_LOCAL_ENDPOINT, REVIEW_MODEL, PLANNER_MODEL, REVIEW_RENDER_ENGINE, REVIEW_IMAGE_LEVEL, REVIEW_IMAGE_MAX_BYTES, REVIEW_POSTER_JSON_MODE
 import os   
 from dotenv import load_dotenv
 load_dotenv()
@@ -16,9 +18,16 @@ import re
 from ..tools.utils import _invoke_with_retries
 import asyncio
 
-# Global limiter for all LLM calls in this module
-_MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "100"))
-_LLM_SEM = asyncio.Semaphore(_MAX_CONCURRENCY)
+
+async def _await_edited_render(state: AgentState):
+    """Reuse the background render started after the poster was saved; render now if there is none or it failed."""
+    if state.pending_render is not None:
+        try:
+            return await asyncio.wrap_future(state.pending_render)
+        except Exception as e:
+            state.logger.warning(f"Background render failed, rendering again: {e}")
+    return await aconvert_pptx_to_png(state.current_pptx or state.current_pptx_path, engine=REVIEW_RENDER_ENGINE)
+
     
 async def review_adaption_agent(state: AgentState) -> dict:
     """
@@ -34,7 +43,8 @@ async def review_adaption_agent(state: AgentState) -> dict:
     
     # Initialize LLM
     if 'qwen' in state.model or 'Qwen' in state.model:
-        adaption_llm = ChatOpenAI(
+        adaption_llm = get_chat_model(
+            "openai",
             model=state.model or PLANNER_MODEL,
             temperature=0.1, # 0.1
             base_url=state.base_url or os.getenv("ALIBABA_BASE_URL", "EMPTY"),
@@ -42,8 +52,8 @@ async def review_adaption_agent(state: AgentState) -> dict:
             max_tokens=4096,
         )
     elif state.model.startswith('gemini'):
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        adaption_llm = ChatGoogleGenerativeAI(
+        adaption_llm = get_chat_model(
+            "google",
             model=state.model or PLANNER_MODEL,
             temperature=0.1,
             api_key=os.getenv("GOOGLE_API_KEY", state.api_key or "EMPTY"),
@@ -52,67 +62,93 @@ async def review_adaption_agent(state: AgentState) -> dict:
             thinking_level='low',   #'low',
             include_thoughts=False,  # Include reasoning steps
         )
-    # Parse current poster state
+    # Convert posters to PNG; both renders overlap with parsing and prompt building below
+    original_render = asyncio.ensure_future(aconvert_pptx_to_png(state.pptx_path, engine=REVIEW_RENDER_ENGINE))
+    edited_render = asyncio.ensure_future(_await_edited_render(state))
+
     try:
-        current_poster_json = state.current_poster_json = parse_pptx_to_json_for_review(state.current_pptx_path)
-        # logger.info(f"Parsed current poster JSON for review with {current_poster_json.model_dump_json(indent=2, exclude_unset=True)} elements.")
-    except Exception as e:
-        logger.error(f"Failed to parse PPTX for review: {e}")
-        return {"error": f"Failed to parse PPTX for review: {e}"}
-    
-    # Convert posters to PNG 
-    original_png_path_with_labels = convert_pptx_to_png(state.pptx_path)
-    edited_png_path_with_labels = convert_pptx_to_png(state.current_pptx_path)
-    
-    # Encode images
-    original_base64 = encode_image_to_base64(original_png_path_with_labels)
-    edited_base64 = encode_image_to_base64(edited_png_path_with_labels)
+        # Parse current poster state (already up to date when the executor tracked its changes)
+        try:
+            if state.poster_changes is not None and state.current_poster_json is not None:
+                current_poster_json = state.current_poster_json
+                write_poster_layout(current_poster_json, state.current_pptx_path)
+            else:
+                source = state.current_pptx.stream() if state.current_pptx is not None else None
+                current_poster_json = state.current_poster_json = parse_pptx_to_json_for_review(state.current_pptx_path, source=source)
+            # logger.info(f"Parsed current poster JSON for review with {current_poster_json.model_dump_json(indent=2, exclude_unset=True)} elements.")
+        except Exception as e:
+            logger.error(f"Failed to parse PPTX for review: {e}")
+            return {"error": f"Failed to parse PPTX for review: {e}"}
     
-    # Prepare prompt # TODO: need filter? if filter, when the surrounding element are not included, may constrain the adaption 
-    continue_messages = False
-    ablation = ""
-    if not continue_messages:
-        revised_json_increment = PosterJSON(**PosterFilter.filter_revised_json(
-            original_json=state.poster_json,
-            revised_json=current_poster_json,
-            all_revised_field=True if state.iterate_version == 'all_revised_field' else False,
-        ))
+        # Prepare prompt # TODO: need filter? if filter, when the surrounding element are not included, may constrain the adaption 
+        continue_messages = False
+        ablation = ""
+        if not continue_messages:
+            revised_json_increment = PosterJSON(**PosterFilter.filter_revised_json(
+                original_json=state.poster_json,
+                revised_json=current_poster_json,
+                all_revised_field=True if state.iterate_version == 'all_revised_field' else False,
+            ))
         
-        plan_apis, paper_content_extracted = None, None
-        with open(state.output_dir / "plan_apis.json", "r") as f:
-            plan_apis = json.load(f)
-        if (state.output_dir / "paper_content_extracted.json").exists():
-            with open(state.output_dir / "paper_content_extracted.json", "r") as f:
-                paper_content_extracted = f.read()
-        if (state.output_dir/ "extracted_visuals_details.json").exists():
-            with open(state.output_dir / "extracted_visuals_details.json", "r") as f:
-                state.extracted_visuals_details = json.load(f)
-        prompt_text = REVIEW_ADAPTION_PROMPT_ITERATIVE_SIGNIFICANTLY_new.substitute(
-            user_instruction=state.user_instruction,
-            ablation = ablation, 
-            plan = json.dumps(plan_apis, indent=2) if plan_apis else "Not available",
-            poster_json = state.poster_json.model_dump_json(indent=2, exclude_unset=True, exclude_defaults=True, exclude={'elements': {'__all__': {'runs': True}}}) if not state.preserve_runs else state.poster_json.model_dump_json(indent=2, exclude_unset=True, exclude_defaults=True,),
-            revised_json_increment=revised_json_increment.model_dump_json(indent=2, exclude_none=True,exclude_defaults=True, exclude={'elements': {'__all__': {'runs': True}}}),
-            paper_content_extracted=paper_content_extracted if paper_content_extracted else "Not available",
-            extracted_visuals_details=json.dumps(state.extracted_visuals_details, indent=2) if state.extracted_visuals_details else "Not available",
-            python_functions_api=get_api_details(),
-        )
+            plan_apis, paper_content_extracted = None, None
+            with open(state.output_dir / "plan_apis.json", "r") as f:
+                plan_apis = json.load(f)
+            if (state.output_dir / "paper_content_extracted.json").exists():
+                with open(state.output_dir / "paper_content_extracted.json", "r") as f:
+                    paper_content_extracted = f.read()
+            if (state.output_dir/ "extracted_visuals_details.json").exists():
+                with open(state.output_dir / "extracted_visuals_details.json", "r") as f:
+                    state.extracted_visuals_details = json.load(f)
+            if state.review_adaption_result is None or REVIEW_POSTER_JSON_MODE == "full":
+                poster_json_text = state.poster_json.model_dump_json(indent=2, exclude_unset=True, exclude_defaults=True, exclude={'elements': {'__all__': {'runs': True}}}) if not state.preserve_runs else state.poster_json.model_dump_json(indent=2, exclude_unset=True, exclude_defaults=True,)
+            else:
+                # Later reviews: what changed relative to the original, plus where everything else sits
+                poster_diff = diff_posters(state.poster_json, current_poster_json)
+                logger.info(f"Poster diff vs original: {poster_diff.summary()}")
+                poster_json_text = (
+                    f"\n// slide_width: {state.poster_json.slide_width}, slide_height: {state.poster_json.slide_height}"
+                    f"\n// changed elements, original -> current edited poster ([old, new] per field; run changes by run index i):\n"
+                    + poster_diff.to_prompt()
+                    + "\n// unchanged elements (geometry only):\n"
+                    + skeleton(state.poster_json, poster_diff.unchanged_ids)
+                )
+            prompt_text = REVIEW_ADAPTION_PROMPT_ITERATIVE_SIGNIFICANTLY_new.substitute(
+                user_instruction=state.user_instruction,
+                ablation = ablation, 
+                plan = json.dumps(plan_apis, indent=2) if plan_apis else "Not available",
+                poster_json = poster_json_text,
+                revised_json_increment=revised_json_increment.model_dump_json(indent=2, exclude_none=True,exclude_defaults=True, exclude={'elements': {'__all__': {'runs': True}}}),
+                paper_content_extracted=paper_content_extracted if paper_content_extracted else "Not available",
+                extracted_visuals_details=json.dumps(state.extracted_visuals_details, indent=2) if state.extracted_visuals_details else "Not available",
+                python_functions_api=get_api_details(),
+            )
     
-    # Create message with both images
-    with open(state.output_dir / f"revised_json_increment_{continue_messages}_{state.timestamp}.json", "w") as f:
-        f.write(prompt_text)
+        # Create message with both images
+        with open(state.output_dir / f"revised_json_increment_{continue_messages}_{state.timestamp}.json", "w") as f:
+            f.write(prompt_text)
+
+        original_png_path_with_labels, edited_png_path_with_labels = await asyncio.gather(original_render, edited_render)
+    finally:
+        # parsing / prompt building or the other render failed: do not leave a render running
+        for task in (original_render, edited_render):
+            if not task.done():
+                task.cancel()
+    original_image_url, edited_image_url = await asyncio.gather(
+        asyncio.to_thread(image_data_url, original_png_path_with_labels, REVIEW_IMAGE_LEVEL, REVIEW_IMAGE_MAX_BYTES),
+        asyncio.to_thread(image_data_url, edited_png_path_with_labels, REVIEW_IMAGE_LEVEL, REVIEW_IMAGE_MAX_BYTES),
+    )
     if not continue_messages:
         message_content = [
             {"type": "text", "text": prompt_text},
             {"type": "text", "text": f"Image #1: Original Poster before editing {ablation}:"},
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{original_base64}"}
+                "image_url": {"url": original_image_url}
             },
             {"type": "text", "text": f"Image #2: Edited Poster after executing api list provided above {ablation}:"},
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{edited_base64}"}
+                "image_url": {"url": edited_image_url}
             },
         ]
     
@@ -135,17 +171,13 @@ async def review_adaption_agent(state: AgentState) -> dict:
         if 'qwen' in state.model or 'Qwen' in state.model or state.model.startswith('gemini'):
             try:
                 # result = await extract_llm_result(state.model, messages, adaption_llm, ReviewAdaptionResultNew, state.logger)  #ReviewAdaptionResultNew\
-                async with _LLM_SEM:
-
-                    result = await asyncio.to_thread(
-                        extract_llm_result,
-                        state.model,
-                        messages,
-                        adaption_llm,
-                        ReviewAdaptionResultNew,
-                        state.logger
-                    )
-                
+                result = await aextract_llm_result(
+                    state.model,
+                    messages,
+                    adaption_llm,
+                    ReviewAdaptionResultNew,
+                    state.logger
+                )
             except Exception as e:
                 logger.error(f"First extraction attempt failed: {e}")
                 with open(state.output_dir / f"review_prompt_fallback_{continue_messages}_{state.timestamp}.jsonl", "w") as f:
@@ -153,17 +185,13 @@ async def review_adaption_agent(state: AgentState) -> dict:
                         f.write(msg.model_dump_json() + "\n")
                 # Retry extraction
                 # result = await extract_llm_result(state.model, messages, adaption_llm, ReviewAdaptionResultNew, state.logger)  # ReviewAdaptionResult
-                async with _LLM_SEM:
-
-                    result = await asyncio.to_thread(
-                        extract_llm_result,
-                        state.model,
-                        messages,
-                        adaption_llm,
-                        ReviewAdaptionResultNew,
-                        state.logger
-                    )
-            
+                result = await aextract_llm_result(
+                    state.model,
+                    messages,
+                    adaption_llm,
+                    ReviewAdaptionResultNew,
+                    state.logger
+                )
         messages_this_agent.append(AIMessage(content=result.model_dump_json(indent=2)))
         
         logger.info(f"\n✓ REVIEW_ADAPTION_PROMPT_ITERATIVE Completed. Result:\n{result.model_dump_json(indent=2)}\n")
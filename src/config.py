@@ -40,6 +40,68 @@ ACCEPTABLE_SCORE_THRESHOLD = 75.0
 OVERLAP_IOU_THRESHOLD = 0.05         # Elements with IoU > this are considered overlapping
 MARGIN_POINTS = 20.0                 # Minimum margin from slide edges
 
+# --- Rendering (persistent LibreOffice workers) ---
+
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", "2"))                     # Number of warm soffice instances
+RENDER_TIMEOUT_S = float(os.getenv("RENDER_TIMEOUT_S", "120"))                 # Per-conversion timeout
+RENDER_STARTUP_TIMEOUT_S = float(os.getenv("RENDER_STARTUP_TIMEOUT_S", "60"))  # Max time for a worker to come up
+RENDER_HEALTH_INTERVAL_S = float(os.getenv("RENDER_HEALTH_INTERVAL_S", "30"))  # Idle-worker health check period
+RENDER_MAX_JOBS_PER_WORKER = int(os.getenv("RENDER_MAX_JOBS_PER_WORKER", "200"))  # Recycle worker after N conversions
+
+# --- Draft rendering (Pillow rasterizer, no LibreOffice) ---
+
+DRAFT_RENDER_DPI = float(os.getenv("DRAFT_RENDER_DPI", "96"))        # Pixels per inch of the draft PNG
+DRAFT_RENDER_MAX_PX = int(os.getenv("DRAFT_RENDER_MAX_PX", "2400"))  # Cap on the long side of the draft PNG
+# Render engine per call site: "libreoffice" (exact) or "draft" (fast approximation)
+PLANNER_RENDER_ENGINE = os.getenv("PLANNER_RENDER_ENGINE", "draft")
+PAPER_TOOL_RENDER_ENGINE = os.getenv("PAPER_TOOL_RENDER_ENGINE", "draft")
+REVIEW_RENDER_ENGINE = os.getenv("REVIEW_RENDER_ENGINE", "libreoffice")
+
+# --- VLM image payloads (render pyramid) ---
+
+PYRAMID_THUMB_PX = int(os.getenv("PYRAMID_THUMB_PX", "512"))     # Long side of the "thumb" level
+PYRAMID_REVIEW_PX = int(os.getenv("PYRAMID_REVIEW_PX", "1600"))  # Long side of the "review" level ("full" = native)
+VLM_IMAGE_FORMAT = os.getenv("VLM_IMAGE_FORMAT", "webp")          # webp | jpeg | png (256-color quantized)
+VLM_IMAGE_QUALITY = int(os.getenv("VLM_IMAGE_QUALITY", "80"))     # Starting quality for lossy formats
+# Resolution level and byte budget (raw bytes, before base64) of the poster image per agent
+PLANNER_IMAGE_LEVEL = os.getenv("PLANNER_IMAGE_LEVEL", "review")
+PLANNER_IMAGE_MAX_BYTES = int(os.getenv("PLANNER_IMAGE_MAX_BYTES", "400000"))
+PAPER_TOOL_IMAGE_LEVEL = os.getenv("PAPER_TOOL_IMAGE_LEVEL", "review")
+PAPER_TOOL_IMAGE_MAX_BYTES = int(os.getenv("PAPER_TOOL_IMAGE_MAX_BYTES", "250000"))
+REVIEW_IMAGE_LEVEL = os.getenv("REVIEW_IMAGE_LEVEL", "review")
+REVIEW_IMAGE_MAX_BYTES = int(os.getenv("REVIEW_IMAGE_MAX_BYTES", "500000"))
+
+# --- Image ingest (insert_image / replace_image) ---
+
+IMAGE_INGEST = os.getenv("IMAGE_INGEST", "1") == "1"                          # Downsample / re-encode figures to their box
+IMAGE_INGEST_DPI = float(os.getenv("IMAGE_INGEST_DPI", "200"))                 # Print resolution kept for embedded figures
+IMAGE_INGEST_JPEG_QUALITY = int(os.getenv("IMAGE_INGEST_JPEG_QUALITY", "90"))  # For photographic figures (flat ones stay PNG)
+
+# --- PPTX parsing ---
+
+PPTX_PARSER_ENGINE = os.getenv("PPTX_PARSER_ENGINE", "lxml")  # lxml (single XPath pass) | python-pptx (proxy walk)
+# Original poster in the reviewer prompt: "full" JSON every time, or "diff" = full on the first
+# review, then the structural diff against the edited poster plus the geometry of unchanged elements
+REVIEW_POSTER_JSON_MODE = os.getenv("REVIEW_POSTER_JSON_MODE", "diff")
+
+# --- API execution ---
+
+# Each API call always runs in its own savepoint (rolled back on failure); with this set,
+# the whole plan is one transaction and any failing line aborts all of it
+API_PLAN_ATOMIC = os.getenv("API_PLAN_ATOMIC", "0") == "1"
+# Dry-run each plan against the PosterJSON before execution; re-prompt the planner this many times
+# with the full violation list (0 = only log violations)
+PLAN_DRY_RUN_RETRIES = int(os.getenv("PLAN_DRY_RUN_RETRIES", "1"))
+# Fuse consecutive run-formatting calls, collapse relative moves, drop overwritten geometry setters
+API_PLAN_OPTIMIZE = os.getenv("API_PLAN_OPTIMIZE", "1") == "1"
+# Stream the planner's Plan_APIs call and execute each api_list line as soon as it is complete and
+# passes the dry run, while the model is still generating (see tools/plan_stream)
+PLAN_STREAMING = os.getenv("PLAN_STREAMING", "0") == "1"
+# Record per-call timing of executed APIs; written to api_profile.json next to plan_apis.json
+API_PROFILE = os.getenv("API_PROFILE", "1") == "1"
+# Run every API call under cProfile and keep the stats of this many slowest calls per job (0 = off)
+API_PROFILE_CPROFILE_TOP = int(os.getenv("API_PROFILE_CPROFILE_TOP", "0"))
+
 # --- Paths ---
 
 PROJECT_ROOT = Path(__file__).parent
@@ -52,6 +114,47 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 TEMP_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 
+# --- Render cache (content-addressed, shared across agents and jobs) ---
+
+RENDER_CACHE_DIR = Path(os.getenv("RENDER_CACHE_DIR", str(TEMP_DIR / "render_cache")))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # LRU eviction above this
+
+# --- In-memory PPTX hand-off between graph nodes ---
+
+# Write every iteration's poster_v<n>.pptx to the output dir (otherwise only poster_v1.pptx, which
+# iterate_debug runs start from, and the final poster are written)
+KEEP_INTERMEDIATE_PPTX = os.getenv("KEEP_INTERMEDIATE_PPTX", "0") == "1"
+# Serialize intermediate posters without deflate (ZIP_STORED); only the final poster is compressed
+INTERMEDIATE_PPTX_STORED = os.getenv("INTERMEDIATE_PPTX_STORED", "1") == "1"
+# Where LibreOffice gets its input copy on a render-cache miss (tmpfs when available)
+PPTX_SCRATCH_DIR = Path(os.getenv("PPTX_SCRATCH_DIR", "/dev/shm/apex_pptx" if os.path.isdir("/dev/shm") else str(TEMP_DIR / "pptx_scratch")))
+
+# --- LLM concurrency (adaptive per-endpoint limiter, see tools/llm_limiter) ---
+
+LLM_LIMIT_MAX = int(os.getenv("MAX_CONCURRENCY", "100"))  # concurrent calls per endpoint, across all agents
+LLM_LIMIT_INITIAL = int(os.getenv("LLM_LIMIT_INITIAL", "16"))
+LLM_LIMIT_MIN = int(os.getenv("LLM_LIMIT_MIN", "1"))
+# A call slower than this times the baseline latency counts as congestion (limit -10%)
+LLM_LIMIT_LATENCY_FACTOR = float(os.getenv("LLM_LIMIT_LATENCY_FACTOR", "4.0"))
+LLM_TPM_BUDGET = int(os.getenv("LLM_TPM_BUDGET", "0"))  # tokens per minute per endpoint (0 = no budget)
+
+# --- LLM response cache (record / replay, see tools/llm_cache) ---
+
+# off | read-through | record | replay-only
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off")
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(TEMP_DIR / "llm_cache.sqlite3")))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(30 * 24 * 3600)))  # 0 = entries never expire
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # LRU eviction above this
+
+# --- LLM clients (shared connection pools, see tools/llm_clients) ---
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "256"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "64"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))  # seconds
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))  # seconds; connect timeout is 10 s
+# Negotiate HTTP/2 with the LLM endpoints (only when the h2 package is installed)
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1"
+
 # --- Logging ---
 
 LOG_LEVEL = "INFO"
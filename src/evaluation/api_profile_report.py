@@ -0,0 +1,73 @@
+"""
+Benchmark-wide execution profile of the executor APIs.
+
+Merges the per-job api_profile.json files (written next to plan_apis.json by
+the code generator, see tools/api_profiler) under a benchmark directory and
+reports per-API count / errors / total / p50 / p95 / max (ms), most total
+time first, plus the distribution of executor time per job. Captured cProfile
+stats (API_PROFILE_CPROFILE_TOP) of the slowest calls across all jobs are
+included with --cprofile N.
+
+Usage:
+    python -m src.evaluation.api_profile_report [benchmark_dir] [--top 15] [--cprofile 0] [--out report.json]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from ..tools.api_profiler import summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate per-job api_profile.json files into per-API histograms")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--top", type=int, default=15, help="APIs listed in the table")
+    parser.add_argument("--cprofile", type=int, default=0, help="Include the captured profiles of this many slowest calls")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    records, job_ms, profiles = [], [], []
+    for path in sorted(Path(args.benchmark_dir).glob("**/api_profile.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        records.extend(job["records"])
+        job_ms.append(job["total_ms"])
+        profiles.extend(dict(p, job=str(path.parent)) for p in job.get("cprofile", []))
+    print(f"[INFO] {len(job_ms)} jobs, {len(records)} API calls")
+    if not records:
+        return
+
+    apis = summarize(records)
+    total = sum(a["total_ms"] for a in apis.values())
+    print(f"{'api':<32}{'count':>7}{'err':>5}{'total ms':>11}{'share':>7}{'p50':>9}{'p95':>9}{'max':>9}")
+    for name, a in list(apis.items())[:args.top]:
+        print(f"{name:<32}{a['count']:>7}{a['errors']:>5}{a['total_ms']:>11.1f}{a['total_ms'] / total:>7.1%}"
+              f"{a['p50_ms']:>9.2f}{a['p95_ms']:>9.2f}{a['max_ms']:>9.2f}")
+
+    ms = np.array([r["ms"] for r in records])
+    report = {
+        "jobs": len(job_ms),
+        "calls": len(records),
+        "total_ms": round(total, 3),
+        "call_ms": {
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p95": round(float(np.percentile(ms, 95)), 3),
+            "max": round(float(ms.max()), 3),
+        },
+        "job_ms": {
+            "p50": round(float(np.percentile(job_ms, 50)), 3),
+            "p95": round(float(np.percentile(job_ms, 95)), 3),
+            "max": round(float(max(job_ms)), 3),
+        },
+        "apis": apis,
+        "cprofile": sorted(profiles, key=lambda p: -p["ms"])[:args.cprofile],
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,8 @@ from langsmith.schemas import ExampleCreate
 import random
 import time
 from ..tools.pptx_execuator import _state_context_var, PosterState
+from ..tools.llm_clients import pool_stats
+from ..tools.llm_limiter import limiter_stats
 
  
 # Experiment configuration class
@@ -273,6 +275,8 @@ async def main():
     for exp_name, result in results.items():
         status_icon = "✓" if result["status"] == "success" else "✗"
         print(f"{status_icon} {exp_name}: {result['status']}")
+    print(f"[INFO] LLM HTTP pools: {json.dumps(pool_stats())}")
+    print(f"[INFO] LLM limiters: {json.dumps(limiter_stats())}")
     
     # Save results to file
     results_file = benchmark_path / f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -0,0 +1,116 @@
+"""
+Disk I/O of the PPTX hand-off between graph nodes: per-iteration save vs. PptxArtifact.
+
+For every benchmark poster this simulates one job of `--iterations` executor
+iterations, each followed by a review render that misses the render cache:
+
+- disk:   prs.save(poster_v<n>.pptx), render-cache key hashed from the file,
+          LibreOffice reads the file
+- memory: PptxArtifact.from_presentation, key hashed from the bytes, a
+          scratch copy for LibreOffice (PPTX_SCRATCH_DIR, tmpfs when
+          available) released after the render, and one persist() of the
+          final poster
+
+LibreOffice itself is not run; both flows read the same bytes once per
+render. Reported per job: bytes written to / read from the output disk,
+bytes that went to scratch, and the wall time of the hand-off steps.
+
+Usage:
+    python -m src.evaluation.handoff_benchmark [benchmark_dir] [--iterations 3] [--out report.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from pptx import Presentation
+
+from ..config import PPTX_SCRATCH_DIR, TEMP_DIR
+from ..tools.pptx_artifact import PptxArtifact
+from ..tools.render_cache import RenderCache
+
+
+def _disk_job(prs, out_dir: Path, iterations: int) -> dict:
+    written = read = 0
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        path = out_dir / f"poster_v{i + 1}.pptx"
+        prs.save(path)
+        size = path.stat().st_size
+        written += size
+        RenderCache.key_for(path)
+        read += size
+        with open(path, "rb") as f:  # LibreOffice loading the poster
+            f.read()
+        read += size
+    return {"disk_written": written, "disk_read": read, "scratch": 0, "s": time.perf_counter() - t0}
+
+
+def _memory_job(prs, out_dir: Path, iterations: int) -> dict:
+    written = scratch = 0
+    t0 = time.perf_counter()
+    artifact = None
+    for i in range(iterations):
+        artifact = PptxArtifact.from_presentation(prs, out_dir / f"poster_v{i + 1}.pptx")
+        RenderCache.key_for_bytes(artifact.data)
+        with open(artifact.scratch_path(), "rb") as f:  # LibreOffice loading the scratch copy
+            f.read()
+        scratch += len(artifact.data)
+        artifact.release_scratch()
+    artifact.persist()  # finalize node
+    written += len(artifact.data)
+    return {"disk_written": written, "disk_read": 0, "scratch": scratch, "s": time.perf_counter() - t0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disk I/O per job: per-iteration PPTX saves vs. in-memory hand-off")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--iterations", type=int, default=3, help="Executor iterations per simulated job")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.benchmark_dir).glob("**/*.pptx"))
+    print(f"[INFO] {len(paths)} posters, {args.iterations} iterations per job, scratch dir {PPTX_SCRATCH_DIR}")
+    if not paths:
+        return
+
+    rows = []
+    with tempfile.TemporaryDirectory(dir=TEMP_DIR) as tmp:
+        for n, path in enumerate(paths):
+            prs = Presentation(path)
+            disk_dir, mem_dir = Path(tmp) / f"{n}_disk", Path(tmp) / f"{n}_mem"
+            disk_dir.mkdir()
+            mem_dir.mkdir()
+            rows.append((_disk_job(prs, disk_dir, args.iterations), _memory_job(prs, mem_dir, args.iterations)))
+
+    def mean(flow: int, field: str) -> float:
+        return statistics.mean(r[flow][field] for r in rows)
+
+    report = {
+        "jobs": len(rows),
+        "iterations": args.iterations,
+        "mean_pptx_kb": round(mean(1, "disk_written") / 1024, 1),
+        "disk": {
+            "written_kb": round(mean(0, "disk_written") / 1024, 1),
+            "read_kb": round(mean(0, "disk_read") / 1024, 1),
+            "ms": round(mean(0, "s") * 1000, 1),
+        },
+        "memory": {
+            "written_kb": round(mean(1, "disk_written") / 1024, 1),
+            "read_kb": round(mean(1, "disk_read") / 1024, 1),
+            "scratch_kb": round(mean(1, "scratch") / 1024, 1),
+            "ms": round(mean(1, "s") * 1000, 1),
+        },
+    }
+    report["disk_io_saved_kb_per_job"] = round(
+        report["disk"]["written_kb"] + report["disk"]["read_kb"] - report["memory"]["written_kb"] - report["memory"]["read_kb"], 1)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,12 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 
 from ..tools.image_tools import encode_image_to_base64
+from ..tools.render_pyramid import image_data_url
 from ..tools.pptx_parser import parse_pptx_to_json
 from ..tools.pdf_parser import extract_paper_content
 from ..schema import PaperContentExtractionResult
-from ..tools.utils import extract_llm_result, extract_llm_result_judge
+from ..tools.utils import extract_llm_result, aextract_llm_result_judge
+from ..tools.llm_clients import get_chat_model
 import PyPDF2
 from pdf2image import convert_from_path
 
@@ -38,16 +40,32 @@ class PosterEvaluationResult(BaseModel):
 class PosterJudge:
     """Judge system for evaluating poster edits"""
     
-    def __init__(self, model: str = "gemini-3-flash-preview", max_concurrent: int = 5):
-        """Initialize the judge with specified model"""
+    def __init__(
+        self,
+        model: str = "gemini-3-flash-preview",
+        max_concurrent: int = 5,
+        image_level: Optional[str] = None,
+        image_format: Optional[str] = None,
+        image_max_bytes: Optional[int] = None,
+    ):
+        """
+        Initialize the judge with specified model.
+
+        image_level / image_format / image_max_bytes select a render pyramid
+        variant for the poster images (see render_pyramid); by default the
+        original PNGs are sent unchanged.
+        """
         
         # Configure model based on type
         self.model = model
         self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.image_level = image_level
+        self.image_format = image_format
+        self.image_max_bytes = image_max_bytes
         
         if model == 'gemini-3-flash-preview':
-            from langchain_google_genai import ChatGoogleGenerativeAI # TODO: not use langgraph will be better?
-            self.llm = ChatGoogleGenerativeAI( 
+            self.llm = get_chat_model(
+                "google",
                 model=model,
                 temperature=0,
                 api_key=os.getenv("GOOGLE_API_KEY", "EMPTY"),
@@ -57,8 +75,8 @@ class PosterJudge:
                 include_thoughts=False
             )
         elif model == 'gemini-3-pro-preview':
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            self.llm = ChatGoogleGenerativeAI( 
+            self.llm = get_chat_model(
+                "google",
                 model=model,
                 temperature=0.1,
                 api_key=os.getenv("GOOGLE_API_KEY", "EMPTY"),
@@ -111,6 +129,11 @@ class PosterJudge:
             return [{'type': 'text', 'text': f"\n**Paper Content**\n"}] + image_list
             
     
+    def _image_url(self, image_path: Path) -> str:
+        if self.image_level is None and self.image_format is None:
+            return f"data:image/png;base64,{encode_image_to_base64(image_path)}"
+        return image_data_url(image_path, self.image_level or "full", self.image_max_bytes, self.image_format)
+
     async def evaluate_poster(
         self,
         user_instruction: str,
@@ -140,8 +163,8 @@ class PosterJudge:
         
         async with self.semaphore:
             # Encode images
-            original_img_b64 = encode_image_to_base64(original_png_path)
-            edited_img_b64 = encode_image_to_base64(edited_png_path)
+            original_img_url = self._image_url(original_png_path)
+            edited_img_url = self._image_url(edited_png_path)
             
             message_parts = [
                 {"type": "text", "text": judge_prompt_final.format(
@@ -161,9 +184,9 @@ class PosterJudge:
         # Add images
         message_parts.extend([
             {"type": "text", "text": "\n**Original Poster:**"},
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{original_img_b64}"}},
+            {"type": "image_url", "image_url": {"url": original_img_url}},
             {"type": "text", "text": "\n**Edited Poster:**"},
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{edited_img_b64}"}},
+            {"type": "image_url", "image_url": {"url": edited_img_url}},
         ])
         # Get structured response
         structured_output = False
@@ -174,16 +197,11 @@ class PosterJudge:
 
             if structured_output:
                 structured_llm = self.llm.with_structured_output(PosterEvaluationResult)
-                # Run synchronous invoke in executor
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(None, structured_llm.invoke, [message])
+                result = await structured_llm.ainvoke([message])
             else:
                 
                 message = HumanMessage(content=message_parts)
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    None, 
-                    extract_llm_result_judge, 
+                result = await aextract_llm_result_judge(
                     self.model, 
                     [message], 
                     self.llm, 
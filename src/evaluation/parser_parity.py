@@ -0,0 +1,248 @@
+"""
+Parity check and benchmark: lxml parser engine vs. python-pptx proxy walk.
+
+For every PPTX under the benchmark directory, plus synthetic stress posters
+generated from them (thousands of runs exercising theme colors, inherited
+paragraph styles, line breaks, fields, bullets, borders, groups, connectors),
+this checks that
+
+- slide_elements_from_xml == _shape_to_element for every shape
+- parse_pptx_xml (zip, no Presentation) == the proxy walk
+
+produce identical PosterJSON, and times both engines. Any mismatch is printed
+field by field and the exit code is non-zero.
+
+Usage:
+    python -m src.evaluation.parser_parity [benchmark_dir] [--runs 5000] [--repeat 3] [--out report.json]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from lxml import etree
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_CONNECTOR, MSO_SHAPE
+from pptx.util import Inches, Pt
+
+from ..schema import PosterJSON
+from ..tools.pptx_parser import PosterFilter, _get_theme_colors, _shape_to_element
+from ..tools.pptx_xml_parser import NS, parse_pptx_xml, slide_elements_from_xml
+
+_A = "{%s}" % NS["a"]
+
+
+def _sub(parent, tag, **attrs):
+    return etree.SubElement(parent, _A + tag, {k: str(v) for k, v in attrs.items()})
+
+
+def _color(parent, rng):
+    fill = _sub(parent, "solidFill")
+    kind = rng.random()
+    if kind < 0.4:
+        _sub(fill, "srgbClr", val="%06X" % rng.randrange(1 << 24))
+    elif kind < 0.8:
+        _sub(fill, "schemeClr", val=rng.choice(["accent1", "accent2", "dk1", "lt2", "tx1", "bg1", "hlink"]))
+    elif kind < 0.9:
+        _sub(fill, "prstClr", val="red")
+
+
+def _random_rpr(rpr, rng, default=False):
+    if rng.random() < 0.6:
+        rpr.set("sz", str(rng.choice([800, 1050, 1200, 1800, 2400, 3600])))
+    for attr in ("b", "i"):
+        if rng.random() < 0.4:
+            rpr.set(attr, rng.choice(["0", "1", "true", "false"]))
+    if rng.random() < 0.3:
+        rpr.set("u", rng.choice(["none", "sng"] + (["dbl", "wavy"] if default else [])))
+    if rng.random() < 0.5:
+        _color(rpr, rng)
+    if rng.random() < 0.5:
+        _sub(rpr, "latin", typeface=rng.choice(["Arial", "Helvetica", "Times New Roman", "+mn-lt"]))
+
+
+def make_stress_poster(base_pptx, out_path, n_runs: int, seed: int = 0):
+    """Base poster plus textboxes holding about `n_runs` runs with varied formatting, and some non-text shapes."""
+    rng = random.Random(seed)
+    prs = Presentation(base_pptx)
+    slide = prs.slides[0]
+    W, H = prs.slide_width, prs.slide_height
+    runs_left = n_runs
+    while runs_left > 0:
+        box = slide.shapes.add_textbox(rng.randrange(W // 2), rng.randrange(H // 2), Inches(rng.uniform(2, 10)), Inches(rng.uniform(1, 6)))
+        txBody = box.text_frame._txBody
+        for p in txBody.findall(_A + "p"):
+            txBody.remove(p)
+        for _ in range(rng.randint(1, 12)):
+            p = _sub(txBody, "p")
+            if rng.random() < 0.7:
+                ppr = _sub(p, "pPr")
+                if rng.random() < 0.5:
+                    ppr.set("lvl", str(rng.randint(0, 4)))
+                if rng.random() < 0.7:
+                    _random_rpr(_sub(ppr, "defRPr"), rng, default=True)
+            for _ in range(rng.randint(0, 10)):
+                kind = rng.random()
+                if kind < 0.85:
+                    r = _sub(p, "r")
+                    if rng.random() < 0.8:
+                        _random_rpr(_sub(r, "rPr", lang="en-US"), rng)
+                    _sub(r, "t").text = rng.choice(["Results", " improve ", "by 3.2%", "", "α-β", "Fig. 2"])
+                    runs_left -= 1
+                elif kind < 0.95:
+                    _sub(p, "br")
+                else:
+                    fld = _sub(p, "fld", id="{5C1D6F3A-3B8B-4B5E-9C43-6A1F5E4C1D2B}", type="slidenum")
+                    _sub(fld, "t").text = "1"
+        if rng.random() < 0.3:
+            box.fill.solid()
+            box.fill.fore_color.rgb = RGBColor(rng.randrange(256), 40, 90)
+        if rng.random() < 0.3:
+            box.line.width = Pt(rng.choice([0, 1, 2.5]))
+            if rng.random() < 0.5:
+                _color(box.line._get_or_add_ln(), rng)
+            else:
+                box.line.fill.solid()
+
+    # Non-text shapes: rectangles with theme fills, connectors, a group
+    for _ in range(20):
+        rect = slide.shapes.add_shape(rng.choice([MSO_SHAPE.RECTANGLE, MSO_SHAPE.OVAL]), Inches(1), Inches(1), Inches(2), Inches(1))
+        rect.text_frame.text = "callout"
+        sppr = rect._element.spPr
+        for fill in sppr.findall(_A + "solidFill"):
+            sppr.remove(fill)
+        if rng.random() < 0.8:
+            _color(sppr, rng)
+    for _ in range(5):
+        line = slide.shapes.add_connector(MSO_CONNECTOR.STRAIGHT, Inches(1), Inches(1), Inches(5), Inches(1))
+        line.line.width = Pt(2)
+        _color(line.line._get_or_add_ln(), rng)
+    group = slide.shapes.add_group_shape()
+    group.shapes.add_textbox(Inches(1), Inches(1), Inches(1), Inches(1)).text_frame.text = "in group"
+    prs.save(out_path)
+
+
+def _proxy_elements(pptx_path):
+    prs = Presentation(pptx_path)
+    theme = _get_theme_colors(prs)
+    t0 = time.perf_counter()
+    elements = [_shape_to_element(s, theme) for s in prs.slides[0].shapes]
+    return elements, time.perf_counter() - t0
+
+
+def _xml_elements(pptx_path):
+    prs = Presentation(pptx_path)
+    theme = _get_theme_colors(prs)
+    t0 = time.perf_counter()
+    elements = slide_elements_from_xml(prs.slides[0], theme)
+    return elements, time.perf_counter() - t0
+
+
+def _normalize(elements, prs_path):
+    prs = Presentation(prs_path)
+    pj = PosterJSON(slide_width=round(prs.slide_width / 914400, 2), slide_height=round(prs.slide_height / 914400, 2), elements=elements)
+    return PosterJSON(**PosterFilter._remove_empty_values(pj))
+
+
+def _diff(a: PosterJSON, b: PosterJSON, limit: int = 10):
+    """Human-readable differences between two PosterJSONs (element-wise, field-wise)."""
+    out = []
+    if (a.slide_width, a.slide_height) != (b.slide_width, b.slide_height):
+        out.append(f"slide size {a.slide_width}x{a.slide_height} != {b.slide_width}x{b.slide_height}")
+    ea, eb = a.elements or [], b.elements or []
+    if len(ea) != len(eb):
+        out.append(f"element count {len(ea)} != {len(eb)}")
+    for x, y in zip(ea, eb):
+        dx, dy = x.model_dump(), y.model_dump()
+        for field in dx:
+            if dx[field] != dy[field]:
+                if field == "runs":
+                    for i, (rx, ry) in enumerate(zip(dx["runs"] or [], dy["runs"] or [])):
+                        if rx != ry:
+                            out.append(f"element {x.id} run {i}: {rx} != {ry}")
+                            break
+                    else:
+                        out.append(f"element {x.id} runs: {len(dx['runs'] or [])} != {len(dy['runs'] or [])}")
+                else:
+                    out.append(f"element {x.id} {field}: {dx[field]!r} != {dy[field]!r}")
+        if len(out) >= limit:
+            break
+    return out
+
+
+def check_file(pptx_path, repeat: int) -> dict:
+    result = {"pptx": str(pptx_path)}
+    proxy_times, xml_times, zip_times = [], [], []
+    for _ in range(repeat):
+        proxy_elems, t = _proxy_elements(pptx_path)
+        proxy_times.append(t)
+        xml_elems, t = _xml_elements(pptx_path)
+        xml_times.append(t)
+        t0 = time.perf_counter()
+        zip_json = parse_pptx_xml(pptx_path)
+        zip_times.append(time.perf_counter() - t0)
+
+    proxy_json, xml_json = _normalize(proxy_elems, pptx_path), _normalize(xml_elems, pptx_path)
+
+    result["runs"] = sum(len(e.runs or []) for e in proxy_json.elements or [])
+    result["elements"] = len(proxy_json.elements or [])
+    result["diff_live"] = _diff(proxy_json, xml_json)
+    result["diff_zip"] = _diff(proxy_json, zip_json)
+    result["proxy_s"] = statistics.median(proxy_times)
+    result["xml_s"] = statistics.median(xml_times)
+    result["zip_s"] = statistics.median(zip_times)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the lxml parser engine against the python-pptx one and time both")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--runs", type=int, default=5000, help="Runs per synthetic stress poster (0 to skip them)")
+    parser.add_argument("--seeds", type=int, default=3, help="Stress posters per benchmark poster")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (median reported)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    pptx_files = sorted(Path(args.benchmark_dir).glob("**/*.pptx"))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="parser_parity_") as tmp:
+        targets = list(pptx_files)
+        if args.runs:
+            for i, base in enumerate(pptx_files):
+                for seed in range(args.seeds):
+                    out = Path(tmp) / f"stress_{i}_{seed}" / "poster.pptx"
+                    out.parent.mkdir()
+                    make_stress_poster(base, out, args.runs, seed=seed)
+                    targets.append(out)
+        for path in targets:
+            r = check_file(path, args.repeat)
+            results.append(r)
+            ok = not r["diff_live"] and not r["diff_zip"]
+            print(
+                f"[{'OK' if ok else 'DIFF'}] {str(path)[-60:]:<60} elements {r['elements']:>4} runs {r['runs']:>6}  "
+                f"proxy {r['proxy_s'] * 1000:>8.1f}ms  lxml {r['xml_s'] * 1000:>7.1f}ms  zip {r['zip_s'] * 1000:>7.1f}ms  "
+                f"x{r['proxy_s'] / max(r['xml_s'], 1e-9):.1f}"
+            )
+            for line in r["diff_live"] + [f"(zip) {d}" for d in r["diff_zip"]]:
+                print(f"    {line}")
+
+    failed = [r for r in results if r["diff_live"] or r["diff_zip"]]
+    summary = {
+        "files": len(results),
+        "mismatches": len(failed),
+        "median_speedup": round(statistics.median(r["proxy_s"] / max(r["xml_s"], 1e-9) for r in results), 1) if results else None,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+VLM image payload size per pyramid level / format, optionally with judge scores.
+
+For every poster render in the benchmark directory (ByPosterGen.png) this
+reports the encoded size of each pyramid level in each format, raw and as the
+base64 that actually goes over the wire, next to the original PNG.
+
+With --judge, the PosterJudge is run once per setting over the edited posters
+of --version-prefix (v1 only), so score drift can be read against payload
+size before changing PLANNER_/PAPER_TOOL_/REVIEW_IMAGE_* defaults.
+
+Usage:
+    python -m src.evaluation.payload_benchmark [benchmark_dir] [--formats webp jpeg png]
+    python -m src.evaluation.payload_benchmark --judge --version-prefix <prefix> [--limit 20]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from ..tools.render_pyramid import LEVELS, pyramid_variant
+from ..config import VLM_IMAGE_QUALITY
+
+
+def _b64_len(n: int) -> int:
+    return 4 * ((n + 2) // 3)
+
+
+def payload_sizes(image_paths, formats) -> dict:
+    """(level, fmt) -> list of encoded sizes in bytes, plus 'original' for the source PNGs."""
+    sizes = {"original": [p.stat().st_size for p in image_paths]}
+    for fmt in formats:
+        for level in LEVELS:
+            t0 = time.perf_counter()
+            sizes[f"{level}/{fmt}"] = [len(pyramid_variant(p, level, fmt, VLM_IMAGE_QUALITY)) for p in image_paths]
+            print(f"  encoded {level}/{fmt} in {time.perf_counter() - t0:.2f}s")
+    return sizes
+
+
+async def judge_settings(benchmark_dir: Path, version_prefix: str, settings, model: str, limit: int, max_concurrent: int) -> dict:
+    from .judge_score_async import PosterJudge, evaluate_poster_versions
+
+    poster_folders = [f for f in sorted(benchmark_dir.iterdir()) if f.is_dir() and (f / "instruction.json").exists()][:limit]
+    jobs = []
+    for folder in poster_folders:
+        with open(folder / "instruction.json", "r", encoding="utf-8") as f:
+            n = len(json.load(f))
+        jobs.extend((folder, idx) for idx in range(n) if (folder / version_prefix / str(idx) / "poster_v1.png").exists())
+
+    scores = {}
+    for name, level, fmt in settings:
+        judge = PosterJudge(model=model, max_concurrent=max_concurrent, image_level=level, image_format=fmt)
+        results = await asyncio.gather(
+            *[evaluate_poster_versions(folder, idx, version_prefix, judge) for folder, idx in jobs],
+            return_exceptions=True,
+        )
+        key = f"score_{version_prefix}_v1"
+        vals = [r[key]["score"] for r in results if isinstance(r, dict) and isinstance(r.get(key), dict) and "score" in r[key]]
+        scores[name] = {"n": len(vals), "mean_score": round(statistics.mean(vals), 3) if vals else None}
+        print(f"  {name:<16} n={scores[name]['n']:<4} mean instruction score {scores[name]['mean_score']}")
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure VLM image payload sizes per pyramid level and format")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--formats", nargs="+", default=["webp", "jpeg", "png"])
+    parser.add_argument("--judge", action="store_true", help="Also run PosterJudge per setting (needs API access)")
+    parser.add_argument("--version-prefix", default=None, help="Edited-poster folder name used with --judge")
+    parser.add_argument("--model", default="gemini-3-flash-preview")
+    parser.add_argument("--limit", type=int, default=20, help="Max poster folders for --judge")
+    parser.add_argument("--max-concurrent", type=int, default=10)
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    benchmark_dir = Path(args.benchmark_dir)
+    images = sorted(benchmark_dir.glob("*/ByPosterGen.png"))
+    print(f"[INFO] {len(images)} poster renders under {benchmark_dir}")
+    if not images:
+        return
+
+    sizes = payload_sizes(images, args.formats)
+    report = {"payload": {}}
+    for name, vals in sizes.items():
+        med = statistics.median(vals)
+        report["payload"][name] = {"median_bytes": int(med), "median_base64_bytes": _b64_len(int(med)), "max_bytes": max(vals)}
+        print(f"{name:<16} median {med / 1024:>8.1f} KB  base64 {_b64_len(int(med)) / 1024:>8.1f} KB  max {max(vals) / 1024:>8.1f} KB")
+
+    if args.judge:
+        if not args.version_prefix:
+            parser.error("--judge needs --version-prefix")
+        settings = [("original/png", None, None)] + [(f"{lvl}/{fmt}", lvl, fmt) for fmt in args.formats for lvl in ("review", "thumb")]
+        report["judge"] = asyncio.run(
+            judge_settings(benchmark_dir, args.version_prefix, settings, args.model, args.limit, args.max_concurrent)
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Time to first edit and end-to-end latency of the planner hand-off: batch vs. PLAN_STREAMING.
+
+For every benchmark poster a Plan_APIs call is replayed from a simulated
+endpoint that streams the tool-call arguments at `--tokens-per-s` (4
+characters per token): a free-text plan of `--plan-chars` characters, then
+an api_list with calls on every element (set_text_font_size and
+fit_text_to_box on text boxes, move_element_relative elsewhere), repeated
+`--repeat` times. Lines the dry run rejects for the poster are dropped.
+
+- batch:  the whole call is received, then execute_api_calls runs the plan
+- stream: astream_plan executes each line as it completes
+          (tools/plan_stream), then execute_api_calls runs the rest
+
+Both start from a freshly parsed poster. Reported per flow, mean over
+posters (s): time to the first executed edit, until the plan is fully
+executed, and the part of that after the last token (execution not hidden
+behind decoding).
+
+Usage:
+    python -m src.evaluation.plan_stream_benchmark [benchmark_dir] [--tokens-per-s 60] [--plan-chars 3000] [--repeat 2] [--out report.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from ..tools import pptx_execuator
+from ..tools.plan_stream import PlanStreamExecutor, astream_plan
+from ..tools.plan_validator import validate_plan
+from ..tools.pptx_parser import parse_pptx_to_json
+
+_CHARS_PER_TOKEN = 4
+logger = logging.getLogger("plan_stream_benchmark")
+
+
+class _StreamingEndpoint(BaseChatModel):
+    """Replays one Plan_APIs call as a token stream at a fixed rate."""
+
+    arguments: str
+    tokens_per_s: float
+
+    @property
+    def _llm_type(self) -> str:
+        return "plan-stream-replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        call = {"name": "Plan_APIs", "args": json.loads(self.arguments), "id": "call_0"}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=[call]))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        step = 1 / self.tokens_per_s
+        for i in range(0, len(self.arguments), _CHARS_PER_TOKEN):
+            await asyncio.sleep(step)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": "Plan_APIs" if i == 0 else None, "id": "call_0" if i == 0 else None,
+                "args": self.arguments[i:i + _CHARS_PER_TOKEN], "index": 0,
+            }]))
+
+
+def _plan(poster_json, repeat: int) -> List[str]:
+    lines = []
+    for _ in range(repeat):
+        for e in poster_json.elements or []:
+            if e.type == "textbox":
+                lines.append(f'set_text_font_size(element_id="{e.id}", font_size=24)')
+                lines.append(f'fit_text_to_box(element_id="{e.id}", min_size=12, max_size=60)')
+            else:
+                lines.append(f'move_element_relative(element_id="{e.id}", delta_x=0.0, delta_y=0.0)')
+    rejected = {v.line_no for v in validate_plan(lines, poster_json)}
+    return [line for i, line in enumerate(lines, 1) if i not in rejected]
+
+
+async def _batch(path: Path, endpoint: _StreamingEndpoint) -> dict:
+    parse_pptx_to_json(str(path))
+    prs = pptx_execuator.get_current_state().prs
+    t0 = time.perf_counter()
+    gathered = None
+    async for chunk in endpoint.astream("plan"):
+        gathered = chunk if gathered is None else gathered + chunk
+    api_list = gathered.tool_calls[0]["args"]["api_list"]
+    first = time.perf_counter() - t0
+    pptx_execuator.execute_api_calls(api_list, prs, logger)
+    end = time.perf_counter() - t0
+    return {"first_edit_s": first, "end_to_end_s": end, "after_stream_s": end - first}
+
+
+async def _stream(path: Path, endpoint: _StreamingEndpoint) -> dict:
+    poster_json = parse_pptx_to_json(str(path))
+    prs = pptx_execuator.get_current_state().prs
+    t0 = time.perf_counter()
+    executor = PlanStreamExecutor(prs, poster_json, None, logger)
+    response = await astream_plan(endpoint, "plan", executor, logger=logger)
+    api_list = response.tool_calls[0]["args"]["api_list"]
+    streamed, errors = executor.finish(api_list)
+    pptx_execuator.execute_api_calls(api_list, prs, logger, streamed=streamed, streamed_errors=errors)
+    end = time.perf_counter() - t0
+    first = executor.first_edit_s if executor.first_edit_s is not None else end
+    return {"first_edit_s": first, "end_to_end_s": end, "after_stream_s": end - executor.stream_s, "streamed": streamed}
+
+
+async def _run(paths: List[Path], args) -> list:
+    rows = []
+    for path in paths:
+        api_list = _plan(parse_pptx_to_json(str(path)), args.repeat)
+        arguments = json.dumps({"plan": "x" * args.plan_chars, "api_list": api_list})
+        endpoint = _StreamingEndpoint(arguments=arguments, tokens_per_s=args.tokens_per_s)
+        batch, stream = await _batch(path, endpoint), await _stream(path, endpoint)
+        print(f"[INFO] {path.parent.name[:48]:<48} {len(api_list):>4} calls  first edit "
+              f"{batch['first_edit_s']:.2f}s -> {stream['first_edit_s']:.2f}s  end-to-end "
+              f"{batch['end_to_end_s']:.2f}s -> {stream['end_to_end_s']:.2f}s  after last token "
+              f"{batch['after_stream_s'] * 1000:.0f}ms -> {stream['after_stream_s'] * 1000:.0f}ms")
+        rows.append((batch, stream, len(api_list)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planner hand-off latency: batch vs. streamed execution of api_list")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--tokens-per-s", type=float, default=60.0, help="Simulated decoding speed")
+    parser.add_argument("--plan-chars", type=int, default=3000, help="Length of the free-text plan before api_list")
+    parser.add_argument("--repeat", type=int, default=2, help="Calls per element in the api_list")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.benchmark_dir).glob("**/*.pptx"))
+    print(f"[INFO] {len(paths)} posters, {args.tokens_per_s:g} tokens/s, plan of {args.plan_chars} chars")
+    if not paths:
+        return
+    rows = asyncio.run(_run(paths, args))
+
+    def mean(flow: int, field: str) -> float:
+        return round(statistics.mean(r[flow][field] for r in rows), 3)
+
+    report = {
+        "jobs": len(rows),
+        "tokens_per_s": args.tokens_per_s,
+        "mean_calls": round(statistics.mean(r[2] for r in rows), 1),
+        "batch": {field: mean(0, field) for field in ("first_edit_s", "end_to_end_s", "after_stream_s")},
+        "stream": {**{field: mean(1, field) for field in ("first_edit_s", "end_to_end_s", "after_stream_s")},
+                   "streamed_lines": round(statistics.mean(r[1]["streamed"] for r in rows), 1)},
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Draft rasterizer vs. LibreOffice: speed and pixel similarity.
+
+For every PPTX under the benchmark directory this renders the poster with
+both engines (bypassing the render cache), times them, and compares the
+images on a common grayscale canvas:
+
+- global similarity: 1 - mean absolute pixel difference / 255
+- tile similarity: the same score on a GRID x GRID grid, so a report shows
+  *where* the draft diverges (tables, charts, missing fonts, ...)
+
+When LibreOffice is not installed, the PNG shipped next to the PPTX (same
+basename) is used as the reference and only the draft timing is reported.
+
+Usage:
+    python -m src.evaluation.render_benchmark [benchmark_dir] [--grid 4] [--out report.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageStat
+
+from ..tools.poster_rasterizer import render_pptx_draft
+from ..tools.render_pool import find_soffice, get_render_pool
+
+
+def _similarity(a: Image.Image, b: Image.Image) -> float:
+    diff = ImageChops.difference(a, b)
+    return 1.0 - ImageStat.Stat(diff).mean[0] / 255.0
+
+
+def compare_images(reference_path, draft_path, grid: int = 4) -> dict:
+    ref = Image.open(reference_path).convert("L")
+    draft = Image.open(draft_path).convert("L").resize(ref.size, Image.BILINEAR)
+    w, h = ref.size
+    tiles = []
+    for row in range(grid):
+        for col in range(grid):
+            box = (col * w // grid, row * h // grid, (col + 1) * w // grid, (row + 1) * h // grid)
+            tiles.append(round(_similarity(ref.crop(box), draft.crop(box)), 4))
+    worst = min(range(len(tiles)), key=tiles.__getitem__)
+    return {
+        "global": round(_similarity(ref, draft), 4),
+        "tiles": tiles,
+        "worst_tile": {"row": worst // grid, "col": worst % grid, "similarity": tiles[worst]},
+    }
+
+
+def benchmark_file(pptx_path: Path, work_dir: Path, grid: int, use_libreoffice: bool) -> dict:
+    result = {"pptx": str(pptx_path)}
+
+    t0 = time.perf_counter()
+    draft_png = render_pptx_draft(pptx_path, work_dir / f"{pptx_path.parent.name}_draft.png")
+    result["draft_s"] = round(time.perf_counter() - t0, 3)
+
+    if use_libreoffice:
+        lo_dir = work_dir / pptx_path.parent.name
+        lo_dir.mkdir(exist_ok=True)
+        t0 = time.perf_counter()
+        reference = get_render_pool().convert(pptx_path, lo_dir, fmt="png")
+        result["libreoffice_s"] = round(time.perf_counter() - t0, 3)
+    else:
+        reference = pptx_path.with_suffix(".png")
+        if not reference.exists():
+            result["error"] = "no LibreOffice and no reference PNG next to the PPTX"
+            return result
+    result["reference"] = str(reference)
+    result["similarity"] = compare_images(reference, draft_png, grid)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the draft rasterizer against LibreOffice")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--grid", type=int, default=4, help="Tile grid size for the local similarity report")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    pptx_files = sorted(Path(args.benchmark_dir).glob("**/*.pptx"))
+    use_libreoffice = find_soffice() is not None
+    if not use_libreoffice:
+        print("[WARN] LibreOffice not found, comparing against the PNGs shipped with the benchmark")
+
+    with tempfile.TemporaryDirectory(prefix="render_bench_") as tmp:
+        results = [benchmark_file(p, Path(tmp), args.grid, use_libreoffice) for p in pptx_files]
+
+    ok = [r for r in results if "similarity" in r]
+    for r in results:
+        sim = r.get("similarity", {})
+        lo = f"{r['libreoffice_s']:>6.3f}s" if "libreoffice_s" in r else "    n/a"
+        print(
+            f"{Path(r['pptx']).parent.name[:60]:<60} "
+            f"draft {r['draft_s']:>6.3f}s  "
+            f"lo {lo}  "
+            f"sim {sim.get('global', float('nan')):.3f}  "
+            f"worst tile {sim.get('worst_tile', {}).get('similarity', float('nan')):.3f}"
+        )
+    summary = {"files": len(results)}
+    if ok:
+        summary["median_draft_s"] = statistics.median(r["draft_s"] for r in ok)
+        summary["median_similarity"] = statistics.median(r["similarity"]["global"] for r in ok)
+        summary["min_similarity"] = min(r["similarity"]["global"] for r in ok)
+        lo_times = [r["libreoffice_s"] for r in ok if "libreoffice_s" in r]
+        if lo_times:
+            summary["median_libreoffice_s"] = statistics.median(lo_times)
+            summary["speedup"] = round(summary["median_libreoffice_s"] / max(summary["median_draft_s"], 1e-6), 1)
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
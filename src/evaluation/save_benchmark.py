@@ -0,0 +1,94 @@
+"""
+Save cost of intermediate posters: python-pptx's deflated save vs. ZIP_STORED.
+
+For every benchmark PPTX this serializes the presentation in memory
+`--repeat` times with prs.save() (every member deflated, embedded images
+included) and with pptx_artifact.save_presentation(compress=False), and
+times compress_package() on the stored bytes (the one-off cost of the final
+poster). Wall and CPU time are reported per poster, largest embedded media
+first, and checked for a round trip: the stored package must open with
+python-pptx and hold the same members as the deflated one.
+
+Usage:
+    python -m src.evaluation.save_benchmark [benchmark_dir] [--repeat 5] [--out report.json]
+"""
+import argparse
+import json
+import statistics
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+from pptx import Presentation
+
+from ..tools.pptx_artifact import compress_package, save_presentation
+
+
+def _timed(fn, repeat: int):
+    wall, cpu = [], []
+    for _ in range(repeat):
+        w0, c0 = time.perf_counter(), time.process_time()
+        result = fn()
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+    return result, statistics.median(wall), statistics.median(cpu)
+
+
+def _save(prs, compress: bool) -> bytes:
+    buf = BytesIO()
+    save_presentation(prs, buf, compress=compress)
+    return buf.getvalue()
+
+
+def _members(data: bytes):
+    with zipfile.ZipFile(BytesIO(data)) as z:
+        return {info.filename: z.read(info) for info in z.infolist()}
+
+
+def benchmark_file(path: Path, repeat: int) -> dict:
+    prs = Presentation(path)
+    media = sum(len(p.blob) for p in prs.part.package.iter_parts() if p.partname.startswith("/ppt/media/"))
+    deflated, d_wall, d_cpu = _timed(lambda: _save(prs, True), repeat)
+    stored, s_wall, s_cpu = _timed(lambda: _save(prs, False), repeat)
+    final, f_wall, f_cpu = _timed(lambda: compress_package(stored), repeat)
+    Presentation(BytesIO(stored))
+    assert _members(stored) == _members(deflated) == _members(final), f"package members differ: {path}"
+    return {
+        "pptx": str(path),
+        "media_kb": round(media / 1024, 1),
+        "deflated": {"kb": round(len(deflated) / 1024, 1), "wall_ms": round(d_wall * 1000, 1), "cpu_ms": round(d_cpu * 1000, 1)},
+        "stored": {"kb": round(len(stored) / 1024, 1), "wall_ms": round(s_wall * 1000, 1), "cpu_ms": round(s_cpu * 1000, 1)},
+        "final_compress": {"kb": round(len(final) / 1024, 1), "wall_ms": round(f_wall * 1000, 1), "cpu_ms": round(f_cpu * 1000, 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deflated vs. ZIP_STORED PPTX saves")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--repeat", type=int, default=5, help="Saves per poster and mode (median is reported)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.benchmark_dir).glob("**/*.pptx"))
+    print(f"[INFO] {len(paths)} posters")
+    if not paths:
+        return
+    rows = sorted((benchmark_file(p, args.repeat) for p in paths), key=lambda r: -r["media_kb"])
+
+    def mean(mode: str, field: str) -> float:
+        return round(statistics.mean(r[mode][field] for r in rows), 1)
+
+    report = {
+        "posters": rows,
+        "mean": {mode: {f: mean(mode, f) for f in ("kb", "wall_ms", "cpu_ms")} for mode in ("deflated", "stored", "final_compress")},
+    }
+    report["mean"]["cpu_saved_per_intermediate_ms"] = round(report["mean"]["deflated"]["cpu_ms"] - report["mean"]["stored"]["cpu_ms"], 1)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
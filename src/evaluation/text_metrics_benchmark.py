@@ -0,0 +1,118 @@
+"""
+Cost and output of the font-metric text layout vs. the old 0.55 heuristic.
+
+For every text element of the benchmark posters this wraps the element text
+(runs with their own bold weight) into the element width with
+text_metrics.layout_text, and with the average-character-width estimate the
+text APIs used before. It reports
+
+- microseconds per layout call, cold (empty advance tables) and warm,
+- how often the two line counts disagree, and by how much,
+- the mean absolute error of both height predictions against the stored
+  height of shapes whose text frame is set to shape-to-fit-text (only
+  meaningful for posters last saved by PowerPoint / LibreOffice, which
+  resize those shapes).
+
+Usage:
+    python -m src.evaluation.text_metrics_benchmark [benchmark_dir] [--repeat 20] [--out report.json]
+"""
+import argparse
+import json
+import math
+import statistics
+import time
+from pathlib import Path
+
+from pptx import Presentation
+
+from ..tools import text_metrics
+from ..tools.pptx_parser import _get_theme_colors, _shape_to_element
+from ..tools.text_metrics import layout_text
+
+
+def _heuristic_lines(paragraphs, width_in, font_size):
+    chars_per_line = max(((width_in * 72) - 10) / (font_size * 0.55), 1)
+    return sum(1 if not p else math.ceil(len(p) / chars_per_line) for p in paragraphs)
+
+
+def _text_cases(pptx_path):
+    """(paragraph runs, width_in, font_size, font_name, stored height_in, autofit) per text element."""
+    prs = Presentation(pptx_path)
+    theme = _get_theme_colors(prs)
+    cases = []
+    for shape in prs.slides[0].shapes:
+        if not shape.has_text_frame or not shape.text_frame.text.strip():
+            continue
+        elem = _shape_to_element(shape, theme)
+        size = elem.main_font_size or 18.0
+        font_name = next((r.font_name for r in elem.runs or [] if r.font_name), "Arial")
+        paragraphs = [[(r.text, bool(r.font.bold)) for r in p.runs] for p in shape.text_frame.paragraphs]
+        autofit = shape.text_frame._txBody.bodyPr.find("{http://schemas.openxmlformats.org/drawingml/2006/main}spAutoFit") is not None
+        cases.append({
+            "paragraphs": paragraphs,
+            "texts": [p.text for p in shape.text_frame.paragraphs],
+            "levels": [p.level or 0 for p in shape.text_frame.paragraphs],
+            "width_in": shape.width / 914400, "font_size": size, "font_name": font_name,
+            "height_in": shape.height / 914400, "autofit": autofit,
+        })
+    return cases
+
+
+def _time_layouts(cases, repeat):
+    t0 = time.perf_counter()
+    for c in cases:
+        layout_text(c["paragraphs"], c["width_in"], c["font_size"], c["font_name"], levels=c["levels"])
+    cold = (time.perf_counter() - t0) / max(len(cases), 1)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for c in cases:
+            layout_text(c["paragraphs"], c["width_in"], c["font_size"], c["font_name"], levels=c["levels"])
+    warm = (time.perf_counter() - t0) / max(len(cases) * repeat, 1)
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the font-metric text layout against the 0.55 heuristic")
+    parser.add_argument("benchmark_dir", nargs="?", default="./benchmark_withpostergen_flat_final")
+    parser.add_argument("--repeat", type=int, default=20, help="Warm-cache repetitions")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    cases = []
+    for path in sorted(Path(args.benchmark_dir).glob("**/*.pptx")):
+        cases.extend(_text_cases(path))
+    print(f"[INFO] {len(cases)} text elements")
+    if not cases:
+        return
+
+    text_metrics.font_metrics.cache_clear()
+    cold, warm = _time_layouts(cases, args.repeat)
+
+    diffs, err_metric, err_heur = [], [], []
+    for c in cases:
+        layout = layout_text(c["paragraphs"], c["width_in"], c["font_size"], c["font_name"], levels=c["levels"])
+        heur = _heuristic_lines(c["texts"], c["width_in"], c["font_size"])
+        diffs.append(layout.lines - heur)
+        if c["autofit"]:
+            err_metric.append(abs(layout.height_in - c["height_in"]))
+            err_heur.append(abs(heur * c["font_size"] * 1.2 / 72 + 0.2 - c["height_in"]))
+
+    report = {
+        "elements": len(cases),
+        "font_file": text_metrics.font_metrics("Arial").path,
+        "us_per_layout_cold": round(cold * 1e6, 1),
+        "us_per_layout_warm": round(warm * 1e6, 1),
+        "line_count_differs": sum(1 for d in diffs if d),
+        "mean_line_diff_vs_heuristic": round(statistics.mean(diffs), 2),
+        "autofit_elements": len(err_metric),
+        "height_mae_in_metric": round(statistics.mean(err_metric), 3) if err_metric else None,
+        "height_mae_in_heuristic": round(statistics.mean(err_heur), 3) if err_heur else None,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -43,6 +43,9 @@ def create_poster_edit_graph_v3():
         logger.info("STEP: Parsing PPTX")
         logger.info("="*60)
         
+        if state.iterate_debug and not (state.output_dir / "poster_v1.pptx").exists():
+            return {"error": f"iterate_debug starts from {state.output_dir / 'poster_v1.pptx'}, which does not exist; "
+                             f"run the job once without iterate_debug first"}
         try:
             poster_json = parse_pptx_to_json(state.pptx_path)
             convert_pptx_to_png(state.pptx_path, rewrite=True)
@@ -66,6 +69,16 @@ def create_poster_edit_graph_v3():
 
     workflow.add_node("code_execution_api", code_generation_execution_agent_api)
     workflow.add_node("review_adaption", review_adaption_agent)
+
+    def finalize_node(state: AgentState) -> dict:
+        """Write the final poster, which was handed between nodes in memory, to current_pptx_path"""
+        if state.current_pptx is not None:
+            path = state.current_pptx.persist(compress=True)
+            state.logger.info(f"Final poster written to {path}")
+        return {}
+
+    workflow.add_node("finalize", finalize_node)
+    workflow.add_edge("finalize", END)
     # --- Define Conditional Edges ---
     
 
@@ -113,7 +126,7 @@ def create_poster_edit_graph_v3():
         should_review_adaption,
         {
             "review_adaption": "review_adaption",
-            "end": END
+            "end": "finalize"
         }
     )
     def should_adapt(state: AgentState) -> Literal["content_editing", "llmcode_generator", "end"]:
@@ -138,7 +151,7 @@ def create_poster_edit_graph_v3():
         should_adapt, 
         {
             "code_execution_api": "code_execution_api",
-            "end": END
+            "end": "finalize"
         }
     )
         
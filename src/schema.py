@@ -187,8 +187,21 @@ class AgentState(BaseModel):
     
     
     current_pptx_path: Optional[PosixPath] = None
+    # In-memory PptxArtifact of the edited poster (bytes + live Presentation); current_pptx_path is
+    # written from it for the first iteration, when KEEP_INTERMEDIATE_PPTX is set and by the finalize node
+    current_pptx: Optional[Any] = None
+    # Render of current_pptx_path started in the background right after it was saved
+    # (concurrent.futures.Future -> PNG path); awaited by the reviewer
+    pending_render: Optional[Any] = None
+    # Element ids the last API batch touched / created / deleted (PosterState.changes());
+    # set together with an incrementally updated current_poster_json, None when that is unavailable
+    poster_changes: Optional[Dict[str, Any]] = None
     # operations_applied: List[EditOperation] = Field(default_factory=list)
     api_list: Optional[List[str]] = None
+    # Leading api_list lines the planner already executed while streaming Plan_APIs (PLAN_STREAMING)
+    # and their errors by line number; the code generator executes only the rest
+    streamed_api_count: int = 0
+    streamed_api_errors: Dict[int, str] = Field(default_factory=dict)
     
 
     review_adaption_result: Union[ReviewAdaptionResultNew, None] = None
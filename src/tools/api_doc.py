@@ -92,7 +92,23 @@ text_format_APIs = [
             "when you need to update one multiple attributes such as color, bold for the same element. Use 'words' parameter to highlight specific words."
         ),
         api_desc="Batch update text styles (size, color, bold, italic, underline, font) for an element or specific substring."
-    )
+    ),
+
+    API(name="fit_text_to_box",
+        parameters="(element_id, min_size=12, max_size=120)",
+        description="Sets the largest font size (between min_size and max_size) at which all text of the element fits inside its current width and height. The element size is kept.",
+        parameter_description="'element_id' (str), 'min_size' / 'max_size' (optional floats, points).",
+        example="fit_text_to_box('10', min_size=24, max_size=48)",
+        composition_instructions="Use this instead of guessing a font_size when text must fit a given box, e.g. after resizing a section or changing its text.",
+        api_desc="fit text, shrink text to fit, auto font size"),
+
+    API(name="fit_text_to_boxes",
+        parameters="(element_ids, min_size=12, max_size=120)",
+        description="Gives several text elements one common font size: the largest size at which the text of every element fits inside its own box.",
+        parameter_description="'element_ids' (list of str), 'min_size' / 'max_size' (optional floats, points).",
+        example="fit_text_to_boxes(['12', '15', '18'], min_size=20, max_size=40)",
+        composition_instructions="Use this for the body texts of parallel sections so they share one font size.",
+        api_desc="equalize font size, fit text group, uniform body text size"),
 ]
 
 # ============================================================================
@@ -381,6 +397,13 @@ utility_APIs = [
     #     example="bounds = get_element_bounds('10')",
     #     api_desc="element bounds, bounding box, coordinates"),
 
+    # API(name="get_overlap_report",
+    #     parameters="(iou_threshold=None, margin=None)",
+    #     description="Lists overlapping element pairs and elements that cross the slide margin.",
+    #     parameter_description="'iou_threshold' (float, optional, default 0.05), 'margin' (float, optional, points, default 20). Returns a dictionary with 'overlaps' and 'out_of_bounds'.",
+    #     example="report = get_overlap_report()",
+    #     api_desc="overlap check, layout check, out of bounds"),
+
     API(name="send_to_back_by_id",
         parameters="(element_id)",
         description="Moves the element to the back of the z-order (behind other elements).",
@@ -0,0 +1,205 @@
+"""
+Interpreter for LLM-produced API call lines.
+
+Each line of an api_list ("set_text_color(element_id='3', color='red')") is
+parsed once with `ast` into an `ApiCall` IR: the executor function plus its
+bound keyword arguments, defaults filled in. Compilation checks
+
+- the line is a single call of a registered API function,
+- arguments are literals (str / number / bool / None / list / tuple / dict,
+  with +, -, *, / between numbers),
+- argument names, count and types match the function signature,
+
+so a malformed line is rejected before any shape is touched, and every bad
+line of a plan is reported in one pass. Compiled lines are cached by text;
+dispatch goes through a registry built once from pptx_execuator.
+"""
+import ast
+import copy
+import inspect
+import operator
+import typing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+# pptx_execuator 中不作为 API 暴露给 LLM 的公共函数
+_NOT_API = {
+    "get_current_state", "set_current_state", "execute_api_calls", "API_executor",
+    "hex_to_rgb", "change_rect_to_rounded_rect", "force_shape_to_fit_text",
+}
+
+_BIN_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+class ApiCallError(ValueError):
+    """A line that cannot be compiled into a valid API call."""
+
+
+@dataclass(frozen=True)
+class ApiCall:
+    name: str
+    func: Callable
+    kwargs: Dict[str, Any]
+    mutable_args: bool = False  # kwargs hold lists/dicts: copy them per dispatch so the cached IR stays intact
+    parts: Tuple = ()  # (line number, line, call) folded into this call by plan_optimizer; re-run one by one if it fails
+
+    def __call__(self):
+        kwargs = copy.deepcopy(self.kwargs) if self.mutable_args else self.kwargs
+        return self.func(**kwargs)
+
+
+@dataclass
+class CompiledPlan:
+    calls: List[Tuple[int, str, ApiCall]] = field(default_factory=list)        # (line number, line, call)
+    errors: List[Tuple[int, str, Exception]] = field(default_factory=list)     # (line number, line, error)
+
+
+@lru_cache(maxsize=1)
+def api_registry() -> Dict[str, Tuple[Callable, inspect.Signature, Dict[str, Any]]]:
+    """name -> (function, signature, resolved type hints) for every API function of pptx_execuator."""
+    from . import pptx_execuator
+
+    registry = {}
+    for name, func in vars(pptx_execuator).items():
+        if name.startswith("_") or name in _NOT_API or not inspect.isfunction(func):
+            continue
+        if func.__module__ != pptx_execuator.__name__:
+            continue
+        registry[name] = (func, inspect.signature(func), typing.get_type_hints(func))
+    return registry
+
+
+def _literal(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_literal(e) for e in node.elts]
+        return values if isinstance(node, ast.List) else tuple(values)
+    if isinstance(node, ast.Dict):
+        if any(k is None for k in node.keys):
+            raise ApiCallError("'**' unpacking is not supported")
+        return {_literal(k): _literal(v) for k, v in zip(node.keys, node.values)}
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        value = _literal(node.operand)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return _UNARY_OPS[type(node.op)](value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        left, right = _literal(node.left), _literal(node.right)
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (left, right)):
+            return _BIN_OPS[type(node.op)](left, right)
+    raise ApiCallError(f"unsupported argument expression '{ast.unparse(node)}' (only literals are allowed)")
+
+
+def _type_name(tp) -> str:
+    return getattr(tp, "__name__", None) or str(tp).replace("typing.", "")
+
+
+def _check_type(value: Any, tp) -> bool:
+    if tp is Any or tp is inspect.Parameter.empty:
+        return True
+    origin = typing.get_origin(tp)
+    if origin is Union:
+        return any(_check_type(value, arg) for arg in typing.get_args(tp))
+    if tp is type(None):
+        return value is None
+    if tp is bool:
+        return isinstance(value, bool) or value in (0, 1)
+    if tp is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if tp is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if tp is str:
+        return isinstance(value, str)
+    if origin in (list, tuple):
+        if not isinstance(value, (list, tuple)):
+            return False
+        args = typing.get_args(tp)
+        if origin is list and args:
+            return all(_check_type(v, args[0]) for v in value)
+        if origin is tuple and args and args[-1] is not Ellipsis:
+            return len(value) == len(args) and all(_check_type(v, a) for v, a in zip(value, args))
+        return True
+    if origin is dict or tp is dict:
+        return isinstance(value, dict)
+    return True
+
+
+def _parse(line: str) -> ast.Call:
+    try:
+        tree = ast.parse(line, mode="eval")
+    except SyntaxError:
+        # 字符串字面量中的真实换行符 (LLM 输出常见) 转义后再试
+        try:
+            tree = ast.parse(line.replace("\n", "\\n"), mode="eval")
+        except SyntaxError as e:
+            raise ApiCallError(f"invalid syntax: {e.msg}") from None
+    call = tree.body
+    if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+        raise ApiCallError("each line must be a single API call like function(param=value, ...)")
+    return call
+
+
+def compile_line(line: str) -> ApiCall:
+    """Compile one API line into an ApiCall; raises ApiCallError if it is not a valid call."""
+    result = _compile_cached(line)
+    if isinstance(result, str):
+        raise ApiCallError(result)
+    return result
+
+
+@lru_cache(maxsize=4096)
+def _compile_cached(line: str) -> Union[ApiCall, str]:
+    """Cached compile; a rejected line is cached as its error message."""
+    try:
+        return _compile(line)
+    except ApiCallError as e:
+        return str(e)
+
+
+def _compile(line: str) -> ApiCall:
+    call = _parse(line)
+    name = call.func.id
+    registry = api_registry()
+    if name not in registry:
+        raise ApiCallError(f"unknown API function '{name}'")
+    func, signature, hints = registry[name]
+
+    if any(isinstance(a, ast.Starred) for a in call.args) or any(k.arg is None for k in call.keywords):
+        raise ApiCallError("'*' / '**' unpacking is not supported")
+    args = [_literal(a) for a in call.args]
+    kwargs = {k.arg: _literal(k.value) for k in call.keywords}
+    unknown = [k for k in kwargs if k not in signature.parameters]
+    if unknown and not any(p.kind is inspect.Parameter.VAR_KEYWORD for p in signature.parameters.values()):
+        raise ApiCallError(f"unknown argument(s) {unknown} for {name}{signature}")
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError as e:
+        raise ApiCallError(f"{name}{signature}: {e}") from None
+
+    for param, value in bound.arguments.items():
+        tp = hints.get(param, inspect.Parameter.empty)
+        # 默认值为 None 的参数可显式传 None (get_type_hints 不再把 `x: str = None` 视为 Optional)
+        if value is None and signature.parameters[param].default is None:
+            continue
+        if not _check_type(value, tp):
+            raise ApiCallError(f"'{param}' expects {_type_name(tp)}, got {type(value).__name__} {value!r}")
+
+    bound.apply_defaults()
+    mutable = any(isinstance(v, (list, dict)) for v in bound.arguments.values())
+    return ApiCall(name=name, func=func, kwargs=dict(bound.arguments), mutable_args=mutable)
+
+
+def compile_plan(api_calls: List[str]) -> CompiledPlan:
+    """Compile every non-empty, non-comment line; invalid lines are collected in `errors` instead of raising."""
+    plan = CompiledPlan()
+    for i, line in enumerate(api_calls, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            plan.calls.append((i, line, compile_line(line)))
+        except ApiCallError as e:
+            plan.errors.append((i, line, e))
+    return plan
@@ -0,0 +1,163 @@
+"""
+Per-call execution profile of the executor APIs.
+
+execute_api_calls records every executed call: API name, the element ids it
+was given, the paragraphs and runs of the elements it touched, wall time and
+whether it succeeded. Records are kept per job (the profiler lives on the
+job's PosterState, across all executor iterations) and written by the code
+generator to api_profile.json next to plan_apis.json, with per-API
+count / total / p50 / p95 / max in milliseconds.
+
+With API_PROFILE_CPROFILE_TOP=N every call also runs under cProfile and the
+stats of the N slowest calls of the job are kept (top functions by
+cumulative time). This slows execution down and is meant for profiling runs.
+
+The benchmark-wide histogram is built from the per-job files:
+
+    python -m src.evaluation.api_profile_report [benchmark_dir] [--out report.json]
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import pstats
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import API_PROFILE, API_PROFILE_CPROFILE_TOP
+
+_CPROFILE_LINES = 25  # functions listed per captured profile
+
+
+@dataclass
+class CallRecord:
+    batch: int                      # executor iteration of the job (1-based)
+    line: int                       # line number in the plan
+    api: str
+    element_ids: List[str]
+    ms: float
+    ok: bool
+    paragraphs: int = 0             # paragraphs / runs of the elements the call touched
+    runs: int = 0
+
+
+def _element_ids(kwargs: Dict) -> List[str]:
+    ids = []
+    for key, value in kwargs.items():
+        if key.endswith("_id") and isinstance(value, str):
+            ids.append(value)
+        elif key.endswith("_ids") and isinstance(value, (list, tuple)):
+            ids.extend(v for v in value if isinstance(v, str))
+    return ids
+
+
+def _text_size(shapes: Iterable) -> Tuple[int, int]:
+    paragraphs = runs = 0
+    for shape in shapes:
+        el = shape._element
+        paragraphs += int(el.xpath("count(.//a:p)"))
+        runs += int(el.xpath("count(.//a:r)"))
+    return paragraphs, runs
+
+
+def summarize(records: Iterable[Dict]) -> Dict[str, Dict]:
+    """Per-API histogram (ms) of call records, most total time first."""
+    by_api: Dict[str, List[Dict]] = {}
+    for r in records:
+        by_api.setdefault(r["api"], []).append(r)
+    summary = {}
+    for api, rs in by_api.items():
+        ms = np.array([r["ms"] for r in rs])
+        summary[api] = {
+            "count": len(rs),
+            "errors": sum(1 for r in rs if not r["ok"]),
+            "total_ms": round(float(ms.sum()), 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "mean_runs": round(float(np.mean([r["runs"] for r in rs])), 1),
+        }
+    return dict(sorted(summary.items(), key=lambda kv: -kv[1]["total_ms"]))
+
+
+class ApiProfiler:
+    """Call records of one job (see module docstring)."""
+
+    def __init__(self):
+        self.records: List[CallRecord] = []
+        self._batch = 0
+        self._slowest = []  # min-heap of (ms, seq, line, api, cProfile.Profile), at most API_PROFILE_CPROFILE_TOP
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def begin_batch(self):
+        self._batch += 1
+
+    @contextmanager
+    def capture(self):
+        """Run the block under cProfile when API_PROFILE_CPROFILE_TOP is set; yields the profile or None."""
+        if not (API_PROFILE and API_PROFILE_CPROFILE_TOP > 0):
+            yield None
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # 已有其他 profiler 在运行
+            yield None
+            return
+        try:
+            yield prof
+        finally:
+            prof.disable()
+
+    def record(self, line: int, call, seconds: float, ok: bool, state=None, touched_before: Set[str] = frozenset(),
+               prof: Optional[cProfile.Profile] = None):
+        """
+        Record one executed call. The elements it touched are its element-id arguments plus
+        whatever `state` marked touched/created since the `touched_before` snapshot.
+        """
+        if not API_PROFILE:
+            return
+        element_ids = _element_ids(call.kwargs)
+        paragraphs = runs = 0
+        if state is not None:
+            ids = set(element_ids) | ((state.touched_ids | state.created_ids) - touched_before)
+            paragraphs, runs = _text_size(state.shape_map[i] for i in ids if i in state.shape_map)
+        rec = CallRecord(batch=self._batch, line=line, api=call.name, element_ids=element_ids,
+                         ms=seconds * 1000, ok=ok, paragraphs=paragraphs, runs=runs)
+        with self._lock:
+            self.records.append(rec)
+            if prof is not None:
+                item = (rec.ms, next(self._seq), line, call.name, prof)
+                if len(self._slowest) < API_PROFILE_CPROFILE_TOP:
+                    heapq.heappush(self._slowest, item)
+                elif item[0] > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            records = [asdict(r) for r in self.records]
+            slowest = sorted(self._slowest, reverse=True)
+        profiles = []
+        for ms, _, line, api, prof in slowest:
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(_CPROFILE_LINES)
+            profiles.append({"api": api, "line": line, "ms": round(ms, 3), "stats": out.getvalue()})
+        return {
+            "calls": len(records),
+            "total_ms": round(sum(r["ms"] for r in records), 3),
+            "apis": summarize(records),
+            "records": records,
+            "cprofile": profiles,
+        }
+
+    def write_json(self, path):
+        with open(Path(path), "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
@@ -0,0 +1,235 @@
+"""
+In-memory geometry layer over PosterState.shape_map.
+
+Element boxes are kept as a NumPy struct-of-arrays (left / top / width /
+height in EMU, one row per element id) plus a uniform grid over the slide,
+so layout queries run vectorized instead of one python-pptx property read at
+a time:
+
+    box / boxes         bounds in inches
+    query_box           elements intersecting a rectangle (grid lookup)
+    overlaps            pairs with IoU above a threshold
+    out_of_bounds       elements crossing the slide margin
+    nearest             closest elements by edge-to-edge gap
+
+The index follows the shape map lazily. PosterState marks an element dirty
+when get_shape(touch=True) hands it out for modification, and when shapes
+are registered, unregistered or rolled back. Dirty rows are re-read from
+their shapes at the next query and stay dirty until `settle()` (called after
+each API call), so reads in the middle of a call still see later writes. A
+replaced shape_map or slide triggers a full rebuild.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import MARGIN_POINTS, OVERLAP_IOU_THRESHOLD
+
+EMU_PER_INCH = 914400
+EMU_PER_PT = 12700
+GRID_CELLS = 16        # grid cells per slide side
+BRUTE_FORCE_MAX = 256  # below this many elements, pairwise overlap is one dense vectorized pass
+
+
+class GeometryIndex:
+    def __init__(self, state):
+        self._state = state
+        self._shape_map = None  # shape_map / slide the arrays were built from
+        self._slide = None
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.left = self.top = self.width = self.height = np.empty(0)
+        self._dirty = set()
+        self._grid: Optional[Dict[Tuple[int, int], List[int]]] = None
+
+    # ------------------------------------------------------------------
+    # sync with PosterState
+    # ------------------------------------------------------------------
+
+    def invalidate(self):
+        """Rebuild everything at the next query."""
+        self._shape_map = None
+
+    def mark_dirty(self, element_id: str):
+        self._dirty.add(element_id)
+
+    def settle(self):
+        """Re-read dirty rows once more and stop tracking them (end of an API call)."""
+        if self._shape_map is not None:
+            self._sync()
+        self._dirty.clear()
+
+    @staticmethod
+    def _read(shape) -> Tuple[float, float, float, float]:
+        vals = (shape.left, shape.top, shape.width, shape.height)
+        return tuple(np.nan if v is None else float(v) for v in vals)
+
+    def _rebuild(self):
+        state = self._state
+        self._shape_map, self._slide = state.shape_map, state.slide
+        self.ids = list(state.shape_map)
+        self._rows = {element_id: i for i, element_id in enumerate(self.ids)}
+        data = np.array([self._read(s) for s in state.shape_map.values()], dtype=np.float64).reshape(-1, 4)
+        self.left, self.top, self.width, self.height = (np.ascontiguousarray(data[:, k]) for k in range(4))
+        self._grid = None
+
+    def _sync(self):
+        state = self._state
+        shape_map = state.shape_map
+        if self._shape_map is not shape_map or self._slide is not state.slide:
+            self._rebuild()
+            return
+        rows_changed = False
+        for element_id in self._dirty:
+            shape = shape_map.get(element_id)
+            row = self._rows.get(element_id)
+            if shape is None:
+                if row is not None:  # deleted: keep the row as a NaN tombstone
+                    del self._rows[element_id]
+                    self.left[row] = self.top[row] = self.width[row] = self.height[row] = np.nan
+                    rows_changed = True
+                continue
+            vals = self._read(shape)
+            if row is None:
+                self._rows[element_id] = len(self.ids)
+                self.ids.append(element_id)
+                self.left, self.top, self.width, self.height = (
+                    np.append(arr, v) for arr, v in zip((self.left, self.top, self.width, self.height), vals)
+                )
+                rows_changed = True
+            elif vals != (self.left[row], self.top[row], self.width[row], self.height[row]):
+                self.left[row], self.top[row], self.width[row], self.height[row] = vals
+                rows_changed = True
+        if len(self._rows) != len(shape_map):  # shapes added/removed behind our back
+            self._rebuild()
+        elif rows_changed:
+            self._grid = None
+
+    # ------------------------------------------------------------------
+    # grid
+    # ------------------------------------------------------------------
+
+    def _cell_size(self) -> Tuple[float, float]:
+        prs = self._state.prs
+        return prs.slide_width / GRID_CELLS, prs.slide_height / GRID_CELLS
+
+    def _cell_ranges(self, left, top, right, bottom):
+        cw, ch = self._cell_size()
+        return (np.floor(left / cw).astype(int), np.floor(top / ch).astype(int),
+                np.floor(right / cw).astype(int), np.floor(bottom / ch).astype(int))
+
+    def _get_grid(self) -> Dict[Tuple[int, int], List[int]]:
+        if self._grid is None:
+            valid = self._valid_rows()
+            x0, y0, x1, y1 = self._cell_ranges(self.left[valid], self.top[valid],
+                                               self.left[valid] + self.width[valid], self.top[valid] + self.height[valid])
+            grid: Dict[Tuple[int, int], List[int]] = {}
+            for row, a, b, c, d in zip(valid.tolist(), x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist()):
+                for cx in range(a, c + 1):
+                    for cy in range(b, d + 1):
+                        grid.setdefault((cx, cy), []).append(row)
+            self._grid = grid
+        return self._grid
+
+    def _valid_rows(self) -> np.ndarray:
+        return np.flatnonzero(~np.isnan(self.left + self.top + self.width + self.height))
+
+    # ------------------------------------------------------------------
+    # queries (results in inches)
+    # ------------------------------------------------------------------
+
+    def box(self, element_id: str) -> Tuple[float, float, float, float]:
+        """(left, top, right, bottom) in inches."""
+        self._sync()
+        row = self._rows[element_id]
+        l, t = self.left[row], self.top[row]
+        return (float(l / EMU_PER_INCH), float(t / EMU_PER_INCH),
+                float((l + self.width[row]) / EMU_PER_INCH), float((t + self.height[row]) / EMU_PER_INCH))
+
+    def boxes(self, element_ids: Sequence[str]) -> np.ndarray:
+        """(n, 4) EMU array of left, top, width, height for the given ids (KeyError for unknown ids)."""
+        self._sync()
+        rows = [self._rows[e] for e in element_ids]
+        return np.stack([self.left[rows], self.top[rows], self.width[rows], self.height[rows]], axis=1)
+
+    def query_box(self, left: float, top: float, right: float, bottom: float) -> List[str]:
+        """Ids of elements intersecting the rectangle (inches)."""
+        self._sync()
+        l, t, r, b = (v * EMU_PER_INCH for v in (left, top, right, bottom))
+        x0, y0, x1, y1 = (int(v) for v in self._cell_ranges(np.array(l), np.array(t), np.array(r), np.array(b)))
+        grid = self._get_grid()
+        cand = sorted({row for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) for row in grid.get((cx, cy), ())})
+        if not cand:
+            return []
+        cand = np.array(cand)
+        hit = (self.left[cand] < r) & (self.left[cand] + self.width[cand] > l) & \
+              (self.top[cand] < b) & (self.top[cand] + self.height[cand] > t)
+        return [self.ids[i] for i in cand[hit]]
+
+    def _candidate_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        valid = self._valid_rows()
+        if len(valid) <= BRUTE_FORCE_MAX:
+            i, j = np.triu_indices(len(valid), 1)
+            return valid[i], valid[j]
+        pairs = set()
+        for rows in self._get_grid().values():
+            for a in range(len(rows)):
+                for b in range(a + 1, len(rows)):
+                    pairs.add((min(rows[a], rows[b]), max(rows[a], rows[b])))
+        if not pairs:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        arr = np.array(sorted(pairs))
+        return arr[:, 0], arr[:, 1]
+
+    def overlaps(self, iou_threshold: Optional[float] = None) -> List[Dict]:
+        """Element pairs whose IoU exceeds the threshold (config.OVERLAP_IOU_THRESHOLD by default), highest first."""
+        threshold = OVERLAP_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        self._sync()
+        i, j = self._candidate_pairs()
+        if len(i) == 0:
+            return []
+        l, t, w, h = self.left, self.top, self.width, self.height
+        iw = np.minimum(l[i] + w[i], l[j] + w[j]) - np.maximum(l[i], l[j])
+        ih = np.minimum(t[i] + h[i], t[j] + h[j]) - np.maximum(t[i], t[j])
+        inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+        union = w[i] * h[i] + w[j] * h[j] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        hit = np.flatnonzero(iou > threshold)
+        hit = hit[np.argsort(-iou[hit], kind="stable")]
+        return [
+            {"ids": (self.ids[i[k]], self.ids[j[k]]), "iou": round(float(iou[k]), 3),
+             "overlap_area": round(float(inter[k]) / EMU_PER_INCH ** 2, 2)}
+            for k in hit
+        ]
+
+    def out_of_bounds(self, margin_pt: Optional[float] = None) -> List[Dict]:
+        """Elements crossing the slide edge minus a margin (config.MARGIN_POINTS by default); overflow per side in inches."""
+        margin = (MARGIN_POINTS if margin_pt is None else margin_pt) * EMU_PER_PT
+        self._sync()
+        prs = self._state.prs
+        valid = self._valid_rows()
+        l, t = self.left[valid], self.top[valid]
+        over = np.stack([
+            margin - l,
+            margin - t,
+            l + self.width[valid] - (prs.slide_width - margin),
+            t + self.height[valid] - (prs.slide_height - margin),
+        ], axis=1)
+        out = []
+        for k in np.flatnonzero((over > 0).any(axis=1)):
+            sides = {side: round(float(v) / EMU_PER_INCH, 2) for side, v in zip(("left", "top", "right", "bottom"), over[k]) if v > 0}
+            out.append({"id": self.ids[valid[k]], "overflow": sides})
+        return out
+
+    def nearest(self, element_id: str, k: int = 1) -> List[Tuple[str, float]]:
+        """The k elements closest to `element_id` by edge-to-edge gap (0 when touching/overlapping), in inches."""
+        self._sync()
+        row = self._rows[element_id]
+        valid = self._valid_rows()
+        valid = valid[valid != row]
+        l, t, r, b = self.left, self.top, self.left + self.width, self.top + self.height
+        dx = np.maximum(0, np.maximum(l[valid] - r[row], l[row] - r[valid]))
+        dy = np.maximum(0, np.maximum(t[valid] - b[row], t[row] - b[valid]))
+        gap = np.hypot(dx, dy)
+        order = np.argsort(gap, kind="stable")[:k]
+        return [(self.ids[valid[n]], round(float(gap[n]) / EMU_PER_INCH, 3)) for n in order]
@@ -0,0 +1,141 @@
+"""
+Image ingest for insert_image / replace_image, and media cleanup of the package.
+
+Paper figures come out of docling at images_scale=3.0, often several times
+the resolution their box on the poster can show. `ingest_image` downsamples
+a figure to its target box at IMAGE_INGEST_DPI (never upsampling) and
+re-encodes it:
+- PNG for figures with transparency or a small palette (plots, diagrams);
+- JPEG at IMAGE_INGEST_JPEG_QUALITY for photographic content.
+The source file is kept when the result would not be smaller. Results are
+stored in the render cache (same LRU size bound as the renders), keyed by
+(hash of the source bytes, target pixel size), so the same figure at the
+same size is processed once and yields identical bytes. python-pptx then stores it as a
+single media part, however often it is inserted.
+
+`clean_media` runs before every save. It merges image parts with identical
+bytes (posters produced by other tools often carry duplicates) and drops
+slide relationships to images no shape references any more: delete_element
+and replace_image leave those behind, and python-pptx would keep saving the
+image.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from PIL import Image
+from pptx.parts.image import ImagePart
+
+from ..config import IMAGE_INGEST, IMAGE_INGEST_DPI, IMAGE_INGEST_JPEG_QUALITY
+from .render_cache import get_render_cache
+
+EMU_PER_INCH = 914400
+_PALETTE_MAX_COLORS = 4096  # at most this many colors (sampled) -> flat graphics, encoded as PNG
+_SAMPLE_PX = 256
+_R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_IMAGE_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+
+@lru_cache(maxsize=1024)
+def _source_hash(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _target_px(native: Tuple[int, int], width_emu: Optional[int], height_emu: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Pixel size for the box at IMAGE_INGEST_DPI (aspect kept, as python-pptx scales a missing side)."""
+    w_px, h_px = native
+    if width_emu and height_emu:
+        tw, th = width_emu / EMU_PER_INCH * IMAGE_INGEST_DPI, height_emu / EMU_PER_INCH * IMAGE_INGEST_DPI
+    elif width_emu:
+        tw = width_emu / EMU_PER_INCH * IMAGE_INGEST_DPI
+        th = tw * h_px / w_px
+    elif height_emu:
+        th = height_emu / EMU_PER_INCH * IMAGE_INGEST_DPI
+        tw = th * w_px / h_px
+    else:
+        return None  # on-poster size comes from the pixel size: resampling would change it
+    return max(1, round(tw)), max(1, round(th))
+
+
+def _is_flat(img: Image.Image) -> bool:
+    sample = img.convert("RGB")
+    sample.thumbnail((_SAMPLE_PX, _SAMPLE_PX))
+    return sample.getcolors(maxcolors=_PALETTE_MAX_COLORS) is not None
+
+
+def _encode(img: Image.Image, key: str) -> Path:
+    """Store the cached variant: PNG for transparency / flat graphics, JPEG otherwise."""
+    if img.mode in ("RGBA", "LA") or _is_flat(img):
+        ext, fmt, kwargs = "png", "PNG", {"optimize": True}
+    else:
+        img = img.convert("RGB")
+        ext, fmt, kwargs = "jpg", "JPEG", {"quality": IMAGE_INGEST_JPEG_QUALITY, "optimize": True}
+    buf = BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return get_render_cache().store_bytes(key, buf.getvalue(), ext)
+
+
+def ingest_image(image_path: Union[str, Path], width_emu: Optional[int] = None, height_emu: Optional[int] = None) -> str:
+    """
+    Path of the image to embed for a picture box of the given size (EMU; None = not given).
+    Returns `image_path` itself when ingest is off, the size is unknown, or nothing would be saved.
+    """
+    image_path = str(image_path)
+    if not IMAGE_INGEST:
+        return image_path
+    try:
+        st = os.stat(image_path)
+        with Image.open(image_path) as img:
+            native = img.size
+            target = _target_px(native, width_emu, height_emu)
+            if target is None or target[0] >= native[0] or target[1] >= native[1]:
+                return image_path
+            key = f"ingest_{_source_hash(image_path, st.st_mtime_ns, st.st_size)}_{target[0]}x{target[1]}"
+            cache = get_render_cache()
+            out = cache.lookup(key, "png") or cache.lookup(key, "jpg")
+            if out is None:
+                if img.mode not in ("RGB", "RGBA", "L", "LA"):
+                    img = img.convert("RGBA" if "transparency" in img.info or img.mode == "PA" else "RGB")
+                out = _encode(img.resize(target, Image.LANCZOS), key)
+        # 结果不比原图小时保留原图 (已缓存的变体同样判断)
+        return image_path if out.stat().st_size >= st.st_size else str(out)
+    except (OSError, ValueError) as e:  # 含缓存条目刚被淘汰
+        print(f"[WARN] 图片预处理失败, 使用原图: {image_path}: {e}")
+        return image_path
+
+
+def clean_media(prs) -> Dict[str, int]:
+    """Merge identical image parts and drop unreferenced image relationships; returns what changed."""
+    canonical: Dict[str, ImagePart] = {}
+    merged = dropped = 0
+    for slide in prs.slides:
+        part = slide.part
+        r_attrs = part._element.xpath(f"//@*[namespace-uri()='{_R_NS}']")
+        referenced = set(r_attrs)
+        for rId, rel in list(part.rels.items()):
+            if rel.is_external or rel.reltype != _IMAGE_RELTYPE:
+                continue
+            if rId not in referenced:
+                part.rels.pop(rId)
+                dropped += 1
+                continue
+            target = rel.target_part
+            if not isinstance(target, ImagePart):
+                continue
+            first = canonical.setdefault(target.sha1, target)
+            if first is not target:
+                # 引用改指向第一份相同的图片, 重复的部件随之不再保存
+                new_rId = part.relate_to(first, _IMAGE_RELTYPE)
+                for attr in r_attrs:
+                    if attr == rId:
+                        attr.getparent().set(attr.attrname, new_rId)
+                part.rels.pop(rId)
+                merged += 1
+    return {"merged": merged, "dropped": dropped}
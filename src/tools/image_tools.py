@@ -1,101 +1,144 @@
 import os
+import asyncio
 from typing import Optional, Dict, Tuple
 import threading
 # _MAX_LO_PROCS = int(os.getenv("MAX_LO_PROCS", "100"))
 # _LO_PROC_SEM = threading.Semaphore(_MAX_LO_PROCS)
-import subprocess
-import shutil
 from pathlib import Path
 import json
-import tempfile
-import uuid
-import time
 from ..tools.pptx_parser import parse_pptx_to_json
+from ..tools.render_pool import get_render_pool
+from ..tools.render_cache import get_render_cache
+from ..tools.poster_rasterizer import render_pptx_draft
+from ..tools.pptx_artifact import PptxArtifact
+from ..config import RENDER_POOL_SIZE
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
+
+# Speculative renders started right after a poster is saved (see submit_background_render)
+_BACKGROUND_RENDERS = ThreadPoolExecutor(max_workers=RENDER_POOL_SIZE, thread_name_prefix="bg-render")
+
+
+def _prepare_render(pptx_path, output_path: Optional[str], engine: str) -> Tuple[str, str, str]:
+    """Validate input and resolve (pptx_path, target_path, cache_key) for one render.
+
+    `pptx_path` may also be an in-memory PptxArtifact: its bytes are hashed
+    directly and the PNG is named after `artifact.path`, which need not exist.
+    """
+    if isinstance(pptx_path, PptxArtifact):
+        name_path = str(pptx_path.path)
+        key = get_render_cache().key_for_bytes(pptx_path.data, fmt="png", engine=engine)
+    else:
+        pptx_path = name_path = str(pptx_path)
+        if not os.path.exists(pptx_path):
+            raise FileNotFoundError(f"PPTX 文件不存在: {pptx_path}")
+        key = get_render_cache().key_for(pptx_path, fmt="png", engine=engine)
+
+    # 输出目录
+    output_dir = os.path.dirname(os.path.abspath(output_path or name_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    base_name = os.path.splitext(os.path.basename(name_path))[0]
+    suffix = "_draft" if engine == "draft" else ""
+    target_path = str(output_path or os.path.join(output_dir, f"{base_name}{suffix}.png"))
+    return pptx_path, target_path, key
+
+
+def _render_source(pptx_path, engine: str):
+    """What the renderer reads: the path, the artifact's bytes (draft) or its scratch copy (LibreOffice)."""
+    if not isinstance(pptx_path, PptxArtifact):
+        return pptx_path
+    return pptx_path.stream() if engine == "draft" else str(pptx_path.scratch_path())
+
+
+def _fetch_cached_render(key: str, target_path: str) -> bool:
+    if get_render_cache().fetch(key, target_path, fmt="png"):
+        print(f"[INFO] 渲染缓存命中，跳过转换: {target_path}")
+        return True
+    return False
+
+
+def _finish_render(key: str, target_path: str) -> Path:
+    get_render_cache().store(key, target_path, fmt="png")
+    print(f"[SUCCESS] PPTX 转换完成：{target_path}")
+    return Path(target_path)
+
+
 # use pptx_path only, don't use output_pathv
-def convert_pptx_to_png(pptx_path, rewrite: bool = False, output_path: str = None) -> str:
+def convert_pptx_to_png(pptx_path, rewrite: bool = False, output_path: str = None, engine: str = "libreoffice") -> str:
     """
     将单页 PPTX 转换为 PNG 图片（依赖 LibreOffice）。
 
+    engine="draft" draws the poster with the Pillow rasterizer instead
+    (`poster_rasterizer`, no LibreOffice, approximate) and writes
+    `<base>_draft.png` so it never shadows the exact render.
+
+    Renders are looked up in the content-addressed `render_cache` first (key =
+    hash of the PPTX bytes + render options), so an unchanged poster is never
+    rendered twice, whatever its path. Since a cached PNG can no longer be
+    stale, `rewrite` is kept only for call-site compatibility.
+
     Concurrency note (Docker/headless):
-    LibreOffice uses a lock in its user profile directory. If multiple soffice
-    processes share the same profile, conversions will intermittently fail with
-    "returned non-zero exit status 1".
-    We avoid this by using a unique UserInstallation directory per call.
+    Conversions run on the persistent worker pool in `render_pool`; every
+    worker owns its own UserInstallation profile, so concurrent calls never
+    share a profile lock and no LibreOffice cold start is paid per render.
+    Blocks the caller; async code should use `aconvert_pptx_to_png`.
     """
-    pptx_path = str(pptx_path)
-    if not os.path.exists(pptx_path):
-        raise FileNotFoundError(f"PPTX 文件不存在: {pptx_path}")
+    pptx_path, target_path, key = _prepare_render(pptx_path, output_path, engine)
+    if _fetch_cached_render(key, target_path):
+        return Path(target_path)
 
-    if not shutil.which("soffice"):
-        raise EnvironmentError("未检测到 LibreOffice，请确保命令行可执行 `soffice`")
+    # Render straight to target_path (the pool renders in a private scratch dir),
+    # so concurrent renders sharing a basename never move each other's output
+    source = _render_source(pptx_path, engine)
+    try:
+        if engine == "draft":
+            render_pptx_draft(source, target_path)
+        else:
+            print(f"[INFO] 正在调用 LibreOffice 转换: {source}")
+            get_render_pool().convert(source, os.path.dirname(target_path), fmt="png", target_path=target_path)
+    finally:
+        if isinstance(pptx_path, PptxArtifact):
+            pptx_path.release_scratch()
+    return _finish_render(key, target_path)
+
+
+async def aconvert_pptx_to_png(pptx_path, output_path: str = None, engine: str = "libreoffice", timeout: Optional[float] = None) -> Path:
+    """
+    Async `convert_pptx_to_png` for the LangGraph nodes and the backend.
 
-    # 输出目录
-    output_dir = os.path.dirname(os.path.abspath(output_path or pptx_path))
-    os.makedirs(output_dir, exist_ok=True)
+    Never blocks the event loop: LibreOffice renders go through
+    `RenderPool.aconvert` (asyncio subprocess, pool-bounded concurrency,
+    timeout / cancellation kill the worker), file hashing, cache I/O and the
+    draft rasterizer run in a thread.
+    """
+    pptx_path, target_path, key = await asyncio.to_thread(_prepare_render, pptx_path, output_path, engine)
+    if await asyncio.to_thread(_fetch_cached_render, key, target_path):
+        return Path(target_path)
 
-    base_name = os.path.splitext(os.path.basename(pptx_path))[0]
-    generated_path = os.path.join(output_dir, f"{base_name}.png")
+    source = await asyncio.to_thread(_render_source, pptx_path, engine)
+    try:
+        if engine == "draft":
+            await asyncio.to_thread(render_pptx_draft, source, target_path)
+        else:
+            print(f"[INFO] 正在调用 LibreOffice 转换: {source}")
+            await get_render_pool().aconvert(source, os.path.dirname(target_path), fmt="png", timeout=timeout, target_path=target_path)
+    finally:
+        if isinstance(pptx_path, PptxArtifact):
+            pptx_path.release_scratch()
+    return await asyncio.to_thread(_finish_render, key, target_path)
+
+
+def submit_background_render(pptx_path, output_path: str = None, engine: str = "libreoffice") -> Future:
+    """
+    Start `convert_pptx_to_png` in a background thread and return its Future.
+    `pptx_path` may be a PptxArtifact (see `_prepare_render`).
 
-    
-    if os.path.exists(generated_path) and not rewrite:
-        # # 如果用户指定了 output_path，则重命名
-        # if output_path and output_path != generated_path:
-        #     shutil.move(generated_path, output_path)
-        #     generated_path = output_path
-
-        print(f"[INFO] PNG 文件已存在，跳过转换: {generated_path}")
-        return Path(generated_path)
-
-
-    # Unique LibreOffice profile per conversion (critical for concurrency)
-    profile_dir = Path(tempfile.gettempdir()) / f"lo_profile_{uuid.uuid4().hex}"
-    profile_dir.mkdir(parents=True, exist_ok=True)
-
-    # LibreOffice expects a file:// URI. Also, it must be absolute.
-    profile_uri = profile_dir.resolve().as_uri()
-
-    cmd = [
-        "soffice",
-        "--headless",
-        f"-env:UserInstallation={profile_uri}",
-        "--nologo",
-        "--nofirststartwizard",
-        "--norestore",
-        "--convert-to", "png",
-        "--outdir", output_dir,
-        pptx_path,
-    ]
-
-    print(f"[INFO] 正在调用 LibreOffice 转换: {' '.join(cmd)}")
-
-    # Small retry helps with occasional transient LO failures
-    last_err: Optional[Exception] = None
-    for attempt in range(1, 4):
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            break
-        except subprocess.CalledProcessError as e:
-            last_err = e
-            print(f"[WARN] soffice 转换失败 (attempt {attempt}/3). stderr:\n{e.stderr}")
-            time.sleep(0.5 * attempt)
-    else:
-        # clean profile then raise
-        try:
-            shutil.rmtree(profile_dir, ignore_errors=True)
-        finally:
-            raise last_err  # type: ignore[misc]
-
-    # 如果用户指定了 output_path，则重命名
-    if output_path and output_path != generated_path:
-        shutil.move(generated_path, output_path)
-        generated_path = output_path
-
-    # Cleanup profile dir
-    shutil.rmtree(profile_dir, ignore_errors=True)
-
-    print(f"[SUCCESS] PPTX 转换完成：{generated_path}")
-    return Path(generated_path)
+    Safe to call from sync graph nodes (no event loop needed); async consumers
+    await it with `asyncio.wrap_future`. The result lands in the render cache
+    as well, so a consumer that misses the Future still gets a cache hit.
+    """
+    return _BACKGROUND_RENDERS.submit(convert_pptx_to_png, pptx_path, output_path=output_path, engine=engine)
 
 
 # """
@@ -0,0 +1,195 @@
+"""
+On-disk cache of LLM responses with record / replay.
+
+Re-running benchmark_multi or debugging one poster used to re-pay every
+planner, paper-tool and reviewer call even when the prompt and images were
+byte-identical. `_invoke_with_retries` / `_ainvoke_with_retries` (tools/utils)
+look responses up here first, depending on LLM_CACHE_MODE:
+
+- off:          no caching (default)
+- read-through: serve hits, call the model on a miss and store the response
+- record:       always call the model and store (overwrite) the response
+- replay-only:  serve hits, raise LLMCacheMiss on a miss; no model is called,
+                so the non-LLM parts of the pipeline run deterministically
+                and offline
+
+The key is the SHA-256 of the model class and identifying parameters
+(model, temperature, max tokens, ...), the kwargs bound to it (tools,
+tool_choice) and the messages (type, content parts, tool calls). Long
+strings, i.e. base64 image / PDF payloads, enter the key as their own hash.
+Message ids and response metadata are not part of the key.
+
+Entries are zlib-compressed JSON (langchain message_to_dict) in one SQLite
+file at LLM_CACHE_PATH, which several processes can share. Entries older
+than LLM_CACHE_TTL_S are dropped, and the least recently used ones are
+evicted above LLM_CACHE_MAX_BYTES. Only message responses are cached.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableBinding
+
+from ..config import LLM_CACHE_MAX_BYTES, LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_TTL_S
+
+MODES = ("off", "read-through", "record", "replay-only")
+_HASHED_STR_LEN = 1024  # longer strings (base64 payloads) enter the key as their hash
+_EVICT_EVERY = 64       # stores between TTL / size sweeps
+
+
+class LLMCacheMiss(RuntimeError):
+    """No cached response for a call in replay-only mode."""
+
+
+def _normalize(obj):
+    if isinstance(obj, PromptValue):
+        obj = obj.to_messages()
+    if isinstance(obj, BaseMessage):
+        return {
+            "type": obj.type,
+            "content": _normalize(obj.content),
+            "name": obj.name,
+            "tool_calls": _normalize([{k: c.get(k) for k in ("name", "args", "id")} for c in getattr(obj, "tool_calls", [])]),
+            "tool_call_id": getattr(obj, "tool_call_id", None),
+        }
+    if isinstance(obj, str):
+        if len(obj) > _HASHED_STR_LEN:
+            return f"sha256:{hashlib.sha256(obj.encode('utf-8')).hexdigest()}:{len(obj)}"
+        return obj
+    if isinstance(obj, (bytes, bytearray)):
+        return f"sha256:{hashlib.sha256(obj).hexdigest()}:{len(obj)}"
+    if isinstance(obj, dict):
+        return {str(k): _normalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(v) for v in obj]
+    return obj
+
+
+def _model_identity(llm) -> Dict[str, Any]:
+    bound: Dict[str, Any] = {}
+    while isinstance(llm, RunnableBinding):  # bind_tools / bind
+        bound = {**llm.kwargs, **bound}
+        llm = llm.bound
+    return {
+        "class": type(llm).__name__,
+        "params": getattr(llm, "_identifying_params", {}),
+        "bound": _normalize(bound),
+    }
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_PATH, mode: str = LLM_CACHE_MODE,
+                 ttl_s: float = LLM_CACHE_TTL_S, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        if mode not in MODES:
+            raise ValueError(f"LLM_CACHE_MODE must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, "
+                       "accessed REAL, size INTEGER, value BLOB)")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def key(llm, prompt) -> str:
+        """Hash of the model, its parameters and bound kwargs, and the prompt."""
+        blob = json.dumps({"model": _model_identity(llm), "prompt": _normalize(prompt)},
+                          sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[BaseMessage]:
+        """Cached response for `key` (None on a miss, or always in record mode)."""
+        if self.mode in ("off", "record"):
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_s and row[0] < now - self.ttl_s:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+            else:
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.hits += 1
+        if row is None:
+            if self.mode == "replay-only":
+                raise LLMCacheMiss(f"No cached LLM response for key {key[:16]} (LLM_CACHE_MODE=replay-only)")
+            return None
+        return messages_from_dict([json.loads(zlib.decompress(row[1]))])[0]
+
+    def store(self, key: str, response):
+        if self.mode not in ("read-through", "record") or not isinstance(response, BaseMessage):
+            return
+        value = zlib.compress(json.dumps(message_to_dict(response), ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, now, now, len(value), value))
+            self._stores += 1
+            if self._stores % _EVICT_EVERY == 1:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        db = self._db
+        if self.ttl_s:
+            self.evictions += db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 按最近访问时间从旧到新删除, 直到总大小低于上限
+        cutoff, freed = None, 0
+        for accessed, size in db.execute("SELECT accessed, size FROM responses ORDER BY accessed"):
+            cutoff, freed = accessed, freed + size
+            if total - freed <= self.max_bytes:
+                break
+        self.evictions += db.execute("DELETE FROM responses WHERE accessed <= ?", (cutoff,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = nbytes = 0
+            if self._db is not None:
+                entries, nbytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {"mode": self.mode, "entries": entries, "bytes": nbytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+_CACHE: Optional[LLMCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide cache, created on first use."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMCache()
+    return _CACHE
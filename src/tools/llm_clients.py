@@ -0,0 +1,248 @@
+"""
+Process-wide registry of LangChain chat models on shared HTTP connection pools.
+
+The planner, reviewer, paper-understanding tool and judge used to construct a
+new ChatOpenAI / ChatGoogleGenerativeAI on every invocation, each with its
+own httpx client: connection pools and TLS sessions were thrown away between
+graph nodes and between jobs. `get_chat_model(provider, **params)` returns
+one model per (provider, model, base_url, generation params) instead:
+
+- openai: the model gets the shared httpx clients (keep-alive, HTTP/2 when
+  the h2 package is installed, LLM_HTTP_* limits), so all OpenAI-compatible
+  endpoints reuse one pool;
+- google: the google-genai SDK builds its own httpx clients; they get the
+  same limits through `client_args` and are kept with the cached model.
+
+httpx async clients are bound to the event loop that first uses them, so
+async clients and the models holding them are kept per running loop (one for
+benchmark_multi, one per worker loop in the backend); the sync client is
+shared by everything.
+
+`pool_stats()` reports per pool: requests, in-flight and peak in-flight
+requests against LLM_HTTP_MAX_CONNECTIONS (saturation), open / idle
+connections and requests queued for a connection.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import json
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+
+from ..config import (LLM_HTTP2, LLM_HTTP_KEEPALIVE_EXPIRY, LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE,
+                      LLM_HTTP_TIMEOUT)
+
+_HTTP2 = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0)
+
+
+# ----------------------------------------------------------------------------
+# 计量的 transport: 统计并发请求数 (直到响应体关闭) 与连接池状态
+# ----------------------------------------------------------------------------
+
+class _PoolMeter:
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def done_callback(self):
+        finished = False
+
+        def done():
+            nonlocal finished
+            with self._lock:
+                if not finished:
+                    finished = True
+                    self.in_flight -= 1
+        return done
+
+    def stats(self, pool) -> Dict[str, Any]:
+        connections = list(getattr(pool, "connections", []))
+        queued = sum(1 for r in getattr(pool, "_requests", []) if r.is_queued())
+        with self._lock:
+            return {
+                "pool": self.name,
+                "http2": _HTTP2,
+                "max_connections": LLM_HTTP_MAX_CONNECTIONS,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "saturation": round(self.peak_in_flight / LLM_HTTP_MAX_CONNECTIONS, 3),
+                "connections": len(connections),
+                "idle_connections": sum(1 for c in connections if c.is_idle()),
+                "queued": queued,
+            }
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream, done):
+        self._stream, self._done = stream, done
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream, done):
+        self._stream, self._done = stream, done
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+class _MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, meter: _PoolMeter, **kwargs):
+        super().__init__(**kwargs)
+        self.meter = meter
+
+    def handle_request(self, request):
+        self.meter.start()
+        done = self.meter.done_callback()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            done()
+            raise
+        response.stream = _MeteredStream(response.stream, done)
+        return response
+
+
+class _AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, meter: _PoolMeter, **kwargs):
+        super().__init__(**kwargs)
+        self.meter = meter
+
+    async def handle_async_request(self, request):
+        self.meter.start()
+        done = self.meter.done_callback()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            done()
+            raise
+        response.stream = _AsyncMeteredStream(response.stream, done)
+        return response
+
+
+# ----------------------------------------------------------------------------
+# 共享的 httpx client 与模型注册表
+# ----------------------------------------------------------------------------
+
+class _LoopClients:
+    """Async httpx client and chat models of one event loop (or the sync-only registry, loop None)."""
+
+    def __init__(self, name: str):
+        self.meter = _PoolMeter(name)
+        self.http: Optional[httpx.AsyncClient] = None
+        self.models: Dict[str, Any] = {}
+
+    def async_client(self) -> httpx.AsyncClient:
+        if self.http is None:
+            transport = _AsyncMeteredTransport(self.meter, limits=_limits(), http2=_HTTP2)
+            self.http = httpx.AsyncClient(transport=transport, timeout=_timeout())
+        return self.http
+
+
+_lock = threading.Lock()
+_sync_meter = _PoolMeter("sync")
+_sync_client: Optional[httpx.Client] = None
+_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+_no_loop = _LoopClients("no-loop")
+
+
+def _shared_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        transport = _MeteredTransport(_sync_meter, limits=_limits(), http2=_HTTP2)
+        _sync_client = httpx.Client(transport=transport, timeout=_timeout())
+    return _sync_client
+
+
+def _loop_clients() -> _LoopClients:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _no_loop
+    clients = _by_loop.get(loop)
+    if clients is None:
+        clients = _by_loop[loop] = _LoopClients(f"async-{len(_by_loop)}")
+    return clients
+
+
+def _registry_key(provider: str, params: Dict[str, Any]) -> str:
+    blob = json.dumps({"provider": provider, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _build(provider: str, params: Dict[str, Any], clients: _LoopClients):
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(**params, http_client=_shared_sync_client(),
+                          http_async_client=clients.async_client() if clients is not _no_loop else None)
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        client_args = {"limits": _limits(), "http2": _HTTP2, **(params.pop("client_args", None) or {})}
+        return ChatGoogleGenerativeAI(**params, client_args=client_args)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def get_chat_model(provider: str, **params):
+    """
+    Shared chat model for `provider` ("openai" for ChatOpenAI and OpenAI-compatible
+    endpoints, "google" for ChatGoogleGenerativeAI) with the given constructor kwargs.
+    Equal kwargs return the same instance within one event loop.
+    """
+    key = _registry_key(provider, params)
+    with _lock:
+        clients = _loop_clients()
+        model = clients.models.get(key)
+        if model is None:
+            model = clients.models[key] = _build(provider, dict(params), clients)
+        return model
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Cached models and saturation of the shared HTTP pools (google-genai's own pools are not included)."""
+    with _lock:
+        pools = []
+        if _sync_client is not None:
+            pools.append(_sync_meter.stats(_sync_client._transport._pool))
+        for clients in list(_by_loop.values()):
+            if clients.http is not None:
+                pools.append(clients.meter.stats(clients.http._transport._pool))
+        models = len(_no_loop.models) + sum(len(c.models) for c in _by_loop.values())
+        return {"models": models, "pools": pools}
@@ -0,0 +1,327 @@
+"""
+Process-wide adaptive concurrency limiter for LLM calls, one per endpoint.
+
+planner, reviewer and paper_understanding each had their own module-level
+asyncio.Semaphore(MAX_CONCURRENCY), so the real ceiling was three times the
+configured one, and none of them backed off on 429 / 503. Every attempt made
+by `_invoke_with_retries` / `_ainvoke_with_retries` (tools/utils) now holds a
+slot of the limiter of its endpoint (model class + base URL):
+
+- AIMD: the limit starts at LLM_LIMIT_INITIAL and grows by about one per
+  limit's worth of fast successful calls, up to LLM_LIMIT_MAX
+  (MAX_CONCURRENCY). A throttling error (429 / 503 / 529, RESOURCE_EXHAUSTED)
+  halves it, and a call slower than LLM_LIMIT_LATENCY_FACTOR times the
+  baseline latency cuts it by 10%. At most one decrease per observed
+  latency, so a burst of errors from one overload counts once.
+- Token budget: with LLM_TPM_BUDGET > 0, calls also draw their estimated
+  tokens from a per-minute token bucket. The estimate is corrected with the
+  response's usage metadata.
+
+Waiters are served FIFO, from event loops (`async with`) and from threads
+(`with`) alike. A slot is not taken again by code running under one already
+held for the same limiter, e.g. extract_llm_result run with
+asyncio.to_thread inside `async with get_limiter(llm).slot(...)`; callers on
+an event loop should hold the slot there rather than block executor threads
+on it (asyncio resolves host names in the default executor).
+`limiter_stats()` exposes limit, in-flight calls, queue depth and throttling
+counts per endpoint.
+"""
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+
+from ..config import (LLM_LIMIT_INITIAL, LLM_LIMIT_LATENCY_FACTOR, LLM_LIMIT_MAX, LLM_LIMIT_MIN, LLM_TPM_BUDGET)
+
+_THROTTLE_STATUS = {429, 503, 529}
+_THROTTLE_TEXT = re.compile(r"\b(429|503|529)\b|RESOURCE_EXHAUSTED|rate.?limit|overloaded", re.IGNORECASE)
+_HELD: contextvars.ContextVar = contextvars.ContextVar("llm_limiter_held", default=None)  # limiter whose slot this context holds
+_TOKENS_PER_IMAGE = 1000   # rough prompt tokens of an image / file part
+_OUTPUT_TOKENS_EST = 1000  # reserved for the response until usage metadata corrects it
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """Whether an LLM client error means the endpoint is throttling or overloaded."""
+    for code in (getattr(exc, "status_code", None), getattr(exc, "code", None),
+                 getattr(getattr(exc, "response", None), "status_code", None)):
+        if isinstance(code, int):
+            return code in _THROTTLE_STATUS
+    return bool(_THROTTLE_TEXT.search(str(exc)))
+
+
+def estimate_tokens(prompt) -> int:
+    """Rough token count of a prompt (4 characters per token, a fixed amount per image) plus the response."""
+    if isinstance(prompt, PromptValue):
+        prompt = prompt.to_messages()
+    chars = images = 0
+    stack = [prompt]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, BaseMessage):
+            stack.append(obj.content)
+        elif isinstance(obj, str):
+            chars += len(obj)
+        elif isinstance(obj, dict):
+            if obj.get("type") in ("image_url", "image", "file", "media"):
+                images += 1
+            else:
+                stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return chars // 4 + images * _TOKENS_PER_IMAGE + _OUTPUT_TOKENS_EST
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "event", "granted")
+
+    def __init__(self, loop=None, future=None, event=None):
+        self.loop, self.future, self.event = loop, future, event
+        self.granted = False
+
+
+def _grant_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Slot:
+    """One call's hold on a limiter slot; usable with `async with` and `with`."""
+
+    def __init__(self, limiter: "AdaptiveLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.used_tokens: Optional[int] = None
+        self._t0 = 0.0
+        self._held = None  # contextvar token; None when nested in a slot of the same limiter
+
+    def record(self, response):
+        """Take the actual token usage from the response (if it reports one); returns the response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            self.used_tokens = usage["total_tokens"]
+        return response
+
+    async def __aenter__(self):
+        if _HELD.get() is not self.limiter:
+            await self.limiter.acquire(self.tokens)
+            self._enter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._exit(exc)
+
+    def __enter__(self):
+        if _HELD.get() is not self.limiter:
+            self.limiter.acquire_sync(self.tokens)
+            self._enter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._exit(exc)
+
+    def _enter(self):
+        self._held = _HELD.set(self.limiter)
+        self._t0 = time.monotonic()
+
+    def _exit(self, exc):
+        if self._held is None:
+            return
+        _HELD.reset(self._held)
+        if self.used_tokens is not None:
+            self.limiter.refund_tokens(self.tokens - self.used_tokens)
+        if exc is None:
+            self.limiter.release(latency_s=time.monotonic() - self._t0)
+        else:
+            self.limiter.release(throttled=isinstance(exc, Exception) and is_throttled(exc))
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str, initial: int = LLM_LIMIT_INITIAL, min_limit: int = LLM_LIMIT_MIN,
+                 max_limit: int = LLM_LIMIT_MAX, latency_factor: float = LLM_LIMIT_LATENCY_FACTOR,
+                 tokens_per_minute: int = LLM_TPM_BUDGET):
+        self.name = name
+        self.min_limit, self.max_limit = max(1, min_limit), max(1, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_factor = latency_factor
+        self.tpm = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+        self.in_flight = 0
+        self.peak_queued = 0
+        self.calls = 0
+        self.throttled = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._ewma_latency: Optional[float] = None
+        self._baseline_latency: Optional[float] = None
+
+    def slot(self, prompt) -> _Slot:
+        return _Slot(self, estimate_tokens(prompt) if self.tpm else 0)
+
+    # ------------------------------------------------------------------
+    # 令牌桶 (每分钟 token 预算)
+    # ------------------------------------------------------------------
+
+    def _take_tokens(self, n: int) -> float:
+        """Take `n` tokens from the bucket; returns 0, or the seconds to wait before trying again."""
+        if not self.tpm or not n:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.tpm, self._tokens + (now - self._refilled) * self.tpm / 60)
+            self._refilled = now
+            need = min(n, self.tpm)  # 超过整个预算的请求在桶满时放行
+            if self._tokens >= need:
+                self._tokens -= n
+                return 0.0
+            return (need - self._tokens) * 60 / self.tpm
+
+    def refund_tokens(self, n: int):
+        if self.tpm and n:
+            with self._lock:
+                self._tokens = min(self.tpm, self._tokens + n)
+
+    # ------------------------------------------------------------------
+    # 并发槽位
+    # ------------------------------------------------------------------
+
+    def _try_acquire_locked(self) -> bool:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.calls += 1
+            return True
+        return False
+
+    def _enqueue_locked(self, waiter: _Waiter):
+        self._waiters.append(waiter)
+        self.peak_queued = max(self.peak_queued, len(self._waiters))
+
+    def _wake_locked(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            self.calls += 1
+            if waiter.event is not None:
+                waiter.event.set()
+            else:
+                waiter.loop.call_soon_threadsafe(_grant_future, waiter.future)
+
+    async def acquire(self, tokens: int = 0):
+        while (wait := self._take_tokens(tokens)) > 0:
+            await asyncio.sleep(wait)
+        with self._lock:
+            if self._try_acquire_locked():
+                return
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._enqueue_locked(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release()
+            raise
+
+    def acquire_sync(self, tokens: int = 0):
+        while (wait := self._take_tokens(tokens)) > 0:
+            time.sleep(wait)
+        with self._lock:
+            if self._try_acquire_locked():
+                return
+            waiter = _Waiter(event=threading.Event())
+            self._enqueue_locked(waiter)
+        waiter.event.wait()
+
+    def release(self, latency_s: Optional[float] = None, throttled: bool = False):
+        """Give the slot back; a latency (success) or a throttling error adjusts the limit (AIMD)."""
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttled += 1
+                self._decrease_locked(now, 0.5)
+            elif latency_s is not None:
+                if self._ewma_latency is None:
+                    self._ewma_latency = self._baseline_latency = latency_s
+                else:
+                    self._ewma_latency += 0.2 * (latency_s - self._ewma_latency)
+                    # 基线取观测到的最低平均延迟, 并缓慢跟随 (模型/提示变化)
+                    self._baseline_latency = min(self._ewma_latency,
+                                                 self._baseline_latency + 0.01 * (self._ewma_latency - self._baseline_latency))
+                if latency_s > self.latency_factor * self._baseline_latency:
+                    self._decrease_locked(now, 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake_locked()
+
+    def _decrease_locked(self, now: float, factor: float):
+        if now - self._last_decrease < max(self._ewma_latency or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.decreases += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoint": self.name,
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "peak_queued": self.peak_queued,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "decreases": self.decreases,
+                "ewma_latency_s": round(self._ewma_latency, 3) if self._ewma_latency is not None else None,
+                "tpm_budget": self.tpm,
+                "tokens_available": round(self._tokens) if self.tpm else None,
+            }
+
+
+# ----------------------------------------------------------------------------
+# 按 endpoint 共享的 limiter
+# ----------------------------------------------------------------------------
+
+_LIMITERS: Dict[str, AdaptiveLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def _endpoint(llm) -> str:
+    """Model class and base URL of the chat model under bind_tools / with_structured_output wrappers."""
+    for _ in range(8):
+        inner = getattr(llm, "bound", None) or getattr(llm, "first", None)
+        if inner is None:
+            break
+        llm = inner
+    base = getattr(llm, "openai_api_base", None) or getattr(llm, "base_url", None)
+    if isinstance(base, dict):
+        base = base.get("api_endpoint")
+    return f"{type(llm).__name__}|{base or 'default'}"
+
+
+def get_limiter(llm) -> AdaptiveLimiter:
+    """Process-wide limiter of the endpoint `llm` talks to."""
+    name = _endpoint(llm)
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(name)
+        if limiter is None:
+            limiter = _LIMITERS[name] = AdaptiveLimiter(name)
+        return limiter
+
+
+def limiter_stats():
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return [limiter.stats() for limiter in limiters]
@@ -0,0 +1,214 @@
+"""
+Peephole optimizer for compiled API plans (see api_interpreter).
+
+LLM plans often spell one edit as a chain of calls on the same element
+(set_text_font_size, set_text_color, set_text_bold, text_format_brush, ...),
+each re-walking every paragraph and run, or keep calls whose effect a later
+call overwrites. Three rewrites run over the compiled calls before execution:
+
+- fuse:     consecutive run-formatting calls on one element become a single
+            run walk (pptx_execuator._apply_run_format); per property the
+            last value wins, as in sequential execution. If the fused call
+            fails (e.g. one invalid color), execute_api_calls re-runs the
+            original calls one by one, so each still fails on its own
+- collapse: move_element_relative calls on one element are summed into the
+            first one when no call in between refers to that element (with
+            the same one-by-one fallback)
+- drop:     set_element_position / set_element_size calls whose fields are
+            all set again later, with no call in between referring to the
+            element, are removed (and counted as succeeded)
+
+A call "refers to" an element when the element id appears among its string
+arguments, so anything that may read the element's geometry or text keeps
+the original order; whole-slide reads (get_overlap_report) are barriers. The
+saved time is estimated from per-API mean execution times recorded by
+execute_api_calls.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from .api_interpreter import ApiCall
+
+PlanItem = Tuple[int, str, ApiCall]  # (line number, line, call)
+
+# 只设置 run 字体属性、且对所有 run 生效的调用 -> 合并后的属性名
+_RUN_FORMAT_CALLS = {
+    "set_text_font_size": {"font_size": "font_size"},
+    "set_text_color": {"color": "color"},
+    "set_text_bold": {"bold": "bold"},
+    "set_text_italic": {"italic": "italic"},
+    "set_text_underline": {"underline": "underline"},
+    "set_font_name": {"font_name": "font_name"},
+}
+_BRUSH_FIELDS = ["font_size", "color", "bold", "italic", "underline", "font_name"]
+# 读取整页几何的调用: 之前的调用都不能跨过它合并或删除
+_GLOBAL_READS = {"get_overlap_report"}
+
+
+@dataclass
+class OptimizeStats:
+    before: int = 0
+    after: int = 0
+    fused: int = 0      # calls folded into a fused run walk
+    collapsed: int = 0  # move_element_relative calls folded into an earlier one
+    dropped: int = 0    # geometry setters overwritten later
+    est_saved_s: float = 0.0
+
+    def __str__(self):
+        return (f"{self.before} -> {self.after} calls (fused {self.fused}, collapsed {self.collapsed}, "
+                f"dropped {self.dropped}), est. {self.est_saved_s * 1000:.1f} ms saved")
+
+
+# ----------------------------------------------------------------------------
+# 每个 API 的平均执行时间 (execute_api_calls 记录), 用于估算节省的时间
+# ----------------------------------------------------------------------------
+
+_call_times: Dict[str, Tuple[int, float]] = {}
+_call_times_lock = threading.Lock()
+
+
+def record_call_time(name: str, seconds: float):
+    with _call_times_lock:
+        n, total = _call_times.get(name, (0, 0.0))
+        _call_times[name] = (n + 1, total + seconds)
+
+
+def mean_call_time(name: str) -> float:
+    n, total = _call_times.get(name, (0, 0.0))
+    return total / n if n else 0.0
+
+
+# ----------------------------------------------------------------------------
+# rewrites
+# ----------------------------------------------------------------------------
+
+def _referenced_ids(call: ApiCall) -> Set[str]:
+    ids = set()
+    for value in call.kwargs.values():
+        if isinstance(value, str):
+            ids.add(value)
+        elif isinstance(value, (list, tuple)):
+            ids.update(v for v in value if isinstance(v, str))
+    return ids
+
+
+def _run_format(call: ApiCall):
+    """Properties a run-formatting call sets, or None if the call is not one."""
+    if call.name in _RUN_FORMAT_CALLS:
+        return {field: call.kwargs[param] for param, field in _RUN_FORMAT_CALLS[call.name].items()}
+    if call.name == "text_format_brush" and call.kwargs.get("words") is None:
+        # text_format_brush 只应用为真值的属性
+        return {field: call.kwargs[field] for field in _BRUSH_FIELDS if call.kwargs.get(field)}
+    return None
+
+
+def _fuse_run_formats(items: List[PlanItem], stats: OptimizeStats) -> List[PlanItem]:
+    from . import pptx_execuator
+
+    out: List[PlanItem] = []
+    group: List[PlanItem] = []
+
+    def flush():
+        if len(group) == 1:
+            out.append(group[0])
+        elif group:
+            fmt = {}
+            for _, _, call in group:
+                fmt.update(_run_format(call))
+            element_id = group[0][2].kwargs["element_id"]
+            fused = ApiCall(name="_apply_run_format", func=pptx_execuator._apply_run_format,
+                            kwargs={"element_id": element_id, **fmt}, parts=tuple(group))
+            out.append((group[0][0], " | ".join(line for _, line, _ in group), fused))
+            stats.fused += len(group)
+            stats.est_saved_s += sum(mean_call_time(c.name) for _, _, c in group) - max(mean_call_time(c.name) for _, _, c in group)
+        group.clear()
+
+    for item in items:
+        call = item[2]
+        if _run_format(call) is not None:
+            if group and group[0][2].kwargs["element_id"] != call.kwargs["element_id"]:
+                flush()
+            group.append(item)
+        else:
+            flush()
+            out.append(item)
+    flush()
+    return out
+
+
+def _collapse_moves(items: List[PlanItem], stats: OptimizeStats) -> List[PlanItem]:
+    out: List[PlanItem] = []
+    pending: Dict[str, int] = {}  # element id -> index in `out` of the move still open for merging
+    for item in items:
+        i, line, call = item
+        if call.name == "move_element_relative":
+            element_id = call.kwargs["element_id"]
+            if element_id in pending:
+                j = pending[element_id]
+                first_i, first_line, first = out[j]
+                kwargs = {
+                    "element_id": element_id,
+                    "delta_x": (first.kwargs.get("delta_x") or 0) + (call.kwargs.get("delta_x") or 0),
+                    "delta_y": (first.kwargs.get("delta_y") or 0) + (call.kwargs.get("delta_y") or 0),
+                }
+                parts = (first.parts or ((first_i, first_line, first),)) + (item,)
+                out[j] = (first_i, f"{first_line} | {line}",
+                          ApiCall(name=first.name, func=first.func, kwargs=kwargs, parts=parts))
+                stats.collapsed += 1
+                stats.est_saved_s += mean_call_time(call.name)
+                continue
+            for ref in _referenced_ids(call):
+                pending.pop(ref, None)
+            pending[element_id] = len(out)
+        elif call.name in _GLOBAL_READS:
+            pending.clear()
+        else:
+            for ref in _referenced_ids(call):
+                pending.pop(ref, None)
+        out.append(item)
+    return out
+
+
+def _setter_fields(call: ApiCall):
+    """Geometry fields a setter writes (mirroring its own None / falsy checks), or None if not a setter."""
+    kw = call.kwargs
+    if call.name == "set_element_position":
+        return {f for f in ("left", "top") if kw.get(f)}
+    if call.name == "set_element_size":
+        return {f for f in ("width", "height") if kw.get(f) is not None}
+    return None
+
+
+def _drop_overwritten(items: List[PlanItem], stats: OptimizeStats) -> List[PlanItem]:
+    covered: Dict[str, Set[str]] = {}  # element id -> fields set by later setters (scanning backwards)
+    kept: List[PlanItem] = []
+    for item in reversed(items):
+        call = item[2]
+        fields = _setter_fields(call)
+        if fields is not None:
+            element_id = call.kwargs["element_id"]
+            later = covered.setdefault(element_id, set())
+            if later and fields <= later:
+                stats.dropped += 1
+                stats.est_saved_s += mean_call_time(call.name)
+                continue
+            later |= fields
+        elif call.name in _GLOBAL_READS:
+            covered.clear()
+        else:
+            for ref in _referenced_ids(call):
+                covered.pop(ref, None)
+        kept.append(item)
+    kept.reverse()
+    return kept
+
+
+def optimize_plan(items: List[PlanItem]) -> Tuple[List[PlanItem], OptimizeStats]:
+    """Fuse, collapse and drop calls of a compiled plan; returns the new plan and what changed."""
+    stats = OptimizeStats(before=len(items))
+    items = _fuse_run_formats(items, stats)
+    items = _collapse_moves(items, stats)
+    items = _drop_overwritten(items, stats)
+    stats.after = len(items)
+    return items, stats
@@ -0,0 +1,317 @@
+"""
+Incremental execution of a streamed Plan_APIs tool call.
+
+The planner answers with one Plan_APIs call: a long free-text `plan`, then
+`api_list`. In batch mode nothing is executed before the whole call has
+arrived. With PLAN_STREAMING the planner streams the call instead
+(`astream_plan`) and a PlanStreamExecutor follows the growing tool-call
+arguments:
+
+- _ApiListScanner picks the complete string elements of the top-level
+  "api_list" array out of the partial JSON as they arrive;
+- each complete line is compiled (api_interpreter) and dry-run against the
+  poster model (plan_validator.PlanChecker, the checks of the batch dry
+  run), then executed on the in-memory presentation in its own savepoint
+  (pptx_execuator._run_api_call). Lines run one after another in a worker
+  thread while the stream keeps being read;
+- all streamed calls sit under one outer savepoint. A line failing the dry
+  run (the batch path re-prompts the planner for it), a failing call with
+  API_PLAN_ATOMIC, a stream error (the request is retried with
+  _ainvoke_with_retries) or a final plan whose leading lines differ from
+  the executed ones (e.g. after _repair_plan) roll all of it back, and the
+  code generator executes the final plan in batch as before.
+
+Otherwise `finish()` returns the number of executed lines and their
+errors; the code generator executes only the remaining lines and commits
+(or, atomic, rolls back) the outer savepoint with them. Change tracking and
+the API profile span both parts. Cached responses (LLM_CACHE_MODE) are
+returned as they are, without streaming.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import message_chunk_to_message
+
+from ..config import API_PLAN_ATOMIC, PLAN_DRY_RUN_RETRIES
+from .api_interpreter import ApiCallError, compile_line
+from .llm_limiter import get_limiter
+from .plan_validator import PlanChecker, format_violations
+from .pptx_execuator import _run_api_call, get_current_state
+from .utils import _ainvoke_with_retries, _cached_response, _store_response
+
+_PLAN_TOOL = "Plan_APIs"
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+
+class _ApiListScanner:
+    """Complete string elements of the top-level "api_list" array of a growing JSON object."""
+
+    def __init__(self):
+        self.items: List[str] = []
+        self._pos = 0           # 下一个待扫描字符 (未闭合的字符串从头重扫)
+        self._depth = 0
+        self._key: Optional[str] = None  # 顶层最近的键
+        self._after_colon = False
+        self._in_list = False
+        self.done = False
+
+    def feed(self, text: str) -> List[str]:
+        """Elements completed since the previous call; `text` is the whole arguments string so far."""
+        new = []
+        i, n = self._pos, len(text)
+        while i < n and not self.done:
+            c = text[i]
+            if c == '"':
+                m = _STRING.match(text, i)
+                if m is None:  # 字符串尚未完整
+                    break
+                if self._in_list:
+                    value = json.loads(m.group())
+                    self.items.append(value)
+                    new.append(value)
+                elif self._depth == 1 and not self._after_colon:
+                    self._key = json.loads(m.group())
+                i = m.end()
+                continue
+            if self._in_list:
+                if c not in " \t\r\n,":
+                    self.done = True  # "]" 或非字符串元素
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._after_colon and self._key == "api_list":
+                    self._in_list = True
+                else:
+                    self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and c == ":":
+                self._after_colon = True
+            elif self._depth == 1 and c == ",":
+                self._key, self._after_colon = None, False
+            i += 1
+        self._pos = i
+        return new
+
+
+class PlanStreamExecutor:
+    """Executes the api_list lines of a streamed Plan_APIs call on the current presentation as they complete."""
+
+    def __init__(self, prs, poster_json, pptx_folder: Optional[str], logger, atomic: bool = API_PLAN_ATOMIC):
+        self.prs = prs
+        self.logger = logger
+        self.atomic = atomic
+        self.pptx_folder = pptx_folder      # insert_image 等按此目录解析相对路径 (与 dry run 一致)
+        self._checker = PlanChecker(poster_json, pptx_folder)
+        self.lines: List[str] = []          # api_list 中已完整到达的行
+        self.executed = 0                   # 已处理 (执行或跳过) 的行数
+        self.errors: Dict[int, str] = {}
+        self.aborted: Optional[str] = None  # 放弃流式执行的原因
+        self._open = False                  # 外层保存点是否已开启
+        self._scanner: Optional[_ApiListScanner] = None
+        self._args: Dict[Any, List] = {}    # tool call index -> [name, 参数片段]
+        self._worker: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()       # 保护 _running / _stopping
+        self._running = False               # 工作线程正在执行行
+        self._stopping: Optional[str] = None  # cancel() 的原因: 不再执行新行, 由最后执行的一方回滚
+        self._t0 = 0.0
+        self.first_edit_s: Optional[float] = None
+        self.stream_s: Optional[float] = None
+        self.complete_lines_s: List[float] = []
+
+    # ------------------------------------------------------------------
+    # 流 (事件循环上)
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """A new streamed request begins (nothing executed by an earlier one carries over)."""
+        if self._open:
+            self.abort("a second plan stream started")
+        self._scanner, self._args = _ApiListScanner(), {}
+        self._t0 = time.perf_counter()
+
+    def feed(self, chunk):
+        """Take one AIMessageChunk; schedules the api_list lines it completes."""
+        if self.aborted is not None:
+            return
+        for tc in getattr(chunk, "tool_call_chunks", None) or []:
+            entry = self._args.setdefault(tc.get("index"), [None, []])
+            entry[0] = entry[0] or tc.get("name")
+            if tc.get("args"):
+                entry[1].append(tc["args"])
+        plan_args = next((e for e in self._args.values() if e[0] == _PLAN_TOOL), None)
+        if plan_args is None or self._scanner.done:
+            return
+        text = "".join(plan_args[1])
+        plan_args[1] = [text]
+        new = self._scanner.feed(text)
+        if not new:
+            return
+        now = time.perf_counter() - self._t0
+        self.complete_lines_s.extend(now for _ in new)
+        start = len(self.lines)
+        self.lines.extend(new)
+        self._worker = asyncio.ensure_future(self._run_after(self._worker, start, new))
+
+    async def _run_after(self, previous: Optional[asyncio.Task], start: int, lines: List[str]):
+        if previous is not None:
+            await previous
+        if self.aborted is None:
+            await asyncio.to_thread(self._execute_lines, start, lines)
+
+    async def drain(self):
+        """Wait until every scheduled line has been executed."""
+        if self._worker is not None:
+            await self._worker
+
+    def cancel(self, reason: str):
+        """
+        Stop executing streamed lines and roll back, without waiting (the caller is being cancelled):
+        a line in progress in the worker thread finishes first and the thread rolls back after it.
+        """
+        with self._lock:
+            self._stopping = reason
+            running = self._running
+        if not running:
+            self.abort(reason)
+
+    def end_stream(self):
+        self.stream_s = time.perf_counter() - self._t0
+
+    # ------------------------------------------------------------------
+    # 执行 (工作线程中, 按行顺序)
+    # ------------------------------------------------------------------
+
+    def _execute_lines(self, start: int, lines: List[str]):
+        with self._lock:
+            if self._stopping is not None:
+                return
+            self._running = True
+        try:
+            for offset, line in enumerate(lines):
+                if self.aborted is not None or self._stopping is not None:
+                    return
+                try:
+                    self._execute(start + offset + 1, line)
+                except Exception as e:
+                    self.abort(f"line {start + offset + 1}: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+                stopping = self._stopping
+            if stopping is not None:
+                self.abort(stopping)
+
+    def _execute(self, line_no: int, line: str):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            try:
+                call = compile_line(line)
+            except ApiCallError as e:
+                if self.atomic or PLAN_DRY_RUN_RETRIES:
+                    return self.abort(f"line {line_no} does not compile: {e}")
+                self.errors[line_no] = f"[Line {line_no}] {line}\n         Error: {type(e).__name__}: {e}"
+                self.executed = line_no
+                return
+            violations = self._checker.check(line_no, line, call)
+            if violations and PLAN_DRY_RUN_RETRIES:
+                return self.abort(f"dry run violation\n{format_violations(violations)}")
+            state = get_current_state()
+            if not self._open:
+                state.set_from_prs(self.prs)
+                if self.pptx_folder is not None:
+                    state.pptx_folder_path = self.pptx_folder
+                state.reset_changes()
+                state.profiler.begin_batch()
+                state.begin()
+                self._open = True
+            error = _run_api_call(state, line_no, line, call, self.logger)
+            if self.first_edit_s is None:
+                self.first_edit_s = time.perf_counter() - self._t0
+            if error is not None:
+                if self.atomic:
+                    return self.abort(f"line {line_no} failed")
+                self.errors[line_no] = error
+        self.executed = line_no
+
+    def abort(self, reason: str):
+        """Give up streamed execution; everything executed so far is rolled back."""
+        if self.aborted is not None:
+            return
+        self.aborted = reason
+        if self._open:
+            get_current_state().rollback()
+            self._open = False
+        if self.lines:
+            self.logger.info(f"Plan streaming: rolled back {self.executed} streamed line(s), "
+                             f"the plan will be executed in batch ({reason})")
+        self.executed, self.errors = 0, {}
+
+    # ------------------------------------------------------------------
+    # 结果
+    # ------------------------------------------------------------------
+
+    def finish(self, api_list: Optional[List[str]]) -> Tuple[int, Dict[int, str]]:
+        """
+        (executed lines, their errors) of the final plan, to be skipped by the code generator.
+        The outer savepoint stays open for it; (0, {}) when the plan is to be executed in batch.
+        """
+        if self.aborted is None and self.executed and (api_list is None or api_list[:self.executed] != self.lines[:self.executed]):
+            self.abort("the final plan differs from the streamed lines")
+        if self.aborted is not None or not self.executed:
+            if self._open:
+                self.abort("no streamed lines kept")
+            return 0, {}
+        self.logger.info(f"Plan streaming: {self.executed}/{len(api_list)} line(s) executed while generating, "
+                         f"first edit after {self.first_edit_s:.2f}s, stream {self.stream_s or 0:.2f}s")
+        return self.executed, dict(self.errors)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lines_streamed": len(self.lines),
+            "lines_executed": self.executed,
+            "errors": len(self.errors),
+            "first_line_s": round(self.complete_lines_s[0], 3) if self.complete_lines_s else None,
+            "first_edit_s": round(self.first_edit_s, 3) if self.first_edit_s is not None else None,
+            "stream_s": round(self.stream_s, 3) if self.stream_s is not None else None,
+            "aborted": self.aborted,
+        }
+
+
+async def astream_plan(llm, prompt, executor: PlanStreamExecutor, *, logger=None, max_retries: Optional[int] = None):
+    """
+    `_ainvoke_with_retries` for planner calls that may answer with Plan_APIs: the response is
+    streamed into `executor`; a failed stream is rolled back and retried without streaming.
+    On cancellation the streamed lines are rolled back as well before it propagates.
+    """
+    key, cached = _cached_response(llm, prompt)
+    if cached is not None:
+        return cached
+    executor.start()
+    try:
+        async with get_limiter(llm).slot(prompt) as slot:
+            gathered = None
+            async for chunk in llm.astream(prompt):
+                gathered = chunk if gathered is None else gathered + chunk
+                executor.feed(chunk)
+            if gathered is None:
+                raise RuntimeError("empty response stream")
+            response = slot.record(message_chunk_to_message(gathered))
+        executor.end_stream()
+        await executor.drain()
+        return _store_response(key, response)
+    except Exception as e:
+        if logger:
+            logger.warning(f"llm.astream failed, falling back to ainvoke: {type(e).__name__}: {e}")
+        try:
+            await executor.drain()
+        except BaseException:
+            executor.cancel("planner cancelled")
+            raise
+        executor.abort(f"stream failed: {type(e).__name__}")
+        return await _ainvoke_with_retries(llm, prompt, logger=logger, max_retries=max_retries)
+    except BaseException:
+        executor.cancel("planner cancelled")
+        raise
@@ -0,0 +1,341 @@
+"""
+Dry run of an API plan against the PosterJSON, without touching any XML.
+
+The plan is compiled (api_interpreter: syntax, unknown functions, argument
+names and types), then replayed on a lightweight model of the poster: one
+box (type, left / top / width / height in inches) per element id. Each call
+is checked against the model and applied to it, so later lines see the
+elements earlier lines created, moved or deleted. The checks are:
+
+- every referenced element id exists (and was not deleted earlier);
+- text APIs are not applied to pictures, lines, tables or charts, and
+  replace_image only targets pictures;
+- an element id passed to insert_* / clone_element is not taken yet;
+- insert_shape gets a supported shape_type, and insert_image a file that
+  exists (when the image folder is known);
+- no element ends up with a non-positive size or outside
+  slide_width x slide_height.
+
+Every violation of the plan is collected in one pass, so the planner can be
+re-prompted with the full list before anything is executed or rendered.
+The geometry mirrors the executor APIs, including their quirks
+(set_element_position ignores a 0 coordinate).
+"""
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from .api_interpreter import compile_plan
+from ..schema import PosterJSON
+
+_TOLERANCE_IN = 0.01
+_NON_TEXT_TYPES = {"picture", "line", "table", "chart"}
+_TEXT_APIS = {
+    "set_text_content", "append_text", "add_bullet_point", "highlight_keywords", "set_text_alignment",
+    "set_text_font_size", "set_text_color", "set_text_bold", "set_text_italic", "set_text_underline",
+    "set_font_name", "text_format_brush", "fit_text_to_box", "fit_text_to_boxes",
+    "batch_set_font_size", "batch_set_color", "_apply_run_format",
+}
+# 引用已有元素的参数 (insert_* / add_callout 的 element_id 和 clone_element 的 new_id 是新元素的 ID)
+_REF_PARAMS = ("element_id", "target_element_id", "source_id", "reference_id", "new_image_element_id")
+_NEW_ID_PARAMS = {"insert_textbox": "element_id", "insert_image": "element_id", "insert_shape": "element_id",
+                  "insert_line": "element_id", "add_callout": "element_id", "clone_element": "new_id"}
+
+
+@dataclass
+class PlanViolation:
+    line_no: int
+    line: str
+    message: str
+
+    def __str__(self):
+        return f"line {self.line_no}: {self.line}\n  -> {self.message}"
+
+
+@dataclass
+class _Box:
+    type: str
+    left: Optional[float]
+    top: Optional[float]
+    width: Optional[float]
+    height: Optional[float]
+
+
+class _PosterModel:
+    def __init__(self, poster_json: PosterJSON):
+        self.slide_width = poster_json.slide_width
+        self.slide_height = poster_json.slide_height
+        self.elements: Dict[str, _Box] = {
+            e.id: _Box(e.type, e.left, e.top, e.width, e.height) for e in poster_json.elements or []
+        }
+        self.deleted: Dict[str, int] = {}  # element id -> line that deleted it
+        numeric = [int(k) for k in self.elements if k.isdigit()]
+        self.next_id = max(numeric) + 1 if numeric else 1
+
+    def new_id(self, requested: Optional[str]) -> str:
+        if requested:
+            return requested
+        element_id = str(self.next_id)
+        self.next_id += 1
+        return element_id
+
+    def missing(self, element_id: str) -> Optional[str]:
+        if element_id in self.elements:
+            return None
+        if element_id in self.deleted:
+            return f"element '{element_id}' was deleted at line {self.deleted[element_id]}"
+        return f"element '{element_id}' does not exist"
+
+    def bounds_error(self, element_id: str) -> Optional[str]:
+        box = self.elements.get(element_id)
+        if box is None or None in (box.left, box.top, box.width, box.height):
+            return None
+        if box.type != "line" and (box.width <= 0 or box.height <= 0):
+            return f"element '{element_id}' would get a non-positive size ({box.width:.2f} x {box.height:.2f} in)"
+        sides = []
+        if box.left < -_TOLERANCE_IN:
+            sides.append(f"left edge at {box.left:.2f} < 0")
+        if box.top < -_TOLERANCE_IN:
+            sides.append(f"top edge at {box.top:.2f} < 0")
+        if box.left + box.width > self.slide_width + _TOLERANCE_IN:
+            sides.append(f"right edge at {box.left + box.width:.2f} > slide_width {self.slide_width}")
+        if box.top + box.height > self.slide_height + _TOLERANCE_IN:
+            sides.append(f"bottom edge at {box.top + box.height:.2f} > slide_height {self.slide_height}")
+        if sides:
+            return f"element '{element_id}' would lie outside the slide ({', '.join(sides)} in)"
+        return None
+
+
+# ----------------------------------------------------------------------------
+# per-API model updates; each returns the ids whose geometry changed
+# ----------------------------------------------------------------------------
+
+def _set_position(m: _PosterModel, kw, line_no) -> List[str]:
+    box = m.elements[kw["element_id"]]
+    if kw.get("left"):
+        box.left = kw["left"]
+    if kw.get("top"):
+        box.top = kw["top"]
+    return [kw["element_id"]]
+
+
+def _set_size(m: _PosterModel, kw, line_no) -> List[str]:
+    box = m.elements[kw["element_id"]]
+    if kw.get("width") is not None:
+        box.width = kw["width"]
+    if kw.get("height") is not None:
+        box.height = kw["height"]
+    return [kw["element_id"]]
+
+
+def _move(box: _Box, dx: float, dy: float):
+    if box.left is not None:
+        box.left += dx
+    if box.top is not None:
+        box.top += dy
+
+
+def _move_relative(m: _PosterModel, kw, line_no) -> List[str]:
+    _move(m.elements[kw["element_id"]], kw.get("delta_x") or 0, kw.get("delta_y") or 0)
+    return [kw["element_id"]]
+
+
+def _move_group(m: _PosterModel, kw, line_no) -> List[str]:
+    ids = [eid for eid in kw["element_ids"] if eid in m.elements]
+    for eid in ids:
+        _move(m.elements[eid], kw.get("dx") or 0, kw.get("dy") or 0)
+    return ids
+
+
+def _resize(m: _PosterModel, kw, line_no) -> List[str]:
+    box, scale = m.elements[kw["element_id"]], kw["scale"]
+    if None in (box.width, box.height):
+        return []
+    new_w, new_h = box.width * scale, box.height * scale
+    if kw.get("fixed_center") and None not in (box.left, box.top):
+        box.left += (box.width - new_w) / 2
+        box.top += (box.height - new_h) / 2
+    box.width, box.height = new_w, new_h
+    return [kw["element_id"]]
+
+
+def _align(axis: str):
+    def apply(m: _PosterModel, kw, line_no) -> List[str]:
+        ids = kw["element_ids"]
+        if not ids:
+            return []
+        ref = m.elements[kw.get("reference_id") or ids[0]]
+        pos, size = ("left", "width") if axis == "x" else ("top", "height")
+        start, end = {"x": ("left", "right"), "y": ("top", "bottom")}[axis]
+        ref_pos, ref_size = getattr(ref, pos), getattr(ref, size)
+        if ref_pos is None or ref_size is None:
+            return []
+        for eid in ids:
+            box = m.elements[eid]
+            own = getattr(box, size) or 0
+            new = {start: ref_pos, "center": ref_pos + ref_size / 2 - own / 2, end: ref_pos + ref_size - own}.get(kw["alignment"])
+            if new is not None:
+                setattr(box, pos, new)
+        return list(ids)
+    return apply
+
+
+def _delete(m: _PosterModel, kw, line_no) -> List[str]:
+    for eid in kw.get("element_ids") or [kw["element_id"]]:
+        if m.elements.pop(eid, None) is not None:
+            m.deleted[eid] = line_no
+    return []
+
+
+def _insert(elem_type: str):
+    def apply(m: _PosterModel, kw, line_no) -> List[str]:
+        element_id = m.new_id(kw.get("element_id"))
+        m.elements[element_id] = _Box(elem_type, kw["left"], kw["top"], kw.get("width"), kw.get("height"))
+        m.deleted.pop(element_id, None)
+        return [element_id]
+    return apply
+
+
+def _insert_line(m: _PosterModel, kw, line_no) -> List[str]:
+    element_id = m.new_id(kw.get("element_id"))
+    x0, x1 = sorted((kw["start_x"], kw["end_x"]))
+    y0, y1 = sorted((kw["start_y"], kw["end_y"]))
+    m.elements[element_id] = _Box("line", x0, y0, x1 - x0, y1 - y0)
+    return [element_id]
+
+
+def _add_callout(m: _PosterModel, kw, line_no) -> List[str]:
+    target = m.elements[kw["target_element_id"]]
+    if None in (target.left, target.top, target.width, target.height):
+        m.elements[m.new_id(kw.get("element_id"))] = _Box("textbox", None, None, 4, 1.5)
+        return []
+    w, h, off = 4, 1.5, kw.get("offset", 1.5)
+    position = kw.get("position", "right")
+    if position == "left":
+        left, top = target.left - w - off, target.top + target.height / 2 - h / 2
+    elif position == "top":
+        left, top = target.left + target.width / 2 - w / 2, target.top - h - off
+    elif position == "bottom":
+        left, top = target.left + target.width / 2 - w / 2, target.top + target.height + off
+    elif position == "right":
+        left, top = target.left + target.width + off, target.top + target.height / 2 - h / 2
+    else:
+        left, top = target.left + target.width + off, target.top
+    element_id = m.new_id(kw.get("element_id"))
+    m.elements[element_id] = _Box("textbox", left, top, w, h)
+    return [element_id]
+
+
+def _clone(m: _PosterModel, kw, line_no) -> List[str]:
+    src = m.elements[kw["source_id"]]
+    element_id = m.new_id(kw.get("new_id"))
+    m.elements[element_id] = _Box(src.type, kw["new_left"], kw["new_top"], src.width, src.height)
+    return [element_id]
+
+
+def _replace_image(m: _PosterModel, kw, line_no) -> List[str]:
+    old = m.elements[kw["element_id"]]
+    other = kw.get("new_image_element_id")
+    if other:
+        m.elements[other].left, m.elements[other].top = old.left, old.top
+        m.elements[other].width, m.elements[other].height = old.width, old.height
+        _delete(m, {"element_id": kw["element_id"]}, line_no)
+        return [other]
+    return []
+
+
+_APPLY: Dict[str, Callable[[_PosterModel, dict, int], List[str]]] = {
+    "set_element_position": _set_position,
+    "set_element_size": _set_size,
+    "move_element_relative": _move_relative,
+    "move_group": _move_group,
+    "resize_element_proportionally": _resize,
+    "align_elements_x_axis": _align("x"),
+    "align_elements_y_axis": _align("y"),
+    "delete_element": _delete,
+    "batch_delete_elements": _delete,
+    "insert_textbox": _insert("textbox"),
+    "insert_shape": _insert("shape"),
+    "insert_image": _insert("picture"),
+    "insert_line": _insert_line,
+    "add_callout": _add_callout,
+    "clone_element": _clone,
+    "replace_image": _replace_image,
+}
+
+
+def _check(m: _PosterModel, name: str, kw: dict, pptx_folder: Optional[str]) -> List[str]:
+    """Violations of one call against the model before it is applied."""
+    errors = []
+    refs = [kw[p] for p in _REF_PARAMS if kw.get(p) and not (_NEW_ID_PARAMS.get(name) == p)]
+    if name != "move_group":  # move_group skips unknown ids itself
+        refs += list(kw.get("element_ids") or [])
+    for eid in refs:
+        problem = m.missing(eid)
+        if problem:
+            errors.append(problem)
+    if errors:
+        return errors
+
+    new_param = _NEW_ID_PARAMS.get(name)
+    if new_param and kw.get(new_param) and kw[new_param] in m.elements:
+        errors.append(f"element id '{kw[new_param]}' is already taken")
+    if name in _TEXT_APIS:
+        for eid in [kw["element_id"]] if "element_id" in kw else kw.get("element_ids", []):
+            if m.elements[eid].type in _NON_TEXT_TYPES:
+                errors.append(f"{name} needs a text element, but '{eid}' is a {m.elements[eid].type}")
+    if name == "replace_image" and m.elements[kw["element_id"]].type != "picture":
+        errors.append(f"replace_image needs a picture, but '{kw['element_id']}' is a {m.elements[kw['element_id']].type}")
+    if name == "replace_image" and not kw.get("new_image_path") and not kw.get("new_image_element_id"):
+        errors.append("replace_image needs new_image_path or new_image_element_id")
+    if name == "insert_shape":
+        from .pptx_execuator import _SHAPE_TYPES
+        if kw["shape_type"].lower() not in _SHAPE_TYPES:
+            errors.append(f"unsupported shape_type '{kw['shape_type']}' (one of {sorted(_SHAPE_TYPES)})")
+    image_path = kw.get("image_path") if name == "insert_image" else kw.get("new_image_path") if name == "replace_image" else None
+    if image_path and pptx_folder:
+        full = image_path if os.path.isabs(image_path) else os.path.join(pptx_folder, "images_and_tables/" + image_path)
+        if not os.path.exists(full):
+            errors.append(f"image '{image_path}' not found in images_and_tables/")
+    return errors
+
+
+class PlanChecker:
+    """Line-by-line form of validate_plan, for plans that arrive incrementally (streamed Plan_APIs)."""
+
+    def __init__(self, poster_json: PosterJSON, pptx_folder: Optional[str] = None):
+        self.model = _PosterModel(poster_json)
+        self.pptx_folder = pptx_folder
+
+    def check(self, line_no: int, line: str, call) -> List[PlanViolation]:
+        """Violations of one compiled call; the call is applied to the model for the lines after it."""
+        errors = _check(self.model, call.name, call.kwargs, self.pptx_folder)
+        if not errors and call.name in _APPLY:
+            for eid in _APPLY[call.name](self.model, call.kwargs, line_no):
+                problem = self.model.bounds_error(eid)
+                if problem:
+                    errors.append(problem)
+        return [PlanViolation(line_no, line, e) for e in errors]
+
+
+def validate_plan(api_lines: List[str], poster_json: PosterJSON, pptx_folder: Optional[str] = None) -> List[PlanViolation]:
+    """
+    All violations of `api_lines` against `poster_json`, in line order.
+
+    Args:
+        api_lines: the plan's api_list
+        poster_json: the poster the plan will be executed on
+        pptx_folder: folder holding images_and_tables/ (image paths are not checked when None)
+    """
+    plan = compile_plan(api_lines)
+    violations = [PlanViolation(i, line, str(e)) for i, line, e in plan.errors]
+    checker = PlanChecker(poster_json, pptx_folder)
+    for line_no, line, call in plan.calls:
+        violations.extend(checker.check(line_no, line, call))
+    violations.sort(key=lambda v: v.line_no)
+    return violations
+
+
+def format_violations(violations: List[PlanViolation]) -> str:
+    """Violation list for the re-prompt."""
+    return "\n".join(str(v) for v in violations)
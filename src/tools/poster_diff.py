@@ -0,0 +1,214 @@
+"""
+Structural diff between two PosterJSONs.
+
+Both posters are indexed by element id once (O(n)), and every element that
+differs gets a typed, per-field delta:
+
+    added         element only in the revised poster
+    removed       element only in the original poster
+    moved         left / top changed
+    resized       width / height changed
+    restyled      fill / border / font properties changed (element or run level)
+    text_changed  text changed (element text or run text)
+
+Run lists are aligned with difflib on the run texts, so inserting a run in
+the middle reports one added run instead of restyling every run after it.
+
+`PosterDiff.to_prompt()` renders the delta compactly (one JSON object per
+line, old/new pairs as [old, new]) for the reviewer prompt; `skeleton()`
+lists the geometry of unchanged elements so the layout around the edits is
+still available without the full poster dump.
+"""
+import difflib
+import json
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from ..schema import PosterElement, PosterJSON
+
+ChangeKind = Literal["added", "removed", "moved", "resized", "restyled", "text_changed"]
+
+GEOMETRY_FIELDS = {"left": "moved", "top": "moved", "width": "resized", "height": "resized"}
+STYLE_FIELDS = ["type", "fill_color", "border_color", "border_width", "border_shape", "main_font_size"]
+RUN_STYLE_FIELDS = ["bold", "italic", "underline", "font_name", "font_size", "font_color", "bullet_level"]
+_RUN_STYLE_SET = set(RUN_STYLE_FIELDS)
+
+
+class RunDelta(BaseModel):
+    """Change of one text run; `index` is the run position in the revised element (original for removed runs)."""
+    index: int
+    change: Literal["added", "removed", "modified"]
+    fields: Dict[str, Tuple[Any, Any]] = Field(default_factory=dict)  # field -> (old, new)
+
+
+class ElementDelta(BaseModel):
+    id: str
+    type: str
+    changes: List[ChangeKind]
+    fields: Dict[str, Tuple[Any, Any]] = Field(default_factory=dict)  # field -> (old, new)
+    runs: List[RunDelta] = Field(default_factory=list)
+    element: Optional[PosterElement] = None  # full element for "added"
+
+
+class PosterDiff(BaseModel):
+    elements: List[ElementDelta] = Field(default_factory=list)
+    unchanged_ids: List[str] = Field(default_factory=list)
+    slide_size: Optional[Tuple[Tuple[float, float], Tuple[float, float]]] = None  # ((old w, h), (new w, h)) if changed
+
+    def by_kind(self, kind: ChangeKind) -> List[ElementDelta]:
+        return [d for d in self.elements if kind in d.changes]
+
+    def summary(self) -> Dict[str, List[str]]:
+        """change kind -> element ids"""
+        out: Dict[str, List[str]] = {}
+        for d in self.elements:
+            for kind in d.changes:
+                out.setdefault(kind, []).append(d.id)
+        return out
+
+    def to_prompt(self, include_runs: bool = True) -> str:
+        """Compact text form for LLM prompts: one JSON object per changed element."""
+        lines = []
+        if self.slide_size:
+            lines.append(json.dumps({"slide_size": self.slide_size}))
+        for d in self.elements:
+            item: Dict[str, Any] = {"id": d.id, "type": d.type, "changes": d.changes}
+            if d.element is not None:
+                item.update(d.element.model_dump(exclude_none=True, exclude_defaults=True,
+                                                 exclude={"id", "type", "z_index", "image_path", "meta"} | (set() if include_runs else {"runs"})))
+            else:
+                item.update({k: list(v) for k, v in d.fields.items()})
+                runs = d.runs if include_runs else []
+                if "text" in d.fields:
+                    # the element text already shows the wording change; keep only runs that carry more
+                    runs = [r for r in runs if r.change != "modified" or set(r.fields) != {"text"}]
+                if runs:
+                    item["runs"] = _compact_runs(runs)
+            lines.append(json.dumps(item, ensure_ascii=False))
+        if not lines:
+            return "[]"
+        return "[\n" + ",\n".join(lines) + "\n]"
+
+
+def _compact_runs(runs: List[RunDelta]) -> List[Dict[str, Any]]:
+    """Run deltas for the prompt; consecutive runs with the same change collapse into an index range "i": "3-9"."""
+    out: List[Dict[str, Any]] = []
+    start = prev = None
+    for r in runs:
+        if prev is not None and r.index == prev.index + 1 and r.change == prev.change and r.fields == prev.fields:
+            prev = r
+            continue
+        if prev is not None:
+            out.append(_run_item(start, prev))
+        start = prev = r
+    if prev is not None:
+        out.append(_run_item(start, prev))
+    return out
+
+
+def _run_item(first: RunDelta, last: RunDelta) -> Dict[str, Any]:
+    i = first.index if first.index == last.index else f"{first.index}-{last.index}"
+    return {"i": i, "change": first.change, **{k: list(v) for k, v in first.fields.items()}}
+
+
+def _run_fields(run) -> Dict[str, Any]:
+    return run.model_dump() if run is not None else {}
+
+
+def _diff_runs(old_runs, new_runs) -> List[RunDelta]:
+    old_runs, new_runs = old_runs or [], new_runs or []
+    deltas: List[RunDelta] = []
+
+    def modified(i_old, i_new):
+        a, b = _run_fields(old_runs[i_old]), _run_fields(new_runs[i_new])
+        fields = {k: (a.get(k), b.get(k)) for k in ["text"] + RUN_STYLE_FIELDS if a.get(k) != b.get(k)}
+        if fields:
+            deltas.append(RunDelta(index=i_new, change="modified", fields=fields))
+
+    matcher = difflib.SequenceMatcher(a=[r.text for r in old_runs], b=[r.text for r in new_runs], autojunk=False)
+    for op, a0, a1, b0, b1 in matcher.get_opcodes():
+        if op == "equal":
+            for k in range(a1 - a0):
+                modified(a0 + k, b0 + k)
+            continue
+        paired = min(a1 - a0, b1 - b0) if op == "replace" else 0
+        for k in range(paired):
+            modified(a0 + k, b0 + k)
+        for i in range(a0 + paired, a1):
+            deltas.append(RunDelta(index=i, change="removed", fields={"text": (old_runs[i].text, None)}))
+        for i in range(b0 + paired, b1):
+            b = _run_fields(new_runs[i])
+            deltas.append(RunDelta(index=i, change="added", fields={k: (None, b[k]) for k in ["text"] + RUN_STYLE_FIELDS if b.get(k) is not None}))
+    return deltas
+
+
+def diff_elements(old: PosterElement, new: PosterElement) -> Optional[ElementDelta]:
+    """Per-field delta of one element present in both posters; None if nothing changed."""
+    fields: Dict[str, Tuple[Any, Any]] = {}
+    changes: List[ChangeKind] = []
+
+    for name, kind in GEOMETRY_FIELDS.items():
+        a, b = getattr(old, name), getattr(new, name)
+        if a != b:
+            fields[name] = (a, b)
+            if kind not in changes:
+                changes.append(kind)
+    for name in STYLE_FIELDS:
+        a, b = getattr(old, name), getattr(new, name)
+        if a != b:
+            fields[name] = (a, b)
+            if "restyled" not in changes:
+                changes.append("restyled")
+    if old.text != new.text:
+        fields["text"] = (old.text, new.text)
+        changes.append("text_changed")
+
+    runs = _diff_runs(old.runs, new.runs)
+    for r in runs:
+        if "text" in r.fields and "text_changed" not in changes:
+            changes.append("text_changed")
+        if r.change == "modified" and r.fields.keys() & _RUN_STYLE_SET and "restyled" not in changes:
+            changes.append("restyled")
+
+    if not changes:
+        return None
+    return ElementDelta(id=new.id, type=new.type, changes=changes, fields=fields, runs=runs)
+
+
+def diff_posters(original: PosterJSON, revised: PosterJSON) -> PosterDiff:
+    """Typed delta from `original` to `revised`, in revised z-order followed by removed elements."""
+    orig_by_id: Dict[str, PosterElement] = {}
+    for e in original.elements or []:
+        orig_by_id.setdefault(e.id, e)  # first occurrence wins, as in the old linear search
+
+    diff = PosterDiff()
+    if (original.slide_width, original.slide_height) != (revised.slide_width, revised.slide_height):
+        diff.slide_size = ((original.slide_width, original.slide_height), (revised.slide_width, revised.slide_height))
+
+    seen = set()
+    for e in revised.elements or []:
+        seen.add(e.id)
+        old = orig_by_id.get(e.id)
+        if old is None:
+            diff.elements.append(ElementDelta(id=e.id, type=e.type, changes=["added"], element=e))
+            continue
+        delta = diff_elements(old, e)
+        if delta is None:
+            diff.unchanged_ids.append(e.id)
+        else:
+            diff.elements.append(delta)
+    for e_id, e in orig_by_id.items():
+        if e_id not in seen:
+            diff.elements.append(ElementDelta(id=e_id, type=e.type, changes=["removed"]))
+    return diff
+
+
+def skeleton(poster: PosterJSON, ids: List[str]) -> str:
+    """Geometry only (id, type, left, top, width, height) of the given elements, one per line."""
+    wanted = set(ids)
+    lines = [
+        json.dumps({"id": e.id, "type": e.type, "left": e.left, "top": e.top, "width": e.width, "height": e.height})
+        for e in poster.elements or [] if e.id in wanted
+    ]
+    return "[\n" + ",\n".join(lines) + "\n]" if lines else "[]"
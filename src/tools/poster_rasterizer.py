@@ -0,0 +1,222 @@
+"""
+Draft poster rasterizer.
+
+Draws a PosterJSON straight onto a Pillow canvas: filled / outlined boxes,
+lines, word-wrapped text runs measured with the real TrueType metrics
+(FreeType via Pillow; fonts are located by text_metrics) and the pictures
+embedded in the PPTX package. It is an approximation of what LibreOffice
+renders (no effects, gradients, tables or charts, simplified paragraph
+spacing), but it needs no external process and finishes in well under a
+second, which is enough for the planner to "see" the layout. Use `src.evaluation.render_benchmark` to measure how close it
+gets to `convert_pptx_to_png`.
+"""
+import re
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from ..schema import PosterJSON, PosterElement, TextRun
+from ..config import DRAFT_RENDER_DPI, DRAFT_RENDER_MAX_PX
+from .pptx_parser import _get_theme_colors, _shape_to_element
+from .text_metrics import get_font
+
+# PowerPoint defaults for a text frame
+_INSET_LR_IN = 0.1
+_INSET_TB_IN = 0.05
+_DEFAULT_FONT_PT = 18.0
+_LINE_SPACING = 1.2
+_BULLET_INDENT_IN = 0.25
+
+
+def _parse_color(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """'#rrggbb' -> RGB. Unresolved theme indices (e.g. 'ACCENT_1 (5)') yield None."""
+    if not value or not isinstance(value, str):
+        return None
+    m = re.fullmatch(r"#?([0-9a-fA-F]{6})", value.strip())
+    if not m:
+        return None
+    h = m.group(1)
+    return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+
+
+def _split_paragraphs(elem: PosterElement) -> List[List[TextRun]]:
+    """
+    Regroup the flat `runs` list into paragraphs, using `elem.text` (paragraphs
+    joined by '\\n') to find the boundaries. Elements without runs get a single
+    default-styled run per paragraph.
+    """
+    paragraphs = (elem.text or "").split("\n")
+    runs = list(elem.runs or [])
+    if not runs:
+        return [[TextRun(text=p, font_size=elem.main_font_size)] for p in paragraphs]
+
+    grouped: List[List[TextRun]] = []
+    i = 0
+    for para in paragraphs:
+        group, consumed = [], 0
+        while i < len(runs) and consumed < len(para):
+            group.append(runs[i])
+            consumed += len(runs[i].text or "")
+            i += 1
+        grouped.append(group)
+    if i < len(runs):  # text and runs disagree (e.g. vertical tabs); keep leftovers on the last line
+        grouped[-1].extend(runs[i:])
+    return grouped
+
+
+class _TextPainter:
+    def __init__(self, draw: ImageDraw.ImageDraw, px_per_in: float):
+        self.draw = draw
+        self.px_per_in = px_per_in
+
+    def _font_for(self, run: TextRun, elem: PosterElement) -> Tuple[ImageFont.ImageFont, int]:
+        size_pt = run.font_size or elem.main_font_size or _DEFAULT_FONT_PT
+        size_px = int(round(size_pt * self.px_per_in / 72.0))
+        return get_font(run.font_name, size_px, bool(run.bold), bool(run.italic)), size_px
+
+    def paint(self, elem: PosterElement):
+        x0 = (elem.left + _INSET_LR_IN) * self.px_per_in
+        max_w = max(1.0, (elem.width - 2 * _INSET_LR_IN) * self.px_per_in)
+        y = (elem.top + _INSET_TB_IN) * self.px_per_in
+
+        for para in _split_paragraphs(elem):
+            level = next((r.bullet_level for r in para if r.bullet_level), 0) or 0
+            indent = level * _BULLET_INDENT_IN * self.px_per_in
+            # Flatten the paragraph into (token, font, size, run) pieces; tokens keep their trailing spaces
+            pieces = []
+            for run in para:
+                font, size_px = self._font_for(run, elem)
+                for tok in re.findall(r"\S+\s*|\s+", run.text or ""):
+                    pieces.append((tok, font, size_px, run))
+            if not pieces:
+                _, size_px = self._font_for(TextRun(text=""), elem)
+                y += size_px * _LINE_SPACING
+                continue
+
+            line, line_w = [], 0.0
+            for piece in pieces:
+                w = piece[1].getlength(piece[0])
+                if line and line_w + piece[1].getlength(piece[0].rstrip()) > max_w - indent:
+                    y = self._flush(line, x0 + indent, y)
+                    line, line_w = [], 0.0
+                    if not piece[0].strip():
+                        continue
+                line.append((piece, w))
+                line_w += w
+            if line:
+                y = self._flush(line, x0 + indent, y)
+
+    def _flush(self, line, x: float, y: float) -> float:
+        height = max(p[2] for p, _ in line)
+        baseline = y + height
+        for (tok, font, _, run), w in line:
+            color = _parse_color(run.font_color) or (0, 0, 0)
+            self.draw.text((x, baseline), tok, font=font, fill=color, anchor="ls")
+            if run.underline:
+                uy = baseline + max(1, height // 12)
+                self.draw.line([(x, uy), (x + w, uy)], fill=color, width=max(1, height // 16))
+            x += w
+        return y + height * _LINE_SPACING
+
+
+def render_poster_json(
+    poster_json: PosterJSON,
+    output_path,
+    media: Optional[Dict[str, bytes]] = None,
+    dpi: Optional[float] = None,
+) -> Path:
+    """
+    Rasterize a PosterJSON to PNG.
+
+    Args:
+        poster_json: Poster layout (elements are drawn in list order, i.e. z-order)
+        output_path: Where to write the PNG
+        media: Optional element id -> image bytes for picture elements
+        dpi: Pixels per inch; defaults to DRAFT_RENDER_DPI, capped so the long side stays within DRAFT_RENDER_MAX_PX
+
+    Returns:
+        Path to the PNG
+    """
+    media = media or {}
+    dpi = dpi or DRAFT_RENDER_DPI
+    dpi = min(dpi, DRAFT_RENDER_MAX_PX / max(poster_json.slide_width, poster_json.slide_height, 1e-6))
+    size = (max(1, int(round(poster_json.slide_width * dpi))), max(1, int(round(poster_json.slide_height * dpi))))
+
+    canvas = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(canvas)
+    text_painter = _TextPainter(draw, dpi)
+
+    for elem in poster_json.elements:
+        box = [
+            elem.left * dpi,
+            elem.top * dpi,
+            (elem.left + elem.width) * dpi,
+            (elem.top + elem.height) * dpi,
+        ]
+        border = _parse_color(elem.border_color)
+        border_px = max(1, int(round((elem.border_width or 0) * dpi))) if border else 0
+
+        if elem.type == "line":
+            draw.line([(box[0], box[1]), (box[2], box[3])], fill=border or (0, 0, 0), width=border_px or 1)
+            continue
+
+        fill = _parse_color(elem.fill_color)
+        if fill:
+            draw.rectangle(box, fill=fill)
+
+        if elem.type == "picture" and elem.id in media:
+            try:
+                with Image.open(BytesIO(media[elem.id])) as img:
+                    w, h = max(1, int(box[2] - box[0])), max(1, int(box[3] - box[1]))
+                    img = img.convert("RGBA").resize((w, h), Image.BILINEAR)
+                    canvas.paste(img, (int(box[0]), int(box[1])), img)
+            except Exception:
+                draw.rectangle(box, outline=(160, 160, 160))
+        elif elem.type in ("table", "chart"):
+            draw.rectangle(box, fill=(235, 235, 235), outline=(160, 160, 160))
+
+        if border:
+            draw.rectangle(box, outline=border, width=border_px)
+
+        if elem.text:
+            text_painter.paint(elem)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    canvas.save(output_path, format="PNG")
+    return output_path
+
+
+def load_draft_inputs(pptx_path) -> Tuple[PosterJSON, Dict[str, bytes]]:
+    """
+    Read the first slide into an unfiltered PosterJSON plus picture blobs.
+    Unlike parse_pptx_to_json this neither renames shapes nor touches the executor state.
+    """
+    prs = Presentation(pptx_path)
+    slide = prs.slides[0]
+    theme_color_map = _get_theme_colors(prs)
+    elements, media = [], {}
+    for shape in slide.shapes:
+        elem = _shape_to_element(shape, theme_color_map)
+        elements.append(elem)
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            try:
+                media[elem.id] = shape.image.blob
+            except Exception:
+                pass
+    poster_json = PosterJSON(
+        slide_width=prs.slide_width / 914400,
+        slide_height=prs.slide_height / 914400,
+        elements=elements,
+    )
+    return poster_json, media
+
+
+def render_pptx_draft(pptx_path, output_path, dpi: Optional[float] = None) -> Path:
+    """Draft-render the first slide of a PPTX to PNG."""
+    poster_json, media = load_draft_inputs(pptx_path)
+    return render_poster_json(poster_json, output_path, media=media, dpi=dpi)
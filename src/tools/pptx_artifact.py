@@ -0,0 +1,170 @@
+"""
+In-memory hand-off of the edited poster between graph nodes.
+
+The executor used to `prs.save()` every iteration to disk, LibreOffice read
+the file back, the render cache hashed it from disk, and the reviewer's
+fallback parse re-opened it. A `PptxArtifact` keeps the saved bytes in memory
+next to the live Presentation instead:
+
+- the render cache key is hashed straight from the bytes;
+- LibreOffice gets a copy in a scratch directory (tmpfs when /dev/shm is
+  available) and only on a render-cache miss; the draft rasterizer reads the
+  bytes directly;
+- the reviewer parses `stream()` instead of re-reading the file;
+- `persist()` writes `path` on disk at most once: for poster_v1.pptx, for
+  intermediates kept with KEEP_INTERMEDIATE_PPTX=1 and for the final poster
+  (graph finalize node).
+
+Intermediates are only read back by our own renderer and parser, so they are
+serialized with ZIP_STORED (INTERMEDIATE_PPTX_STORED): python-pptx's default
+save deflates every part, including already-compressed embedded images, on
+each iteration. `persist(compress=True)` re-deflates the members once for the
+final poster.
+
+`io_stats()` counts the bytes that went to disk, to scratch and stayed in
+memory, for the I/O benchmark.
+"""
+import hashlib
+import os
+import threading
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import IO, Any, Dict, Optional, Union
+
+from pptx.opc.serialized import PackageWriter, _ZipPkgWriter
+from pptx.util import lazyproperty
+
+from ..config import INTERMEDIATE_PPTX_STORED, PPTX_SCRATCH_DIR
+
+_io_stats = {"serialized_bytes": 0, "persisted_bytes": 0, "scratch_bytes": 0}
+_io_lock = threading.Lock()
+
+
+def _count(key: str, n: int):
+    with _io_lock:
+        _io_stats[key] += n
+
+
+def io_stats() -> Dict[str, int]:
+    with _io_lock:
+        return dict(_io_stats)
+
+
+class _StoredZipPkgWriter(_ZipPkgWriter):
+    @lazyproperty
+    def _zipf(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self._pkg_file, "w", compression=zipfile.ZIP_STORED, strict_timestamps=False)
+
+
+class _StoredPackageWriter(PackageWriter):
+    def _write(self) -> None:
+        with _StoredZipPkgWriter(self._pkg_file) as phys_writer:
+            self._write_content_types_stream(phys_writer)
+            self._write_pkg_rels(phys_writer)
+            self._write_parts(phys_writer)
+
+
+def save_presentation(prs, pkg_file: Union[str, IO[bytes]], compress: bool = True):
+    """prs.save(), or with compress=False the same package written with ZIP_STORED members."""
+    if compress:
+        prs.save(pkg_file)
+        return
+    package = prs.part.package
+    _StoredPackageWriter.write(pkg_file, package._rels, tuple(package.iter_parts()))
+
+
+def compress_package(data: bytes) -> bytes:
+    """Re-write a PPTX package with every member deflated (what prs.save() produces)."""
+    out = BytesIO()
+    with zipfile.ZipFile(BytesIO(data)) as zin, \
+            zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED, strict_timestamps=False) as zout:
+        for info in zin.infolist():
+            zout.writestr(info.filename, zin.read(info))
+    return out.getvalue()
+
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@dataclass(eq=False)
+class PptxArtifact:
+    path: Path                      # where the poster lives on disk once persisted (names renders / layout files)
+    data: bytes
+    prs: Any = None                 # live Presentation the bytes were saved from
+    compressed: bool = True         # False: ZIP_STORED members
+    persisted: bool = False
+    _persisted_compressed: bool = field(default=False, repr=False)
+    _digest: Optional[str] = field(default=None, repr=False)
+    _scratch: Optional[Path] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def from_presentation(cls, prs, path, compress: Optional[bool] = None) -> "PptxArtifact":
+        """Serialize `prs` in memory; uncompressed unless `compress` (default: not INTERMEDIATE_PPTX_STORED)."""
+        compress = not INTERMEDIATE_PPTX_STORED if compress is None else compress
+        buf = BytesIO()
+        save_presentation(prs, buf, compress=compress)
+        data = buf.getvalue()
+        _count("serialized_bytes", len(data))
+        return cls(path=Path(path), data=data, prs=prs, compressed=compress)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    def stream(self) -> BytesIO:
+        """A fresh read-only stream over the bytes (python-pptx accepts it wherever it takes a path)."""
+        return BytesIO(self.data)
+
+    def persist(self, compress: bool = False) -> Path:
+        """
+        Write the bytes to `path` (once). With compress=True (final output) the
+        members are deflated first, and an earlier uncompressed copy is replaced.
+        """
+        with self._lock:
+            if self.persisted and (self._persisted_compressed or not compress):
+                return self.path
+            data = compress_package(self.data) if compress and not self.compressed else self.data
+            _atomic_write(self.path, data)
+            _count("persisted_bytes", len(data))
+            self.persisted = True
+            self._persisted_compressed = compress or self.compressed
+        return self.path
+
+    def scratch_path(self) -> Path:
+        """
+        A file with these bytes for tools that need a path (LibreOffice): `path` itself if
+        already persisted, else a copy under PPTX_SCRATCH_DIR with the same basename. The copy
+        belongs to this artifact alone: artifacts with equal bytes and names (re-renders of one
+        job, concurrent jobs) never share it, so releasing one cannot pull it from another render.
+        """
+        with self._lock:
+            if self.persisted:
+                return self.path
+            if self._scratch is None or not self._scratch.exists():
+                scratch = Path(PPTX_SCRATCH_DIR) / f"{self.digest[:16]}-{uuid.uuid4().hex[:8]}" / self.path.name
+                _atomic_write(scratch, self.data)
+                _count("scratch_bytes", len(self.data))
+                self._scratch = scratch
+            return self._scratch
+
+    def release_scratch(self):
+        """Delete the scratch copy (the render is cached by content, so it is not needed again)."""
+        with self._lock:
+            scratch, self._scratch = self._scratch, None
+        if scratch is not None and scratch != self.path:
+            try:
+                scratch.unlink()
+                scratch.parent.rmdir()
+            except OSError:
+                pass
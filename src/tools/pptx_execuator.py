@@ -9,11 +9,19 @@ from typing import List, Dict, Optional, Tuple
 from pptx.enum.text import MSO_ANCHOR
 from pptx.enum.dml import MSO_LINE_DASH_STYLE
 
+import copy
 import io
 import os
+import time
 import threading
 from typing import Optional
 import contextvars
+import numpy as np
+
+from .api_profiler import ApiProfiler
+from .geometry import GeometryIndex
+from .text_metrics import layout_markdown_text, layout_text
+from .image_ingest import ingest_image
 # ============================================================================
 # 全局状态管理
 # ============================================================================
@@ -28,11 +36,20 @@ class PosterState:
         self.current_shape = None
         self._next_element_id = 1  # 自增元素ID计数器
         self.pptx_folder_path = ""
+        # 变更追踪: 本批 API 调用修改/新建/删除的元素ID (见 pptx_parser.update_poster_json)
+        self.touched_ids = set()
+        self.created_ids = set()
+        self._initial_ids = set()
+        self._savepoints = []  # 事务保存点栈 (见 begin / commit / rollback)
+        self.geometry = GeometryIndex(self)  # 元素边框的向量化索引, 随 shape 修改同步
+        self.profiler = ApiProfiler()  # 本任务所有 API 调用的耗时记录 (见 api_profiler)
 
     def set_from_prs(self, prs):
         """从 Presentation 对象设置状态"""
         self.prs = prs
         self.slide = prs.slides[0]  # 单页海报
+        self._savepoints = []
+        self.geometry.invalidate()
         self._build_shape_map()
         return f"Loaded poster with {len(self.shape_map)} elements"
 
@@ -70,12 +87,98 @@ class PosterState:
         return f"Poster saved to {output_path}"
 
 
-    def get_shape(self, element_id: str):
-        """根据 ID 获取 shape"""
+    def get_shape(self, element_id: str, touch: bool = True):
+        """根据 ID 获取 shape (touch=False 表示只读访问, 不记为已修改)"""
         if element_id not in self.shape_map:
             raise ValueError(f"Element '{element_id}' not found. Available: {list(self.shape_map.keys())}")
+        if touch:
+            self.touched_ids.add(element_id)
+            self.geometry.mark_dirty(element_id)
+            if self._savepoints:
+                self._snapshot_element(self.shape_map[element_id].element)
         return self.shape_map[element_id]
 
+    def register_shape(self, element_id: str, shape):
+        """登记新建的 shape"""
+        self.shape_map[element_id] = shape
+        self.created_ids.add(element_id)
+        self.geometry.mark_dirty(element_id)
+
+    def unregister_shape(self, element_id: str):
+        """移除已删除的 shape"""
+        del self.shape_map[element_id]
+        self.geometry.mark_dirty(element_id)
+
+    def reset_changes(self):
+        """开始新一批 API 调用的变更追踪"""
+        self.touched_ids, self.created_ids = set(), set()
+        self._initial_ids = set(self.shape_map)
+
+    # ------------------------------------------------------------------
+    # 事务: 保存点 + 回滚 (copy-on-write, 只复制被修改的 shape 子树)
+    # ------------------------------------------------------------------
+
+    def begin(self):
+        """
+        开启保存点. 之后每个元素第一次被 get_shape(touch=True) 取出时 (即修改之前),
+        复制其 XML 子树; spTree 只记录子元素顺序 (引用, 不复制), 用于撤销新建/删除/层级调整.
+        保存点可嵌套: 整个计划一个, 每个 API 调用一个.
+        """
+        self._savepoints.append({
+            "children": list(self.slide.shapes._spTree),
+            "elements": {},  # id(element) -> (live element, 修改前的副本)
+            "shape_map": dict(self.shape_map),
+            "touched_ids": set(self.touched_ids),
+            "created_ids": set(self.created_ids),
+            "next_element_id": self._next_element_id,
+            "current_shape": self.current_shape,
+        })
+
+    def _snapshot_element(self, element):
+        for savepoint in self._savepoints:
+            if id(element) not in savepoint["elements"]:
+                savepoint["elements"][id(element)] = (element, copy.deepcopy(element))
+
+    def commit(self):
+        """保留最近一个保存点之后的修改"""
+        self._savepoints.pop()
+
+    def rollback(self):
+        """撤销最近一个保存点之后的所有修改 (原地恢复, 已有的 shape 对象仍然有效)"""
+        savepoint = self._savepoints.pop()
+        for element, saved in savepoint["elements"].values():
+            element.attrib.clear()
+            element.attrib.update(saved.attrib)
+            element.text = saved.text
+            element[:] = list(saved)
+
+        spTree = self.slide.shapes._spTree
+        if list(spTree) != savepoint["children"]:
+            for child in list(spTree):
+                spTree.remove(child)
+            spTree.extend(savepoint["children"])
+
+        # shape_map 原地恢复: pptx_parser 持有同一个 dict
+        self.shape_map.clear()
+        self.shape_map.update(savepoint["shape_map"])
+        self.touched_ids = savepoint["touched_ids"]
+        self.created_ids = savepoint["created_ids"]
+        self._next_element_id = savepoint["next_element_id"]
+        self.current_shape = savepoint["current_shape"]
+        self.geometry.invalidate()
+
+    def changes(self) -> Dict:
+        """
+        本批 API 调用的变更集 (相对 reset_changes 时的元素):
+        touched = 仍存在且被修改/替换的元素, created = 新元素, deleted = 已删除的元素
+        """
+        current = set(self.shape_map)
+        return {
+            "touched": sorted((self.touched_ids | self.created_ids) & current & self._initial_ids),
+            "created": sorted(current - self._initial_ids),
+            "deleted": sorted(self._initial_ids - current),
+        }
+
     # def get_shape(self, element_id: str):
     #     for shape in self.shape_map.values():
     #         if shape.name == element_id:
@@ -470,6 +573,134 @@ def text_format_brush(element_id: str, font_size: Optional[float] = None, color:
     return f"Formatted element {element_id}"
 
 
+def _apply_run_format(element_id: str, **fmt):
+    """
+    一次遍历所有 run, 同时设置多项字体属性 (plan_optimizer 把同一元素上连续的格式调用合并到这里).
+    fmt 只包含需要设置的属性: font_size / color / bold / italic / underline / font_name
+    """
+    shape = get_current_state().get_shape(element_id)
+
+    if not hasattr(shape, 'text_frame'):
+        return f"Error: Element {element_id} is not a text element"
+
+    size = Pt(fmt["font_size"]) if "font_size" in fmt else None
+    rgb_color = hex_to_rgb(fmt["color"]) if "color" in fmt else None
+    for paragraph in shape.text_frame.paragraphs:
+        for run in paragraph.runs:
+            font = run.font
+            if size is not None:
+                font.size = size
+            if rgb_color is not None:
+                font.color.rgb = rgb_color
+            if "bold" in fmt:
+                font.bold = fmt["bold"]
+            if "italic" in fmt:
+                font.italic = fmt["italic"]
+            if "underline" in fmt:
+                font.underline = fmt["underline"]
+            if "font_name" in fmt:
+                font.name = fmt["font_name"]
+
+    return f"Formatted element {element_id} ({', '.join(f'{k}={v}' for k, v in fmt.items())})"
+
+
+def _text_layout_for_size(shape, font_size: float):
+    """按给定字号测量 shape 当前文本在其宽度内的排版 (run 粗细、段落层级、bodyPr 内边距均按实际值)"""
+    tf = shape.text_frame
+    paragraphs = [[(r.text, bool(r.font.bold)) for r in p.runs] for p in tf.paragraphs]
+    font_name = next((r.font.name for p in tf.paragraphs for r in p.runs if r.font.name), None) or "Arial"
+    bodyPr = tf._txBody.bodyPr
+    inset = lambda attr, default: int(bodyPr.get(attr)) / 914400 if bodyPr.get(attr) is not None else default
+    return layout_text(paragraphs, shape.width / 914400, font_size, font_name,
+                       levels=[p.level or 0 for p in tf.paragraphs],
+                       inset_lr_in=(inset("lIns", 0.1) + inset("rIns", 0.1)) / 2,
+                       inset_tb_in=(inset("tIns", 0.05) + inset("bIns", 0.05)) / 2)
+
+
+def _largest_fitting_size(shape, min_size: float, max_size: float, step: float = 0.5) -> Tuple[float, bool]:
+    """
+    二分查找 [min_size, max_size] 中 (按 step 取值) 排版高度不超过 shape 高度的最大字号.
+    Returns: (字号, 是否放得下; 放不下时返回 min_size)
+    """
+    box_height_in = shape.height / 914400
+    fits = lambda size: _text_layout_for_size(shape, size).height_in <= box_height_in
+    lo, hi = 0, int((max_size - min_size) / step)
+    if not fits(min_size):
+        return min_size, False
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(min_size + mid * step):
+            lo = mid
+        else:
+            hi = mid - 1
+    return min_size + lo * step, True
+
+
+def _apply_fitted_size(shape, font_size: float):
+    tf = shape.text_frame
+    for paragraph in tf.paragraphs:
+        for run in paragraph.runs:
+            run.font.size = Pt(font_size)
+    # 盒子大小固定, 不再让渲染器按文字伸缩形状
+    tf.word_wrap = True
+    tf.auto_size = MSO_AUTO_SIZE.NONE
+
+
+def fit_text_to_box(element_id: str, min_size: float = 12, max_size: float = 120):
+    """
+    在元素当前宽高内, 二分查找能放下全部文本的最大字号并一次性应用 (不改变元素大小)
+
+    Args:
+        element_id: 元素ID
+        min_size: 最小字号（磅）
+        max_size: 最大字号（磅）
+    """
+    shape = get_current_state().get_shape(element_id)
+
+    if not hasattr(shape, 'text_frame'):
+        return f"Error: Element {element_id} is not a text element"
+    if min_size > max_size:
+        raise ValueError(f"min_size ({min_size}) is larger than max_size ({max_size})")
+
+    size, fits = _largest_fitting_size(shape, min_size, max_size)
+    _apply_fitted_size(shape, size)
+
+    if not fits:
+        return f"Text of element {element_id} does not fit even at {min_size}pt; set to {min_size}pt"
+    return f"Fitted text of element {element_id} at {size}pt"
+
+
+def fit_text_to_boxes(element_ids: List[str], min_size: float = 12, max_size: float = 120):
+    """
+    多个元素 (如各 section 正文) 统一字号: 每个元素在自身宽高内能放下的最大字号中取最小值, 应用到所有元素
+
+    Args:
+        element_ids: 元素ID列表
+        min_size: 最小字号（磅）
+        max_size: 最大字号（磅）
+    """
+    if min_size > max_size:
+        raise ValueError(f"min_size ({min_size}) is larger than max_size ({max_size})")
+
+    shapes = [get_current_state().get_shape(eid) for eid in element_ids]
+    for eid, shape in zip(element_ids, shapes):
+        if not hasattr(shape, 'text_frame'):
+            return f"Error: Element {eid} is not a text element"
+    if not shapes:
+        return "No elements to fit."
+
+    sizes = {}
+    for eid, shape in zip(element_ids, shapes):
+        # 上限逐步收紧: 之后的元素只需在更小的范围内查找
+        upper = min([max_size] + list(sizes.values()))
+        sizes[eid], _ = _largest_fitting_size(shape, min_size, upper)
+    size = min(sizes.values())
+    for shape in shapes:
+        _apply_fitted_size(shape, size)
+
+    return f"Fitted text of {len(shapes)} elements at {size}pt (per-element maximum: {sizes})"
+
+
 # ============================================================================
 # 2. 通用的位置和大小 API
 # ============================================================================
@@ -581,6 +812,19 @@ def _get_dash_style(style_name: str):
     return dash_map.get(style_name.lower(), MSO_LINE_DASH_STYLE.SOLID)
 
 
+# insert_shape 支持的 shape_type (plan_validator 也据此检查)
+_SHAPE_TYPES = {
+    "rectangle": MSO_SHAPE.RECTANGLE,
+    "rounded_rectangle": MSO_SHAPE.ROUNDED_RECTANGLE,
+    "arrow": MSO_SHAPE.RIGHT_ARROW,
+    "diamond": MSO_SHAPE.DIAMOND,
+    "oval": MSO_SHAPE.OVAL,
+    "star": MSO_SHAPE.STAR_5_POINT,
+    "curved right arrow": MSO_SHAPE.CURVED_RIGHT_ARROW,
+    "curved left arrow": MSO_SHAPE.CURVED_LEFT_ARROW
+}
+
+
 def insert_shape(left: float, top: float, width: float, height: float, shape_type: str,
                  fill_color: Optional[str] = None, line_color: Optional[str] = None,
                  line_width: float = 0.0, line_dash: Optional[str] = None, element_id: Optional[str] = None):
@@ -591,20 +835,9 @@ def insert_shape(left: float, top: float, width: float, height: float, shape_typ
         fill_color: 填充颜色（HEX）
     """
 
-    type_map = {
-        "rectangle": MSO_SHAPE.RECTANGLE,
-        "rounded_rectangle": MSO_SHAPE.ROUNDED_RECTANGLE,
-        "arrow": MSO_SHAPE.RIGHT_ARROW,
-        "diamond": MSO_SHAPE.DIAMOND,
-        "oval": MSO_SHAPE.OVAL,
-        "star": MSO_SHAPE.STAR_5_POINT,
-        "curved right arrow": MSO_SHAPE.CURVED_RIGHT_ARROW,
-        "curved left arrow": MSO_SHAPE.CURVED_LEFT_ARROW
-    }
-
     # 创建 shape
     shape = get_current_state().slide.shapes.add_shape(
-        type_map.get(shape_type.lower()),
+        _SHAPE_TYPES.get(shape_type.lower()),
         Inches(left), Inches(top), Inches(width), Inches(height)
     )
 
@@ -628,7 +861,7 @@ def insert_shape(left: float, top: float, width: float, height: float, shape_typ
     if not element_id:
         element_id = str(get_current_state()._next_element_id)
         get_current_state()._next_element_id += 1
-    get_current_state().shape_map[element_id] = shape
+    get_current_state().register_shape(element_id, shape)
     shape.name = element_id
 
     return f"{element_id}"
@@ -669,7 +902,7 @@ def insert_line(start_x: float, start_y: float, end_x: float, end_y: float,
     if not element_id:
         element_id = str(get_current_state()._next_element_id)
         get_current_state()._next_element_id += 1
-    get_current_state().shape_map[element_id] = shape
+    get_current_state().register_shape(element_id, shape)
     shape.name = element_id
 
     return f"{element_id}"
@@ -764,31 +997,31 @@ def align_elements_x_axis(element_ids: List[str], alignment: str = "left", refer
     # 1. 确定基准元素 (Reference Shape)
     # 如果指定了 reference_id，用指定的；否则默认用列表第一个
     target_ref_id = reference_id if reference_id else element_ids[0]
-    ref_shape = get_current_state().get_shape(target_ref_id)
+    get_current_state().get_shape(target_ref_id, touch=False)
+    geometry = get_current_state().geometry
 
-    # 获取基准线的坐标值
-    ref_left = ref_shape.left
-    ref_center = ref_shape.left + (ref_shape.width / 2)
-    ref_right = ref_shape.left + ref_shape.width
+    # 获取基准线的坐标值 (EMU, 来自几何索引)
+    ref_left, _, ref_width, _ = geometry.boxes([target_ref_id])[0]
 
     shapes = [get_current_state().get_shape(eid) for eid in element_ids]
+    widths = geometry.boxes(element_ids)[:, 2]
+
+    # 2. 执行对齐逻辑 (一次性计算所有新 left)
+    if alignment == "left":
+        # 左对齐：所有元素的 left 等于基准的 left
+        new_left = np.full(len(shapes), ref_left)
+    elif alignment == "center":
+        # 居中对齐：新 left = 基准中心 - (自身宽度 / 2)
+        new_left = (ref_left + ref_width / 2) - widths / 2
+    elif alignment == "right":
+        # 右对齐：新 left = 基准右侧 - 自身宽度
+        new_left = (ref_left + ref_width) - widths
+    else:
+        new_left = None
 
-    # 2. 执行对齐逻辑
-    for shape in shapes:
-        # 如果是基准元素自己，可以选择跳过，或者重算一遍也无妨
-        if alignment == "left":
-            # 左对齐：所有元素的 left 等于基准的 left
-            shape.left = ref_left
-
-        elif alignment == "center":
-            # 居中对齐：元素的中心点 等于 基准的中心点
-            # 新 left = 基准中心 - (自身宽度 / 2)
-            shape.left = int(ref_center - (shape.width / 2))
-
-        elif alignment == "right":
-            # 右对齐：元素的右侧 等于 基准的右侧
-            # 新 left = 基准右侧 - 自身宽度
-            shape.left = int(ref_right - shape.width)
+    if new_left is not None:
+        for shape, left in zip(shapes, new_left):
+            shape.left = int(left)
 
     return f"Aligned elements horizontally"
 
@@ -806,26 +1039,29 @@ def align_elements_y_axis(element_ids: List[str], alignment: str = "top", refere
         return "No elements to align."
 
     target_ref_id = reference_id if reference_id else element_ids[0]
-    ref_shape = get_current_state().get_shape(target_ref_id)
+    get_current_state().get_shape(target_ref_id, touch=False)
+    geometry = get_current_state().geometry
 
-    ref_top = ref_shape.top
-    ref_middle = ref_shape.top + (ref_shape.height / 2)
-    ref_bottom = ref_shape.top + ref_shape.height
+    _, ref_top, _, ref_height = geometry.boxes([target_ref_id])[0]
 
     shapes = [get_current_state().get_shape(eid) for eid in element_ids]
+    heights = geometry.boxes(element_ids)[:, 3]
+
+    if alignment == "top":
+        # 顶端对齐
+        new_top = np.full(len(shapes), ref_top)
+    elif alignment == "middle":
+        # 垂直居中
+        new_top = (ref_top + ref_height / 2) - heights / 2
+    elif alignment == "bottom":
+        # 底端对齐
+        new_top = (ref_top + ref_height) - heights
+    else:
+        new_top = None
 
-    for shape in shapes:
-        if alignment == "top":
-            # 顶端对齐
-            shape.top = ref_top
-
-        elif alignment == "middle":
-            # 垂直居中
-            shape.top = int(ref_middle - (shape.height / 2))
-
-        elif alignment == "bottom":
-            # 底端对齐
-            shape.top = int(ref_bottom - shape.height)
+    if new_top is not None:
+        for shape, top in zip(shapes, new_top):
+            shape.top = int(top)
 
     return f"Aligned {len(element_ids)} elements vertically "
 
@@ -937,29 +1173,11 @@ def set_text_content(element_id: str, text: str, font_size: Optional[float] = 44
     
     # 确定计算用的字号 (如果传入 None，默认给一个兜底值，这里取函数默认值 44)
     calc_font_size = font_size if font_size is not None else 44.0
-    
-    avg_char_width_pt = calc_font_size * 0.55
-    
-    # 计算有效内容宽度 (减去左右内边距 buffer，约 10pt)
-    safe_width_pt = (current_width_inch * 72) - 10
-    if safe_width_pt < 10: safe_width_pt = 10
-    
-    chars_per_line = safe_width_pt / avg_char_width_pt
-    if chars_per_line < 1: chars_per_line = 1
-
-    # 计算总折行数
-    total_lines = 0
-    for line in lines:
-        length = len(line)
-        if length == 0:
-            total_lines += 1 # 空段落算一行
-        else:
-            # 向上取整：计算该段落会自动折成几行
-            total_lines += math.ceil(length / chars_per_line)
 
-    # 计算目标高度 (字号 * 1.2倍行距 * 行数 + 上下缓冲)
-    line_height_pt = calc_font_size*1.2
-    new_height_inch = ((total_lines * line_height_pt) / 72.0) + 0.2
+    # 按真实字体宽度折行, 得到精确行数和高度 (见 text_metrics)
+    layout = layout_markdown_text(clean_text, current_width_inch, calc_font_size, font_name or "Arial",
+                                  bold=bool(bold), italic=bool(italic))
+    new_height_inch = layout.height_in
     
     # 【应用高度】立即更新 Python 对象属性
     shape.height = Inches(new_height_inch)
@@ -1008,7 +1226,7 @@ def set_text_content(element_id: str, text: str, font_size: Optional[float] = 44
     # 【锁定宽度】防止 PPT 渲染时自动改变宽度
     shape.width = Inches(current_width_inch)
 
-    #print(f"Set text content for element {element_id}. Lines: {total_lines}, New Height: {new_height_inch:.2f} in")
+    #print(f"Set text content for element {element_id}. Lines: {layout.lines}, New Height: {new_height_inch:.2f} in")
     return f"Set text content for element {element_id}"
 
 import re
@@ -1092,39 +1310,20 @@ def append_text(element_id: str, text: str):
         elif style_source and style_source.font.size:
              calc_font_size_pt = style_source.font.size.pt
 
-    #提取文本框内的【所有】文本 (旧 + 新)
-    # 我们需要重构完整的文本字符串来计算总行数
-    full_text_list = []
-    for p in tf.paragraphs:
-        full_text_list.append(p.text)
-    full_text_content = "\n".join(full_text_list)
-
     # 3. 获取当前宽度 (英寸)
     current_width_inch = shape.width.inches
-    
-    # 4. 执行高度估算逻辑 (与 insert_textbox 保持一致)
-    avg_char_width_pt = calc_font_size_pt * 0.55  
-    
-    # 计算有效宽度 (减去一点内边距 buffer)
-    safe_width_pt = (current_width_inch * 72) - 10 
-    if safe_width_pt < 10: safe_width_pt = 10
-    
-    chars_per_line = safe_width_pt / avg_char_width_pt
-    if chars_per_line < 1: chars_per_line = 1
 
-    # 计算总折行数
-    total_lines = 0
-    full_paragraphs = full_text_content.split('\n')
-    
-    for paragraph_text in full_paragraphs:
-        length = len(paragraph_text)
-        if length == 0:
-            total_lines += 1
-        else:
-            total_lines += math.ceil(length / chars_per_line)
-
-    line_height_pt = calc_font_size_pt * 1.2
-    new_height_inch = ((total_lines * line_height_pt) / 72.0) + 0.2
+    # 4. 对文本框内的【所有】文本 (旧 + 新) 按真实字体宽度折行计算高度 (与 insert_textbox 保持一致),
+    #    每个 run 按自己的粗细测量
+    calc_font_name = "Arial"
+    for src in (tf.paragraphs[-1].font if tf.paragraphs else None, style_source.font if style_source else None):
+        if src is not None and src.name:
+            calc_font_name = src.name
+            break
+    paragraphs = [[(r.text, bool(r.font.bold)) for r in p.runs] for p in tf.paragraphs]
+    layout = layout_text(paragraphs, current_width_inch, calc_font_size_pt, calc_font_name,
+                         levels=[p.level or 0 for p in tf.paragraphs])
+    new_height_inch = layout.height_in
 
     shape.height = Inches(new_height_inch)
 
@@ -1206,8 +1405,6 @@ def force_shape_to_fit_text(shape):
         bodyPr.set('wrap', 'square')
 
 
-
-import math
 def insert_textbox(left: float, top: float, width: float, height: float, text: str = "",
                    font_size: float = 44, font_name: str = "Arial", color: str = 'black',
                    bold: bool = False, italic: bool = False, underline: bool = False,
@@ -1222,35 +1419,11 @@ def insert_textbox(left: float, top: float, width: float, height: float, text: s
     clean_text = clean_text.replace('\r\n', '\n') 
     clean_text = clean_text.replace('\r', '\n')
     
-    avg_char_width_pt = font_size * 0.55
-    textbox_width_pt = width * 72
-    # 减去一点左右内边距 (0.1英寸 ≈ 7.2pt)
-    safe_width_pt = textbox_width_pt - 7.2
-    
-    # 一行大约能放多少个字母
-    chars_per_line = safe_width_pt / avg_char_width_pt
-    if chars_per_line < 1: chars_per_line = 1
-
-    # 2. 计算总行数
-    total_lines = 0
-    # 先按强制换行符分割
-    paragraphs = text.split('\n')
-    
-    for p in paragraphs:
-        length = len(p)
-        if length == 0:
-            total_lines += 1 # 空行也占位
-        else:
-            total_lines += math.ceil(length / chars_per_line)
-
-
-    line_height_pt = font_size * 1.2
-    estimated_height_pt = total_lines * line_height_pt
-    
-    # 转换回英寸，并加上一点上下边距 buffer (0.2英寸)
-    final_height_inch = (estimated_height_pt / 72.0) + 0.2
+    # 按真实字体宽度折行 (与下面写入的段落一致: 按 text 中的换行符分段), 得到精确行数和高度
+    layout = layout_markdown_text(text, width, font_size, font_name, bold=bold, italic=italic)
+    total_lines = layout.lines
 
-    final_height_inch = max(height, final_height_inch)
+    final_height_inch = max(height, layout.height_in)
 
     # 使用计算出的 final_height_inch 创建文本框
     textbox = get_current_state().slide.shapes.add_textbox(
@@ -1286,7 +1459,7 @@ def insert_textbox(left: float, top: float, width: float, height: float, text: s
     if not element_id:
         element_id = str(get_current_state()._next_element_id)
         get_current_state()._next_element_id += 1
-    get_current_state().shape_map[element_id] = textbox
+    get_current_state().register_shape(element_id, textbox)
     textbox.name = element_id
 
     # 应用格式
@@ -1319,7 +1492,7 @@ def delete_element(element_id: str):
     sp.getparent().remove(sp)
 
     # 从映射表中删除
-    del get_current_state().shape_map[element_id]
+    get_current_state().unregister_shape(element_id)
 
     return f"Deleted element {element_id}"
 
@@ -1342,17 +1515,20 @@ def insert_image(image_path: str, left: float, top: float,
         # print(f"Image path {image_path} is not absolute, joining with pptx folder path: {get_current_state().pptx_folder_path}")
         image_path = os.path.join(get_current_state().pptx_folder_path, 'images_and_tables/'+image_path) # TODO
 
+    width = Inches(width) if width else None
+    height = Inches(height) if height else None
+    # 按目标尺寸降采样 / 重新编码 (同一图片同一尺寸只处理一次, 包内只存一份)
     picture = get_current_state().slide.shapes.add_picture(
-        image_path,
+        ingest_image(image_path, width, height),
         Inches(left), Inches(top),
-        width=Inches(width) if width else None,
-        height=Inches(height) if height else None
+        width=width,
+        height=height
     )
 
     if not element_id:
         element_id = str(get_current_state()._next_element_id)
         get_current_state()._next_element_id += 1
-    get_current_state().shape_map[element_id] = picture
+    get_current_state().register_shape(element_id, picture)
     picture.name = element_id
 
     # print(f"Inserted image at {image_path} as element {element_id}")
@@ -1397,11 +1573,11 @@ def replace_image(element_id: str, new_image_path: Optional[str] = None, new_ima
 
     # 插入新图片
     picture = get_current_state().slide.shapes.add_picture(
-        new_image_path, left, top, width, height
+        ingest_image(new_image_path, width, height), left, top, width, height
     )
 
     picture.name = element_id
-    get_current_state().shape_map[element_id] = picture
+    get_current_state().register_shape(element_id, picture)
 
     return f"Replaced image for element {element_id}"
 
@@ -1420,7 +1596,7 @@ def get_element_info(element_id: str) -> Dict:
     Returns:
         包含元素信息的字典
     """
-    shape = get_current_state().get_shape(element_id)
+    shape = get_current_state().get_shape(element_id, touch=False)
 
     info = {
         "id": element_id,
@@ -1448,14 +1624,23 @@ def get_element_bounds(element_id: str) -> Tuple[float, float, float, float]:
     Returns:
         (left, top, right, bottom) 以INCH为单位
     """
-    shape = get_current_state().get_shape(element_id)
+    get_current_state().get_shape(element_id, touch=False)
+    return get_current_state().geometry.box(element_id)
 
-    left_inch = shape.left / 914400
-    top_inch = shape.top / 914400
-    width_inch = shape.width / 914400
-    height_inch = shape.height / 914400
 
-    return (left_inch, top_inch, left_inch + width_inch, top_inch + height_inch)
+def get_overlap_report(iou_threshold: Optional[float] = None, margin: Optional[float] = None) -> Dict:
+    """
+    版面检查: 相互重叠的元素对 (IoU 超过阈值) 和超出页边距的元素
+
+    Args:
+        iou_threshold: IoU 阈值, 默认 config.OVERLAP_IOU_THRESHOLD
+        margin: 页边距 (磅), 默认 config.MARGIN_POINTS
+
+    Returns:
+        {"overlaps": [{"ids", "iou", "overlap_area"}], "out_of_bounds": [{"id", "overflow"}]} 以INCH为单位
+    """
+    geometry = get_current_state().geometry
+    return {"overlaps": geometry.overlaps(iou_threshold), "out_of_bounds": geometry.out_of_bounds(margin)}
 
 
 # ============================================================================
@@ -1477,13 +1662,12 @@ def add_callout(target_element_id: str, text: str,
     Returns:
         标注元素ID
     """
-    target_shape = get_current_state().get_shape(target_element_id)
+    get_current_state().get_shape(target_element_id, touch=False)
 
     # 计算标注位置
-    target_left = target_shape.left / 914400
-    target_top = target_shape.top / 914400
-    target_width = target_shape.width / 914400
-    target_height = target_shape.height / 914400
+    target_left, target_top, target_right, target_bottom = get_current_state().geometry.box(target_element_id)
+    target_width = target_right - target_left
+    target_height = target_bottom - target_top
 
     callout_width = 4
     callout_height = 1.5
@@ -1545,9 +1729,21 @@ def batch_delete_elements(element_ids: List[str]):
 
 def move_group(element_ids: List[str], dx: Optional[float] = 0, dy: Optional[float] = 0):
     """Moves a list of elements by dx, dy."""
+    state = get_current_state()
     for eid in element_ids:
+        if eid not in state.shape_map:
+            print(f"Error moving element {eid}: Element '{eid}' not found.")
+    ids = [eid for eid in element_ids if eid in state.shape_map]
+    if not ids:
+        return
+    # 一次性计算所有新位置
+    boxes = state.geometry.boxes(ids)
+    new_left = boxes[:, 0] + Inches(dx or 0)
+    new_top = boxes[:, 1] + Inches(dy or 0)
+    for eid, left, top in zip(ids, new_left, new_top):
         try:
-            move_element_relative(eid, dx, dy)
+            shape = state.get_shape(eid)
+            shape.left, shape.top = int(left), int(top)
         except Exception as e:
             print(f"Error moving element {eid}: {e}")
 
@@ -1589,7 +1785,7 @@ def clone_element(source_id: str, new_left: float, new_top: float,new_id: Option
         new_shape.name = str(get_current_state()._next_element_id)
         get_current_state()._next_element_id += 1
     element_id = new_shape.name
-    get_current_state().shape_map[element_id] = new_shape
+    get_current_state().register_shape(element_id, new_shape)
     return f"{element_id}"
 
 
@@ -1622,63 +1818,147 @@ def send_to_back_by_id(element_id: str):
 # 执行器 - 与 LLM 集成
 # ============================================================================
 
-def execute_api_calls(api_calls: List[str], prs, logger) -> str:
+
+def _run_api_call(state: PosterState, i: int, line: str, call, logger) -> Optional[str]:
+    """
+    在自己的保存点中执行一个已编译的调用 (计时并记入 profiler), 失败时回滚.
+
+    Returns:
+        错误信息, 成功时为 None
+    """
+    from .plan_optimizer import record_call_time
+
+    profiler = state.profiler
+    state.begin()
+    touched_before = state.touched_ids | state.created_ids
+    t0 = None
+    try:
+        logger.info(f"\n[{i}] Executing: {line}")
+        with profiler.capture() as prof:
+            t0 = time.perf_counter()
+            result = call()
+            elapsed = time.perf_counter() - t0
+        record_call_time(call.name, elapsed)
+        profiler.record(i, call, elapsed, True, state, touched_before, prof)
+        state.commit()
+        state.geometry.settle()
+        logger.info(f"    ✓ {result}")
+        return None
+    except Exception as e:
+        if t0 is not None:
+            profiler.record(i, call, time.perf_counter() - t0, False, state, touched_before)
+        state.rollback()
+        state.geometry.settle()
+        error_msg = f"[Line {i}] {line}\n         Error: {type(e).__name__}: {e} (rolled back)"
+        logger.info(f"    ✗ {error_msg}")
+        return error_msg
+
+
+def execute_api_calls(api_calls: List[str], prs, logger, atomic: bool = False,
+                      streamed: int = 0, streamed_errors: Optional[Dict[int, str]] = None) -> str:
     """
     执行API调用列表
 
+    所有行先编译为 ApiCall (见 api_interpreter), 格式/参数错误的行在修改任何元素之前
+    一次性全部报告; 其余行经 plan_optimizer 合并/去重后按顺序执行. 每个调用在自己的
+    保存点中执行, 失败时回滚, 不会留下改了一半的 shape.
+
     Args:
         api_calls: API调用字符串列表
         prs: Presentation 对象
+        atomic: True 时整个计划作为一个事务, 任一行出错则全部回滚
+        streamed: 前 streamed 行已在规划流式生成时执行 (见 plan_stream), 只执行其余行;
+            变更追踪与 profiler 批次沿用流式执行时的, 流式执行留下的保存点在此提交或回滚
+        streamed_errors: 流式执行阶段的错误信息 (行号 -> 错误)
 
     Returns:
         错误信息（如果有）
     """
-    # 从 prs 更新全局状态
-    get_current_state().set_from_prs(prs)
-
-    error_info = ""
-    success_count = 0
+    from ..config import API_PLAN_OPTIMIZE
+    from .api_interpreter import compile_plan
+    from .plan_optimizer import optimize_plan
 
-    # 构建API上下文
-    api_context = globals().copy()
-
-    # 确保 shape_map 在上下文中可访问
-    api_context['shape_map'] = get_current_state().shape_map
-    api_context['slide'] = get_current_state().slide
-    api_context['prs'] = prs
+    # 从 prs 更新全局状态
+    state = get_current_state()
+    if streamed and state.prs is prs:
+        resumed = bool(state._savepoints)
+    else:
+        streamed, streamed_errors, resumed = 0, None, False
+        state.set_from_prs(prs)
+        state.reset_changes()
+        state.profiler.begin_batch()
+
+    plan = compile_plan(api_calls)
+    errors = dict(streamed_errors or {})
+    streamed_calls = {c[0] for c in plan.calls if c[0] <= streamed}
+    # 未通过编译的行不在 plan.calls 中, 只扣除已编译调用的运行时错误
+    success_count = len(streamed_calls) - sum(1 for i in errors if i in streamed_calls)
+    total = len(plan.calls) + len(plan.errors)
+    plan.calls = [c for c in plan.calls if c[0] > streamed]
+    plan.errors = [e for e in plan.errors if e[0] > streamed]
 
     logger.info("=" * 60)
-    logger.info(f"Executing {len(api_calls)} API call(s)")
+    if streamed:
+        logger.info(f"Executing {total} API call(s), the first {streamed} line(s) already executed while streaming the plan")
+    else:
+        logger.info(f"Executing {total} API call(s)")
     logger.info(f"Shape map has {len(get_current_state().shape_map)} elements: {list(get_current_state().shape_map.keys())[:5]}...")
     logger.info("=" * 60)
 
-    for i, line in enumerate(api_calls, 1):
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-
-        try:
-            logger.info(f"\n[{i}] Executing: {line}")
-            fixed_line = line.replace("\n", "\\n")
-            result = eval(fixed_line, {"__builtins__": {}}, api_context)
-            logger.info(f"    ✓ {result}")
-            success_count += 1
-
-        except Exception as e:
-            error_msg = f"[Line {i}] {line}\n         Error: {type(e).__name__}: {e}"
-            logger.info(f"    ✗ {error_msg}")
-            error_info += f"{error_msg}\n\n"
+    for i, line, e in plan.errors:
+        error_msg = f"[Line {i}] {line}\n         Error: {type(e).__name__}: {e}"
+        logger.info(f"    ✗ (rejected) {error_msg}")
+        errors[i] = error_msg
+
+    if resumed and not atomic:
+        state.commit()  # 流式执行的各行各自已提交, 外层保存点不再需要
+    calls = [] if atomic and plan.errors else plan.calls
+    if API_PLAN_OPTIMIZE and calls:
+        calls, stats = optimize_plan(calls)
+        logger.info(f"Plan optimizer: {stats}")
+        success_count += stats.dropped  # 被后续调用覆盖而删除的调用, 效果等同于已执行
+    if atomic and not resumed:
+        state.begin()
+    try:
+        for i, line, call in calls:
+            error_msg = _run_api_call(state, i, line, call, logger)
+            if error_msg is None:
+                success_count += len(call.parts) or 1
+                continue
+            if call.parts:
+                # 合并后的调用失败 (已回滚): 逐个重跑原调用, 每个调用仍然单独成功/失败
+                logger.info(f"    ↺ merged call failed, re-running its {len(call.parts)} calls one by one")
+                for j, part_line, part in call.parts:
+                    part_error = _run_api_call(state, j, part_line, part, logger)
+                    if part_error is None:
+                        success_count += 1
+                        continue
+                    errors[j] = part_error
+                    if atomic:
+                        break
+            else:
+                errors[i] = error_msg
+            if atomic and errors:
+                break
+    finally:
+        if atomic:
+            if errors:
+                state.rollback()
+                logger.info("    ✗ Plan aborted, all calls rolled back")
+                success_count = 0
+            else:
+                state.commit()
 
     logger.info("\n" + "=" * 60)
-    logger.info(
-        f"Results: {success_count}/{len([l for l in api_calls if l.strip() and not l.strip().startswith('#')])} succeeded")
+    logger.info(f"Results: {success_count}/{total} succeeded")
     logger.info("=" * 60)
 
-    return error_info
+    return "".join(f"{errors[i]}\n\n" for i in sorted(errors))
 
 
 # 兼容旧的接口名称
-def API_executor(lines, api_context=None, prs=None, logger=None) -> str:
+def API_executor(lines, api_context=None, prs=None, logger=None, atomic: bool = False,
+                 streamed: int = 0, streamed_errors: Optional[Dict[int, str]] = None) -> str:
     """
     执行API调用（兼容接口）
 
@@ -1686,6 +1966,8 @@ def API_executor(lines, api_context=None, prs=None, logger=None) -> str:
         lines: API调用字符串列表
         api_context: 忽略（为了兼容性保留）
         prs: Presentation 对象
+        atomic: 整个计划作为一个事务执行 (见 execute_api_calls)
+        streamed / streamed_errors: 已在规划流式生成时执行的行数及其错误 (见 execute_api_calls)
 
     Returns:
         错误信息
@@ -1693,7 +1975,7 @@ def API_executor(lines, api_context=None, prs=None, logger=None) -> str:
     if prs is None:
         raise ValueError("Must provide prs (Presentation object)")
 
-    return execute_api_calls(lines, prs, logger)
+    return execute_api_calls(lines, prs, logger, atomic=atomic, streamed=streamed, streamed_errors=streamed_errors)
 
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ from typing import Dict
 from pptx import Presentation
 from pptx.util import Pt
 from pptx.enum.shapes import MSO_SHAPE_TYPE, MSO_AUTO_SHAPE_TYPE
-from pptx.enum.dml import MSO_COLOR_TYPE, MSO_THEME_COLOR
+from pptx.enum.dml import MSO_COLOR_TYPE
 from pptx.oxml import parse_xml
 from ..schema import PosterJSON, PosterElement, TextRun
 
@@ -13,6 +13,8 @@ from typing import Dict, List, Set, Any
 from ..schema import PosterJSON, PosterElement
 from copy import deepcopy
 from . import pptx_execuator
+from .pptx_xml_parser import slide_elements_from_xml, theme_colors_from_xml
+from ..config import PPTX_PARSER_ENGINE
 
 class PosterFilter: # TODO: need to compute excute time
     """Utility class for filtering poster JSON and APIs based on task requirements"""
@@ -77,11 +79,15 @@ class PosterFilter: # TODO: need to compute excute time
             "elements": []
             }
         filtered_fields = ['id', 'type', 'left', 'top', 'width', 'height', 'text', 'fill_color', 'border_color', 'border_width', 'border_shape']
+        # Index the original once instead of scanning it per revised element
+        orig_by_id = {}
+        for e in original_json.elements:
+            orig_by_id.setdefault(e.id, e)
         for element in revised_json.elements:
             has_changes = []
                         
             # Find corresponding element in original JSON
-            orig_elem = next((e for e in original_json.elements if e.id == element.id), None)
+            orig_elem = orig_by_id.get(element.id)
             if orig_elem is None: 
                 # has_changes = filtered_fields.copy()
                 has_changes = ['left', 'top', 'width', 'height']
@@ -131,40 +137,7 @@ def _get_theme_colors(prs) -> Dict[int, str]:
                  break
         
         if theme_part:
-            theme_element = parse_xml(theme_part.blob)
-            namespaces = {'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'}
-            clrScheme = theme_element.find('.//a:clrScheme', namespaces)
-            
-            if clrScheme is not None:
-                tag_mapping = {
-                    'dk1': MSO_THEME_COLOR.DARK_1,
-                    'lt1': MSO_THEME_COLOR.LIGHT_1,
-                    'dk2': MSO_THEME_COLOR.DARK_2,
-                    'lt2': MSO_THEME_COLOR.LIGHT_2,
-                    'accent1': MSO_THEME_COLOR.ACCENT_1,
-                    'accent2': MSO_THEME_COLOR.ACCENT_2,
-                    'accent3': MSO_THEME_COLOR.ACCENT_3,
-                    'accent4': MSO_THEME_COLOR.ACCENT_4,
-                    'accent5': MSO_THEME_COLOR.ACCENT_5,
-                    'accent6': MSO_THEME_COLOR.ACCENT_6,
-                    'hlink': MSO_THEME_COLOR.HYPERLINK,
-                    'folHlink': MSO_THEME_COLOR.FOLLOWED_HYPERLINK
-                }
-                
-                for child in clrScheme:
-                    tag = child.tag.split('}')[-1]
-                    if tag in tag_mapping:
-                        color_hex = None
-                        srgbClr = child.find('.//a:srgbClr', namespaces)
-                        sysClr = child.find('.//a:sysClr', namespaces)
-                        
-                        if srgbClr is not None:
-                            color_hex = srgbClr.get('val')
-                        elif sysClr is not None:
-                            color_hex = sysClr.get('lastClr')
-                        
-                        if color_hex:
-                            theme_colors[tag_mapping[tag]] = f"#{color_hex}"
+            theme_colors = theme_colors_from_xml(parse_xml(theme_part.blob))
     except Exception:
         pass
         
@@ -250,6 +223,118 @@ def _get_effective_font_style(run, paragraph):
         
     return style
 
+def _slide_elements(slide, theme_color_map: Dict[int, str], reuse: Dict[str, PosterElement] = None) -> List[PosterElement]:
+    """Elements of the slide with the configured engine (PPTX_PARSER_ENGINE); shapes named in `reuse` are not re-extracted."""
+    if PPTX_PARSER_ENGINE == "lxml":
+        return slide_elements_from_xml(slide, theme_color_map, fallback=lambda shape: _shape_to_element(shape, theme_color_map), reuse=reuse)
+    reuse = reuse or {}
+    return [reuse.get(shape.name) or _shape_to_element(shape, theme_color_map) for shape in slide.shapes]
+
+def _shape_to_element(shape, theme_color_map: Dict[int, str]) -> PosterElement:
+    """
+    Extract one slide shape into a PosterElement (id = shape.name).
+    Read-only: never touches the shape or the executor state.
+    """
+    # Determine element type
+    elem_type = "shape"
+    if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+        elem_type = "picture"
+    elif shape.shape_type == MSO_SHAPE_TYPE.TABLE:
+        elem_type = "table"
+    elif shape.shape_type == MSO_SHAPE_TYPE.CHART:
+        elem_type = "chart"
+    elif shape.shape_type == MSO_SHAPE_TYPE.LINE:
+        elem_type = "line"
+    elif shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
+        if shape.auto_shape_type == MSO_AUTO_SHAPE_TYPE.RECTANGLE:
+            elem_type = "rectangle"
+        elif hasattr(shape, 'has_text_frame') and shape.has_text_frame:
+            elem_type = "textbox"
+    elif (hasattr(shape, 'has_text_frame') and shape.has_text_frame) or shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+        elem_type = "textbox"
+
+    # Base properties
+    elem = PosterElement(
+        id=shape.name,
+        type=elem_type,
+        left=round(_emu_to_inch(shape.left), 2),
+        top=round(_emu_to_inch(shape.top), 2),
+        width=round(_emu_to_inch(shape.width), 2),
+        height=round(_emu_to_inch(shape.height), 2)
+    )
+    # Extract text content
+    if (elem_type == "textbox" or elem_type == "rectangle") and hasattr(shape, 'has_text_frame') and shape.has_text_frame:
+        elem.text = shape.text_frame.text
+
+        for para in shape.text_frame.paragraphs:
+            bullet_level = para.level if hasattr(para, 'level') else None
+
+            for run in para.runs:
+                # Use helper to resolve inherited styles
+                style = _get_effective_font_style(run, para)
+                if elem.main_font_size is None:
+                    elem.main_font_size = style['size'] if style['size'] is not None else elem.main_font_size
+                text_run = TextRun(
+                    text=run.text,
+                    bold=style['bold'],
+                    italic=style['italic'],
+                    underline=style['underline'],
+                    font_name=style['name'],
+                    font_size=style['size'],
+                    font_color=style['color_hex'],
+                    bullet_level=bullet_level
+                )
+                elem.runs.append(text_run)
+
+    # Extract shape fill
+    if hasattr(shape, 'fill'):
+        try:
+            if shape.fill.type == 1:  # SOLID
+                try:
+                    elem.fill_color = _rgb_to_hex(shape.fill.fore_color.rgb)
+                except AttributeError:
+                    if hasattr(shape.fill.fore_color, 'type') and shape.fill.fore_color.type == MSO_COLOR_TYPE.SCHEME:
+                         # Try to resolve theme color
+                         theme_color_idx = shape.fill.fore_color.theme_color
+                         if theme_color_idx in theme_color_map:
+                             elem.fill_color = theme_color_map[theme_color_idx]
+                         else:
+                             elem.fill_color = str(theme_color_idx)
+        except Exception:
+            pass
+
+    # Extract border info
+    if hasattr(shape, 'line'):
+        try:
+            # Check if line is solid (1) to ensure it's visible
+            if shape.line.fill.type == 1:
+                # Extract width first (independent of color)
+                if shape.line.width:
+                    elem.border_width = round(_emu_to_inch(shape.line.width), 2)
+
+                # Try to extract color (might fail for Theme colors)
+                try:
+                    elem.border_color = _rgb_to_hex(shape.line.color.rgb)
+                except AttributeError:
+                     if hasattr(shape.line.color, 'type') and shape.line.color.type == MSO_COLOR_TYPE.SCHEME:
+                         # Try to resolve theme color
+                         theme_color_idx = shape.line.color.theme_color
+                         if theme_color_idx in theme_color_map:
+                             elem.border_color = theme_color_map[theme_color_idx]
+                         else:
+                             elem.border_color = str(theme_color_idx)
+        except Exception:
+            pass
+
+    # Extract image path
+    if elem_type == "picture":
+        try:
+            image = shape.image
+            elem.image_path = image.filename if hasattr(image, 'filename') else None
+        except:
+            pass
+    return elem
+
 def parse_pptx_to_json(pptx_path: str) -> PosterJSON:
     """
     Parse PPTX file and extract all element properties as JSON.
@@ -269,8 +354,6 @@ def parse_pptx_to_json(pptx_path: str) -> PosterJSON:
     # Extract theme colors
     theme_color_map = _get_theme_colors(prs)
     
-    elements = []
-    
     element_counter = 2
 
     for shape in pptx_execuator.get_current_state().slide.shapes:
@@ -281,112 +364,7 @@ def parse_pptx_to_json(pptx_path: str) -> PosterJSON:
         # cNvPr.set("descr", str(shape.shape_id))
         # shape.element.set('descr', str(shape.shape_id))
         # shape._element.set('mytag', str(shape.shape_id))
-        # Determine element type
-        elem_type = "shape"
-        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-            elem_type = "picture"
-        elif shape.shape_type == MSO_SHAPE_TYPE.TABLE:
-            elem_type = "table"
-        elif shape.shape_type == MSO_SHAPE_TYPE.CHART:
-            elem_type = "chart"
-        elif shape.shape_type == MSO_SHAPE_TYPE.LINE:
-            elem_type = "line"
-        elif shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
-            if shape.auto_shape_type == MSO_AUTO_SHAPE_TYPE.RECTANGLE:
-                elem_type = "rectangle"
-            elif hasattr(shape, 'has_text_frame') and shape.has_text_frame:
-                elem_type = "textbox"
-        elif (hasattr(shape, 'has_text_frame') and shape.has_text_frame) or shape.shape_type == MSO_SHAPE_TYPE.GROUP:
-            elem_type = "textbox"
-        
-        # Base properties
-        elem = PosterElement(
-            id=shape.name,
-            # id=shape.name.split('_')[-1],
-            # id=shape._element.get_or_add_cNvPr().get("descr"),
-            # id=shape.element.get('descr'),
-            # id=shape._element.get('mytag'),
-            # id=str(shape.shape_id),
-            type=elem_type,
-            left=round(_emu_to_inch(shape.left), 2),
-            top=round(_emu_to_inch(shape.top), 2),
-            width=round(_emu_to_inch(shape.width), 2),
-            height=round(_emu_to_inch(shape.height), 2)
-        )
-        #print(shape.name)
-        # Extract text content
-        if (elem_type == "textbox" or elem_type == "rectangle") and hasattr(shape, 'has_text_frame') and shape.has_text_frame:
-            elem.text = shape.text_frame.text
-            
-            for para in shape.text_frame.paragraphs:
-                bullet_level = para.level if hasattr(para, 'level') else None
-                
-                for run in para.runs:
-                    # Use helper to resolve inherited styles
-                    style = _get_effective_font_style(run, para)
-                    if elem.main_font_size is None:
-                        elem.main_font_size = style['size'] if style['size'] is not None else elem.main_font_size
-                    text_run = TextRun(
-                        text=run.text,
-                        bold=style['bold'],
-                        italic=style['italic'],
-                        underline=style['underline'],
-                        font_name=style['name'],
-                        font_size=style['size'],
-                        font_color=style['color_hex'],
-                        bullet_level=bullet_level
-                    )
-                    elem.runs.append(text_run)
-        
-        # Extract shape fill
-        if hasattr(shape, 'fill'):
-            try:
-                if shape.fill.type == 1:  # SOLID
-                    try:
-                        elem.fill_color = _rgb_to_hex(shape.fill.fore_color.rgb)
-                    except AttributeError:
-                        if hasattr(shape.fill.fore_color, 'type') and shape.fill.fore_color.type == MSO_COLOR_TYPE.SCHEME:
-                             # Try to resolve theme color
-                             theme_color_idx = shape.fill.fore_color.theme_color
-                             if theme_color_idx in theme_color_map:
-                                 elem.fill_color = theme_color_map[theme_color_idx]
-                             else:
-                                 elem.fill_color = str(theme_color_idx)
-            except Exception:
-                pass
-        
-        # Extract border info
-        if hasattr(shape, 'line'):
-            try:
-                # Check if line is solid (1) to ensure it's visible
-                if shape.line.fill.type == 1:
-                    # Extract width first (independent of color)
-                    if shape.line.width:
-                        elem.border_width = round(_emu_to_inch(shape.line.width), 2)
-                    
-                    # Try to extract color (might fail for Theme colors)
-                    try:
-                        elem.border_color = _rgb_to_hex(shape.line.color.rgb)
-                    except AttributeError:
-                         if hasattr(shape.line.color, 'type') and shape.line.color.type == MSO_COLOR_TYPE.SCHEME:
-                             # Try to resolve theme color
-                             theme_color_idx = shape.line.color.theme_color
-                             if theme_color_idx in theme_color_map:
-                                 elem.border_color = theme_color_map[theme_color_idx]
-                             else:
-                                 elem.border_color = str(theme_color_idx)
-            except Exception:
-                pass
-
-        # Extract image path
-        if elem_type == "picture":
-            try:
-                image = shape.image
-                elem.image_path = image.filename if hasattr(image, 'filename') else None
-            except:
-                pass
-        
-        elements.append(elem)
+    elements = _slide_elements(slide, theme_color_map)
         
     pptx_execuator.get_current_state().shape_map = _element_to_shape_map
 
@@ -443,12 +421,14 @@ def parse_pptx_to_json(pptx_path: str) -> PosterJSON:
 #indent=2,
 
 
-def parse_pptx_to_json_for_review(pptx_path: str) -> PosterJSON:
+def parse_pptx_to_json_for_review(pptx_path: str, source=None) -> PosterJSON:
     """
     Parse PPTX file and extract all element properties as JSON.
     
     Args:
         pptx_path: Path to PPTX file
+        source: Optional file-like object to read instead of pptx_path (in-memory
+            PptxArtifact.stream()); pptx_path then only names the layout debug file
     
     Returns:
         PosterJSON object with all elements
@@ -456,121 +436,17 @@ def parse_pptx_to_json_for_review(pptx_path: str) -> PosterJSON:
     # global _element_to_shape_map
     # _element_to_shape_map.clear()
     _element_to_shape_map = {}
-    prs = pptx_execuator.get_current_state().prs = Presentation(pptx_path)
+    prs = pptx_execuator.get_current_state().prs = Presentation(source if source is not None else pptx_path)
     slide = pptx_execuator.get_current_state().slide = prs.slides[0]  # only process the first slide
     
     # Extract theme colors
     theme_color_map = _get_theme_colors(prs)
     
-    elements = []
-    
     element_counter = 2
 
     for shape in slide.shapes:
         _element_to_shape_map[shape.name] = shape # NOTE: difference with parse_pptx_to_json
-        # Assign element_id to shape.name for easier tracking
-        # print(shape.name)
-        # Determine element type
-        elem_type = "shape"
-        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-            elem_type = "picture"
-        elif shape.shape_type == MSO_SHAPE_TYPE.TABLE:
-            elem_type = "table"
-        elif shape.shape_type == MSO_SHAPE_TYPE.CHART:
-            elem_type = "chart"
-        elif shape.shape_type == MSO_SHAPE_TYPE.LINE:
-            elem_type = "line"
-        elif shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
-            if shape.auto_shape_type == MSO_AUTO_SHAPE_TYPE.RECTANGLE:
-                elem_type = "rectangle"
-            elif hasattr(shape, 'has_text_frame') and shape.has_text_frame:
-                elem_type = "textbox"
-        elif (hasattr(shape, 'has_text_frame') and shape.has_text_frame) or shape.shape_type == MSO_SHAPE_TYPE.GROUP:
-            elem_type = "textbox"
-        
-        # Base properties
-        elem = PosterElement(
-            id=shape.name,
-            type=elem_type,
-            left=round(_emu_to_inch(shape.left), 2),
-            top=round(_emu_to_inch(shape.top), 2),
-            width=round(_emu_to_inch(shape.width), 2),
-            height=round(_emu_to_inch(shape.height), 2)
-        )
-        #print(shape.name)
-        # Extract text content
-        if (elem_type == "textbox" or elem_type == "rectangle") and hasattr(shape, 'has_text_frame') and shape.has_text_frame:
-            elem.text = shape.text_frame.text
-            
-            for para in shape.text_frame.paragraphs:
-                bullet_level = para.level if hasattr(para, 'level') else None
-                
-                for run in para.runs:
-                    # Use helper to resolve inherited styles
-                    style = _get_effective_font_style(run, para)
-                    if elem.main_font_size is None:
-                        elem.main_font_size = style['size'] if style['size'] is not None else elem.main_font_size
-                    text_run = TextRun(
-                        text=run.text,
-                        bold=style['bold'],
-                        italic=style['italic'],
-                        underline=style['underline'],
-                        font_name=style['name'],
-                        font_size=style['size'],
-                        font_color=style['color_hex'],
-                        bullet_level=bullet_level
-                    )
-                    elem.runs.append(text_run)
-        
-        # Extract shape fill
-        if hasattr(shape, 'fill'):
-            try:
-                if shape.fill.type == 1:  # SOLID
-                    try:
-                        elem.fill_color = _rgb_to_hex(shape.fill.fore_color.rgb)
-                    except AttributeError:
-                        if hasattr(shape.fill.fore_color, 'type') and shape.fill.fore_color.type == MSO_COLOR_TYPE.SCHEME:
-                             # Try to resolve theme color
-                             theme_color_idx = shape.fill.fore_color.theme_color
-                             if theme_color_idx in theme_color_map:
-                                 elem.fill_color = theme_color_map[theme_color_idx]
-                             else:
-                                 elem.fill_color = str(theme_color_idx)
-            except:
-                pass
-        
-        # Extract border info
-        if hasattr(shape, 'line'):
-            try:
-                # Check if line is solid (1) to ensure it's visible
-                if shape.line.fill.type == 1:
-                    # Extract width first (independent of color)
-                    if shape.line.width:
-                        elem.border_width = round(_emu_to_inch(shape.line.width), 2)
-                    
-                    # Try to extract color (might fail for Theme colors)
-                    try:
-                        elem.border_color = _rgb_to_hex(shape.line.color.rgb)
-                    except AttributeError:
-                         if hasattr(shape.line.color, 'type') and shape.line.color.type == MSO_COLOR_TYPE.SCHEME:
-                             # Try to resolve theme color
-                             theme_color_idx = shape.line.color.theme_color
-                             if theme_color_idx in theme_color_map:
-                                 elem.border_color = theme_color_map[theme_color_idx]
-                             else:
-                                 elem.border_color = str(theme_color_idx)
-            except:
-                pass
-        
-        # Extract image path
-        if elem_type == "picture":
-            try:
-                image = shape.image
-                elem.image_path = image.filename if hasattr(image, 'filename') else None
-            except:
-                pass
-        
-        elements.append(elem)
+    elements = _slide_elements(slide, theme_color_map)
         
     pptx_execuator.get_current_state().shape_map = _element_to_shape_map
     
@@ -630,6 +506,52 @@ def parse_pptx_to_json_for_review(pptx_path: str) -> PosterJSON:
 
 
 
+
+def update_poster_json(previous: PosterJSON, changes: Dict) -> PosterJSON:
+    """
+    PosterJSON of the executor's in-memory slide after an API batch, without
+    saving and re-opening the PPTX.
+
+    Elements of `previous` that the batch did not touch are reused; touched and
+    created shapes are re-extracted, deleted ones drop out, and the order
+    follows the current z-order. Falls back to extracting every shape when
+    element ids are not unique. The result equals parse_pptx_to_json_for_review on the saved
+    file.
+
+    Args:
+        previous: PosterJSON of the slide before the batch (normalized)
+        changes: PosterState.changes() of the batch
+    """
+    state = pptx_execuator.get_current_state()
+    prs, slide = state.prs, state.slide
+
+    reuse = {}
+    if previous is not None and previous.elements :
+        reuse = {e.id: e for e in previous.elements}
+        if len(reuse) != len(previous.elements):
+            reuse = {}
+        for element_id in changes.get("touched", []) + changes.get("created", []):
+            reuse.pop(element_id, None)
+
+    elements = _slide_elements(slide, _get_theme_colors(prs), reuse=reuse)
+    # Only the re-extracted elements still need PosterFilter's cleanup; reused ones already had it
+    reused = set(map(id, reuse.values()))
+    elements = [e if id(e) in reused else PosterElement(**PosterFilter._remove_empty_values(e)) for e in elements]
+    return PosterJSON(
+        slide_width=round(_emu_to_inch(prs.slide_width), 2),
+        slide_height=round(_emu_to_inch(prs.slide_height), 2),
+        elements=elements,
+    )
+
+
+def write_poster_layout(poster_json: PosterJSON, pptx_path):
+    """Write the `<name>_poster_layout.json` debug file that parse_pptx_to_json_for_review leaves next to the PPTX."""
+    base_dir = os.path.dirname(pptx_path)
+    base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+    with open(os.path.join(base_dir, f"{base_name}_poster_layout.json"), 'w', encoding='utf-8') as f:
+        f.write(poster_json.model_dump_json(exclude_unset=True))
+
+
     
 
 if __name__ == "__main__":
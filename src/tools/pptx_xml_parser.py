@@ -0,0 +1,413 @@
+"""
+Single-pass lxml engine for PosterJSON extraction.
+
+`_shape_to_element` in pptx_parser goes through python-pptx proxies: every
+run builds a `_Run`/`Font`/`ColorFormat` chain, theme colors are discovered by
+catching AttributeError, and several getters silently add empty `a:rPr`,
+`a:pPr`, `a:ln` and `a:solidFill` elements to the slide as a side effect. On
+posters with thousands of runs that dominates parse time.
+
+This module reads the same information straight from the slide XML with
+XPath:
+
+- the theme color scheme is read once into a table (`theme_colors_from_xml`)
+- each paragraph's `a:defRPr` fallback is resolved once and shared by all of
+  its runs (`_paragraph_style`)
+- nothing is written back to the slide tree
+
+and emits the same PosterElement list, quirks included (see
+`_paragraph_style`), so it can replace the proxy walk without changing what
+the agents see. Shapes whose geometry is inherited (placeholders) or that the
+proxy walk handles specially (movies, content parts) are handed to a fallback.
+
+Entry points:
+    slide_elements_from_xml(slide, theme_colors)   # live python-pptx slide (executor state)
+    parse_pptx_xml(pptx_path)                      # read-only, straight from the zip
+"""
+import posixpath
+import zipfile
+from typing import Callable, Dict, List, Optional
+
+from lxml import etree
+from pptx.enum.dml import MSO_THEME_COLOR
+
+from ..schema import PosterElement, PosterJSON, TextRun
+
+NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_A = "{%s}" % NS["a"]
+_P = "{%s}" % NS["p"]
+
+_SHAPE_TAGS = {_P + "sp", _P + "grpSp", _P + "graphicFrame", _P + "cxnSp", _P + "pic", _P + "contentPart"}
+_EMU_PER_INCH = 914400
+_TRUE = {"1", "true"}
+
+_URI_CHART = "http://schemas.openxmlformats.org/drawingml/2006/chart"
+_URI_TABLE = "http://schemas.openxmlformats.org/drawingml/2006/table"
+
+_REL_THEME = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/theme"
+
+_THEME_SLOTS = {
+    "dk1": MSO_THEME_COLOR.DARK_1,
+    "lt1": MSO_THEME_COLOR.LIGHT_1,
+    "dk2": MSO_THEME_COLOR.DARK_2,
+    "lt2": MSO_THEME_COLOR.LIGHT_2,
+    "accent1": MSO_THEME_COLOR.ACCENT_1,
+    "accent2": MSO_THEME_COLOR.ACCENT_2,
+    "accent3": MSO_THEME_COLOR.ACCENT_3,
+    "accent4": MSO_THEME_COLOR.ACCENT_4,
+    "accent5": MSO_THEME_COLOR.ACCENT_5,
+    "accent6": MSO_THEME_COLOR.ACCENT_6,
+    "hlink": MSO_THEME_COLOR.HYPERLINK,
+    "folHlink": MSO_THEME_COLOR.FOLLOWED_HYPERLINK,
+}
+
+# Compiled once; reused for every shape / paragraph / run
+_X_XFRM = {
+    _P + "sp": etree.XPath("p:spPr/a:xfrm", namespaces=NS),
+    _P + "pic": etree.XPath("p:spPr/a:xfrm", namespaces=NS),
+    _P + "cxnSp": etree.XPath("p:spPr/a:xfrm", namespaces=NS),
+    _P + "grpSp": etree.XPath("p:grpSpPr/a:xfrm", namespaces=NS),
+    _P + "graphicFrame": etree.XPath("p:xfrm", namespaces=NS),
+}
+_X_PH = etree.XPath("./*[1]/p:nvPr/p:ph", namespaces=NS)
+_X_CNVPR = etree.XPath("./*[1]/p:cNvPr", namespaces=NS)
+_X_VIDEO = etree.XPath("./p:nvPicPr/p:nvPr/a:videoFile", namespaces=NS)
+_X_SPPR = etree.XPath("p:spPr", namespaces=NS)
+_X_TXBOX = etree.XPath("p:nvSpPr/p:cNvSpPr/@txBox", namespaces=NS)
+_X_PRST = etree.XPath("p:spPr/a:prstGeom", namespaces=NS)
+_X_CUSTGEOM = etree.XPath("p:spPr/a:custGeom", namespaces=NS)
+_X_GRAPHIC_URI = etree.XPath("a:graphic/a:graphicData/@uri", namespaces=NS)
+_X_PARAS = etree.XPath("p:txBody/a:p", namespaces=NS)
+_X_CLR_SCHEME = etree.XPath(".//a:clrScheme", namespaces=NS)
+
+
+def _is_true(value: Optional[str]) -> Optional[bool]:
+    return None if value is None else value in _TRUE
+
+
+def _inch(emu) -> float:
+    return round(float(emu) / _EMU_PER_INCH, 2)
+
+
+def theme_colors_from_xml(theme_element) -> Dict[int, str]:
+    """MSO_THEME_COLOR -> '#RRGGBB' for the color scheme of a parsed theme part."""
+    theme_colors = {}
+    schemes = _X_CLR_SCHEME(theme_element)
+    if not schemes:
+        return theme_colors
+    for child in schemes[0]:
+        tag = etree.QName(child).localname
+        if tag not in _THEME_SLOTS:
+            continue
+        srgb = child.find(".//a:srgbClr", NS)
+        sys_clr = child.find(".//a:sysClr", NS)
+        color_hex = srgb.get("val") if srgb is not None else (sys_clr.get("lastClr") if sys_clr is not None else None)
+        if color_hex:
+            theme_colors[_THEME_SLOTS[tag]] = f"#{color_hex}"
+    return theme_colors
+
+
+def _solid_color(parent, theme_colors: Dict[int, str]) -> Optional[str]:
+    """
+    Color of a `a:solidFill` child of `parent` the way pptx_parser reports
+    fills and borders: lowercase hex for sRGB, the theme table (or the enum's
+    str) for scheme colors, None otherwise.
+    """
+    solid = parent.find(_A + "solidFill")
+    if solid is None or len(solid) == 0:
+        return None
+    clr = solid[0]
+    if clr.tag == _A + "srgbClr":
+        return "#" + clr.get("val").lower()
+    if clr.tag == _A + "schemeClr":
+        try:
+            idx = MSO_THEME_COLOR.from_xml(clr.get("val"))
+        except ValueError:
+            return None
+        return theme_colors.get(idx, str(idx))
+    return None
+
+
+def _paragraph_style(p) -> Dict[str, object]:
+    """
+    Style table entry for one paragraph: the `a:pPr/a:defRPr` values its runs
+    fall back to. Mirrors `_get_effective_font_style`, including that a
+    defRPr without `a:latin` stops resolution before the color (the proxy
+    code raises there), so the color is only inherited when a latin
+    typeface is present or the run already names its font.
+    """
+    style = {"size": None, "bold": None, "italic": None, "underline": None,
+             "latin": None, "has_latin": False, "color_hex": None}
+    ppr = p.find(_A + "pPr")
+    defrpr = ppr.find(_A + "defRPr") if ppr is not None else None
+    if defrpr is None:
+        return style
+    sz = defrpr.get("sz")
+    if sz is not None:
+        style["size"] = float(int(sz)) / 100.0
+    style["bold"] = _is_true(defrpr.get("b"))
+    style["italic"] = _is_true(defrpr.get("i"))
+    if defrpr.get("u") is not None:
+        style["underline"] = True  # proxy code compares an enum with 'none' -> always True
+    latin = defrpr.find(_A + "latin")
+    if latin is not None:
+        style["has_latin"] = True
+        style["latin"] = latin.get("typeface")
+    srgb = defrpr.find(_A + "solidFill/" + _A + "srgbClr")
+    if srgb is not None and srgb.get("val"):
+        style["color_hex"] = f"#{srgb.get('val')}"
+    return style
+
+
+def _run_style(r, para_style: Dict[str, object]) -> Dict[str, object]:
+    rpr = r.find(_A + "rPr")
+    size = bold = italic = underline = name = color_hex = None
+    if rpr is not None:
+        sz = rpr.get("sz")
+        if sz is not None and int(sz):
+            size = int(sz) * 127 / 12700  # same Centipoints -> Emu -> pt path as Font.size
+        bold = _is_true(rpr.get("b"))
+        italic = _is_true(rpr.get("i"))
+        u = rpr.get("u")
+        if u is not None:
+            underline = u != "none"
+        latin = rpr.find(_A + "latin")
+        if latin is not None:
+            name = latin.get("typeface")
+        srgb = rpr.find(_A + "solidFill/" + _A + "srgbClr")
+        if srgb is not None:
+            color_hex = "#" + srgb.get("val").lower()
+
+    if size is None:
+        size = para_style["size"]
+    if bold is None:
+        bold = para_style["bold"]
+    if italic is None:
+        italic = para_style["italic"]
+    if underline is None:
+        underline = para_style["underline"]
+    if name is None:
+        if not para_style["has_latin"]:
+            # resolution stopped at the missing latin: no color fallback either
+            return {"size": size, "bold": bold, "italic": italic, "underline": underline, "name": None, "color_hex": color_hex}
+        name = para_style["latin"]
+    if color_hex is None:
+        color_hex = para_style["color_hex"]
+    return {"size": size, "bold": bold, "italic": italic, "underline": underline, "name": name, "color_hex": color_hex}
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for child in p:
+        tag = child.tag
+        if tag == _A + "r" or tag == _A + "fld":
+            t = child.find(_A + "t")
+            parts.append((t.text or "") if t is not None else "")
+        elif tag == _A + "br":
+            parts.append("\v")
+    return "".join(parts)
+
+
+def _fill_text(elem: PosterElement, sp):
+    paragraphs = _X_PARAS(sp)
+    if not paragraphs:
+        # python-pptx adds an empty txBody on access
+        elem.text = ""
+        return
+    elem.text = "\n".join(_paragraph_text(p) for p in paragraphs)
+    for p in paragraphs:
+        ppr = p.find(_A + "pPr")
+        bullet_level = int(ppr.get("lvl", 0)) if ppr is not None else 0
+        para_style = None
+        for r in p.iterchildren(_A + "r"):
+            if para_style is None:
+                para_style = _paragraph_style(p)
+            style = _run_style(r, para_style)
+            if elem.main_font_size is None:
+                elem.main_font_size = style["size"]
+            t = r.find(_A + "t")
+            elem.runs.append(TextRun(
+                text=(t.text or "") if t is not None else "",
+                bold=style["bold"],
+                italic=style["italic"],
+                underline=style["underline"],
+                font_name=style["name"],
+                font_size=style["size"],
+                font_color=style["color_hex"],
+                bullet_level=bullet_level,
+            ))
+
+
+def _element_type(shape_elm) -> Optional[str]:
+    """Same classification as `_shape_to_element`; None means 'use the fallback'."""
+    tag = shape_elm.tag
+    if tag == _P + "sp":
+        if _X_CUSTGEOM(shape_elm):
+            return "textbox"
+        prst = _X_PRST(shape_elm)
+        is_textbox = _is_true((_X_TXBOX(shape_elm) or [None])[0]) is True
+        if prst and not is_textbox:
+            return "rectangle" if prst[0].get("prst") == "rect" else "textbox"
+        if is_textbox:
+            return "textbox"
+        return None
+    if tag == _P + "pic":
+        return None if _X_VIDEO(shape_elm) else "picture"
+    if tag == _P + "graphicFrame":
+        uri = (_X_GRAPHIC_URI(shape_elm) or [None])[0]
+        return {_URI_CHART: "chart", _URI_TABLE: "table"}.get(uri, "shape")
+    if tag == _P + "cxnSp":
+        return "line"
+    if tag == _P + "grpSp":
+        return "textbox"
+    return None
+
+
+def shape_element_from_xml(shape_elm, theme_colors: Dict[int, str]) -> Optional[PosterElement]:
+    """PosterElement for one shape element of `p:spTree`, or None if it needs the proxy-based fallback."""
+    if _X_PH(shape_elm):
+        return None  # placeholder: geometry and type come from the layout
+    elem_type = _element_type(shape_elm)
+    if elem_type is None:
+        return None
+    xfrm = _X_XFRM[shape_elm.tag](shape_elm)
+    off = xfrm[0].find(_A + "off") if xfrm else None
+    ext = xfrm[0].find(_A + "ext") if xfrm else None
+    if off is None or ext is None:
+        return None
+    cnvpr = _X_CNVPR(shape_elm)[0]
+
+    elem = PosterElement(
+        id=cnvpr.get("name"),
+        type=elem_type,
+        left=_inch(off.get("x")),
+        top=_inch(off.get("y")),
+        width=_inch(ext.get("cx")),
+        height=_inch(ext.get("cy")),
+    )
+    sppr = _X_SPPR(shape_elm)  # empty for groups and graphic frames: no fill, no border
+    if shape_elm.tag == _P + "sp":
+        _fill_text(elem, shape_elm)
+        if sppr:
+            elem.fill_color = _solid_color(sppr[0], theme_colors)
+    if sppr:
+        ln = sppr[0].find(_A + "ln")
+        if ln is not None and ln.find(_A + "solidFill") is not None:
+            w = int(ln.get("w", 0))
+            if w:
+                elem.border_width = _inch(w)
+            elem.border_color = _solid_color(ln, theme_colors)
+    # image_path is not extracted: PosterFilter strips it from every PosterJSON
+    return elem
+
+
+def slide_elements_from_xml(slide, theme_colors: Dict[int, str],
+                            fallback: Optional[Callable] = None,
+                            reuse: Optional[Dict[str, PosterElement]] = None) -> List[PosterElement]:
+    """
+    PosterElements for every top-level shape of a python-pptx slide, read from
+    its lxml tree. `fallback(shape)` (default: pptx_parser._shape_to_element)
+    handles the shapes this engine leaves to python-pptx. Shapes whose name
+    is in `reuse` are not extracted; the given element is used as is.
+    """
+    spTree = slide.element.find("p:cSld/p:spTree", NS)
+    elements, pending = [], {}
+    for shape_elm in spTree.iterchildren():
+        if shape_elm.tag not in _SHAPE_TAGS:
+            continue
+        if reuse:
+            cached = reuse.get(_X_CNVPR(shape_elm)[0].get("name"))
+            if cached is not None:
+                elements.append(cached)
+                continue
+        elem = shape_element_from_xml(shape_elm, theme_colors)
+        if elem is None:
+            pending[len(elements)] = int(_X_CNVPR(shape_elm)[0].get("id"))
+        elements.append(elem)
+
+    if pending:
+        if fallback is None:
+            from .pptx_parser import _shape_to_element as fallback_fn
+            fallback = lambda shape: fallback_fn(shape, theme_colors)
+        by_id = {shape.shape_id: shape for shape in slide.shapes}
+        for pos, shape_id in pending.items():
+            elements[pos] = fallback(by_id[shape_id])
+    return elements
+
+
+def _read_rels(zf: zipfile.ZipFile, part_name: str) -> Dict[str, tuple]:
+    """rId -> (reltype, absolute part name) for one package part."""
+    rels_name = posixpath.join(posixpath.dirname(part_name), "_rels", posixpath.basename(part_name) + ".rels")
+    if rels_name not in zf.namelist():
+        return {}
+    rels = {}
+    for rel in etree.fromstring(zf.read(rels_name)).iterfind("rel:Relationship", NS):
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), rel.get("Target")))
+        rels[rel.get("Id")] = (rel.get("Type"), target)
+    return rels
+
+
+def parse_pptx_xml(pptx_path, use_shape_ids: bool = False) -> PosterJSON:
+    """
+    Read-only PosterJSON of the first slide straight from the package zip.
+
+    Does not load a Presentation or touch the executor state. With
+    `use_shape_ids`, element ids are the shape ids (what parse_pptx_to_json
+    renames shapes to); otherwise the shape names, as in
+    parse_pptx_to_json_for_review. Shapes that need the python-pptx fallback
+    trigger a lazy Presentation load.
+    """
+    from .pptx_parser import PosterFilter, _shape_to_element
+
+    with zipfile.ZipFile(pptx_path) as zf:
+        pres_name = "ppt/presentation.xml"
+        pres = etree.fromstring(zf.read(pres_name))
+        pres_rels = _read_rels(zf, pres_name)
+
+        sld_size = pres.find("p:sldSz", NS)
+        first_slide = pres.find("p:sldIdLst/p:sldId", NS)
+        slide_name = pres_rels[first_slide.get("{%s}id" % NS["r"])][1]
+        first_master = pres.find("p:sldMasterIdLst/p:sldMasterId", NS)
+        master_name = pres_rels[first_master.get("{%s}id" % NS["r"])][1]
+
+        theme_colors = {}
+        for reltype, target in _read_rels(zf, master_name).values():
+            if reltype == _REL_THEME:
+                theme_colors = theme_colors_from_xml(etree.fromstring(zf.read(target)))
+                break
+
+        sld = etree.fromstring(zf.read(slide_name))
+
+    spTree = sld.find("p:cSld/p:spTree", NS)
+    elements, pending = [], []
+    for shape_elm in spTree.iterchildren():
+        if shape_elm.tag not in _SHAPE_TAGS:
+            continue
+        elem = shape_element_from_xml(shape_elm, theme_colors)
+        shape_id = _X_CNVPR(shape_elm)[0].get("id")
+        if elem is None:
+            pending.append((len(elements), int(shape_id)))
+        elif use_shape_ids:
+            elem.id = shape_id
+        elements.append(elem)
+
+    if pending:
+        from pptx import Presentation
+        by_id = {shape.shape_id: shape for shape in Presentation(pptx_path).slides[0].shapes}
+        for pos, shape_id in pending:
+            elem = _shape_to_element(by_id[shape_id], theme_colors)
+            if use_shape_ids:
+                elem.id = str(shape_id)
+            elements[pos] = elem
+
+    poster_json = PosterJSON(
+        slide_width=_inch(sld_size.get("cx")),
+        slide_height=_inch(sld_size.get("cy")),
+        elements=elements,
+    )
+    return PosterJSON(**PosterFilter._remove_empty_values(poster_json))
@@ -0,0 +1,196 @@
+"""
+Content-addressed render cache.
+
+Renders are keyed by the SHA-256 of the PPTX bytes plus the render options
+(format, DPI, engine), so two byte-identical posters stored under different paths
+(e.g. the `input.pptx` copy made for a backend continuation) share one render,
+and a modified poster can never be served a stale PNG that happens to have the
+same basename.
+
+Entries live as flat files `<key>.<fmt>` under RENDER_CACHE_DIR. An in-process
+OrderedDict tracks them in LRU order; the directory is bounded by
+RENDER_CACHE_MAX_BYTES and the least recently used entries are evicted first.
+Derived files (render_pyramid variants, image_ingest results) share the same
+bound through `lookup` / `read_bytes` / `store_bytes`.
+Other processes sharing the directory are picked up lazily on lookup.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from ..config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+
+_CHUNK = 1 << 20
+
+
+class RenderCache:
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # entry file name -> size, oldest first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for f in self.cache_dir.iterdir():
+            if f.is_file() and not f.name.startswith("."):
+                st = f.stat()
+                entries.append((st.st_mtime, f.name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total += size
+
+    @staticmethod
+    def key_for(pptx_path, fmt: str = "png", dpi: Optional[int] = None, engine: str = "libreoffice") -> str:
+        """Hash of the file bytes and every option that changes the rendered output."""
+        h = hashlib.sha256()
+        with open(pptx_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                h.update(chunk)
+        h.update(f"|fmt={fmt}|dpi={dpi}|engine={engine}".encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def key_for_bytes(data: bytes, fmt: str = "png", dpi: Optional[int] = None, engine: str = "libreoffice") -> str:
+        """key_for on PPTX bytes held in memory (same key as for a file with these bytes)."""
+        h = hashlib.sha256(data)
+        h.update(f"|fmt={fmt}|dpi={dpi}|engine={engine}".encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def _entry_name(key: str, fmt: str) -> str:
+        return f"{key}.{fmt.split(':')[0]}"
+
+    @staticmethod
+    def _place(src: Path, dst: Path):
+        """Atomically put a copy of `src` at `dst` (hard link when possible, no extra I/O)."""
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def _touch(self, name: str, count: bool = True) -> bool:
+        """Mark an entry as most recently used; False (and forget it) if it is not on disk."""
+        entry = self.cache_dir / name
+        with self._lock:
+            if not entry.exists():
+                if name in self._index:
+                    self._total -= self._index.pop(name)
+                if count:
+                    self.misses += 1
+                return False
+            if name not in self._index:
+                # Written by another process sharing the cache dir.
+                size = entry.stat().st_size
+                self._index[name] = size
+                self._total += size
+            self._index.move_to_end(name)
+            if count:
+                self.hits += 1
+        return True
+
+    def fetch(self, key: str, target, fmt: str = "png") -> bool:
+        """Materialize the cached render at `target`. Returns False on a miss."""
+        name = self._entry_name(key, fmt)
+        entry = self.cache_dir / name
+        if not self._touch(name):
+            return False
+        try:
+            os.utime(entry)  # keep on-disk recency roughly in sync for other processes
+            self._place(entry, Path(target))
+        except FileNotFoundError:
+            # Evicted by another process between the check and the link.
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return False
+        return True
+
+    def lookup(self, key: str, fmt: str) -> Optional[Path]:
+        """
+        Path of a derived entry (pyramid variant, ingested image), marked as recently used;
+        None on a miss. Not counted in the render hit / miss stats.
+        """
+        name = self._entry_name(key, fmt)
+        return self.cache_dir / name if self._touch(name, count=False) else None
+
+    def read_bytes(self, key: str, fmt: str) -> Optional[bytes]:
+        """Bytes of a derived entry, or None on a miss (see `lookup`)."""
+        entry = self.lookup(key, fmt)
+        if entry is None:
+            return None
+        try:
+            return entry.read_bytes()
+        except FileNotFoundError:  # evicted in between
+            return None
+
+    def store_bytes(self, key: str, data: bytes, fmt: str) -> Path:
+        """Add a derived entry under the same size bound as renders; returns its path."""
+        name = self._entry_name(key, fmt)
+        entry = self.cache_dir / name
+        tmp = entry.with_name(f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, entry)
+        self._add(name, len(data))
+        return entry
+
+    def store(self, key: str, rendered_path, fmt: str = "png"):
+        """Add a fresh render to the cache and evict LRU entries over the size bound."""
+        name = self._entry_name(key, fmt)
+        entry = self.cache_dir / name
+        self._place(Path(rendered_path), entry)
+        self._add(name, entry.stat().st_size)
+
+    def _add(self, name: str, size: int):
+        with self._lock:
+            self._total -= self._index.pop(name, 0)
+            self._index[name] = size
+            self._total += size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                (self.cache_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_CACHE: Optional[RenderCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    """Process-wide cache, created on first use."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = RenderCache()
+    return _CACHE
@@ -0,0 +1,435 @@
+"""
+Persistent LibreOffice render workers.
+
+Every call to `soffice --convert-to` used to cold-start a brand-new LibreOffice
+process with a fresh user profile, which costs seconds per render. Here we keep
+a small pool of long-lived headless instances instead. Each worker owns a
+private user profile; a conversion is issued by a light-weight `soffice` client
+started with the *same* profile, which hands the request to the warm instance
+over LibreOffice's single-instance IPC pipe and returns once it is done.
+
+Workers are health-checked before use and periodically while idle. A worker
+whose process died, or which did not finish a conversion within the timeout,
+is killed (whole process group, soffice spawns soffice.bin) and restarted.
+
+`RenderPool.aconvert` is the event-loop friendly variant used by the async
+graph nodes and the backend: the forwarding client runs under
+`asyncio.create_subprocess_exec`, at most `size` async renders are in flight
+per loop, and a timed-out or cancelled render kills its worker so it is
+restarted cleanly on next checkout.
+"""
+import asyncio
+import atexit
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..config import (
+    RENDER_POOL_SIZE,
+    RENDER_TIMEOUT_S,
+    RENDER_STARTUP_TIMEOUT_S,
+    RENDER_HEALTH_INTERVAL_S,
+    RENDER_MAX_JOBS_PER_WORKER,
+)
+
+
+def find_soffice() -> Optional[str]:
+    """Find LibreOffice soffice executable."""
+    env_path = os.environ.get("LIBREOFFICE_PATH")
+    candidates = []
+
+    if env_path:
+        candidates.append(env_path)
+
+    if sys.platform.startswith("win"):
+        candidates += [
+            r"C:\Program Files\LibreOffice\program\soffice.exe",
+            r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+        ]
+    else:
+        candidates += ["soffice", "/usr/bin/soffice", "/usr/local/bin/soffice"]
+
+    for c in candidates:
+        if Path(c).exists():
+            return str(Path(c))
+        which = shutil.which(c)
+        if which:
+            return which
+    return None
+
+
+class RenderError(RuntimeError):
+    """A worker could not produce the requested output."""
+
+
+# soffice is a launcher: the real soffice.bin is a child that inherits our pipes,
+# so every process is started in its own session and killed as a group.
+_SESSION_KWARGS = {"start_new_session": True} if os.name == "posix" else {}
+
+
+def _kill_tree(proc):
+    """SIGKILL a Popen / asyncio Process together with its children."""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class LibreOfficeWorker:
+    """One warm headless soffice instance bound to its own user profile."""
+
+    def __init__(self, soffice: str, index: int):
+        self.soffice = soffice
+        self.index = index
+        self.profile_dir = Path(tempfile.gettempdir()) / f"lo_pool_{os.getpid()}_{index}_{uuid.uuid4().hex[:8]}"
+        self.proc: Optional[subprocess.Popen] = None
+        self.jobs_done = 0
+        self.restarts = 0
+
+    @property
+    def profile_uri(self) -> str:
+        # LibreOffice expects a file:// URI. Also, it must be absolute.
+        return self.profile_dir.resolve().as_uri()
+
+    def _base_args(self) -> List[str]:
+        return [
+            self.soffice,
+            f"-env:UserInstallation={self.profile_uri}",
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nofirststartwizard",
+            "--norestore",
+        ]
+
+    def is_alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, startup_timeout: float = RENDER_STARTUP_TIMEOUT_S):
+        """Launch the instance and wait until its profile lock shows up (IPC pipe is ready by then)."""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.proc = subprocess.Popen(
+            self._base_args() + ["--nodefault"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **_SESSION_KWARGS,
+        )
+        self.jobs_done = 0
+
+        lock_file = self.profile_dir / ".lock"
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RenderError(f"soffice worker #{self.index} exited during startup (code {self.proc.returncode})")
+            if lock_file.exists():
+                return
+            time.sleep(0.1)
+        self.stop()
+        raise RenderError(f"soffice worker #{self.index} not ready after {startup_timeout:.0f}s")
+
+    def stop(self):
+        """Kill the instance together with the soffice.bin child it spawned."""
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            _kill_tree(self.proc)
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc = None
+        # A killed instance leaves its lock behind; the next start would refuse the profile.
+        try:
+            (self.profile_dir / ".lock").unlink()
+        except FileNotFoundError:
+            pass
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def ensure_healthy(self):
+        if not self.is_alive() or self.jobs_done >= RENDER_MAX_JOBS_PER_WORKER:
+            if self.proc is not None:
+                self.restarts += 1
+            self.stop()
+            self.start()
+
+    def _convert_cmd(self, src_path: str, out_dir: str, fmt: str) -> List[str]:
+        return self._base_args() + ["--convert-to", fmt, "--outdir", out_dir, src_path]
+
+    def _produced(self, src_path: str, out_dir: str, fmt: str) -> Path:
+        self.jobs_done += 1
+        base_name = os.path.splitext(os.path.basename(src_path))[0]
+        produced = Path(out_dir) / f"{base_name}.{fmt.split(':')[0]}"
+        if not produced.exists():
+            raise RenderError(f"soffice worker #{self.index} produced no output for {src_path}")
+        return produced
+
+    def convert(self, src_path: str, out_dir: str, fmt: str, timeout: float) -> Path:
+        """Forward one conversion to the warm instance; returns the produced file."""
+        cmd = self._convert_cmd(src_path, out_dir, fmt)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **_SESSION_KWARGS)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_tree(proc)
+            proc.communicate()
+            raise
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        return self._produced(src_path, out_dir, fmt)
+
+    async def aconvert(self, src_path: str, out_dir: str, fmt: str, timeout: float) -> Path:
+        """Async `convert`: the client process is killed on timeout or cancellation."""
+        cmd = self._convert_cmd(src_path, out_dir, fmt)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **_SESSION_KWARGS
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            _kill_tree(proc)
+            await proc.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except asyncio.CancelledError:
+            _kill_tree(proc)
+            raise
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+        return self._produced(src_path, out_dir, fmt)
+
+    def cleanup(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class RenderPool:
+    """Fixed-size pool of LibreOffice workers shared by the whole process."""
+
+    def __init__(self, size: int = RENDER_POOL_SIZE, timeout: float = RENDER_TIMEOUT_S, soffice: Optional[str] = None):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.soffice = soffice or find_soffice()
+        if not self.soffice:
+            raise EnvironmentError("未检测到 LibreOffice，请确保命令行可执行 `soffice`")
+        self._workers = [LibreOfficeWorker(self.soffice, i) for i in range(self.size)]
+        self._idle: "queue.Queue[LibreOfficeWorker]" = queue.Queue()
+        for w in self._workers:
+            self._idle.put(w)
+        self._closed = False
+        self._async_sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._stop_event = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="render-pool-health", daemon=True)
+        self._monitor.start()
+
+    def _checkout(self, timeout: Optional[float]) -> LibreOfficeWorker:
+        if self._closed:
+            raise RenderError("render pool is shut down")
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RenderError(f"no render worker became free within {timeout:.0f}s")
+        try:
+            worker.ensure_healthy()
+        except Exception:
+            self._idle.put(worker)
+            raise
+        return worker
+
+    def _checkin(self, worker: LibreOfficeWorker):
+        self._idle.put(worker)
+
+    async def _acheckout(self, timeout: Optional[float]) -> LibreOfficeWorker:
+        """
+        `_checkout` in a thread, safe against cancellation: a worker the thread checks
+        out after the awaiting task was cancelled goes straight back to the pool.
+        """
+        lock = threading.Lock()
+        handoff = {"worker": None, "abandoned": False}
+
+        def checkout():
+            worker = self._checkout(timeout)
+            with lock:
+                if handoff["abandoned"]:
+                    self._checkin(worker)
+                else:
+                    handoff["worker"] = worker
+            return worker
+
+        try:
+            return await asyncio.to_thread(checkout)
+        except asyncio.CancelledError:
+            with lock:
+                handoff["abandoned"] = True
+                worker, handoff["worker"] = handoff["worker"], None
+            if worker is not None:
+                self._checkin(worker)
+            raise
+
+    def _stop_and_checkin(self, worker: LibreOfficeWorker):
+        try:
+            worker.stop()
+        finally:
+            self._checkin(worker)
+
+    @staticmethod
+    def _target(pptx_path: str, output_dir, fmt: str, target_path) -> Path:
+        if target_path:
+            return Path(target_path)
+        base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+        return Path(output_dir) / f"{base_name}.{fmt.split(':')[0]}"
+
+    def convert(self, pptx_path, output_dir, fmt: str = "png", timeout: Optional[float] = None, attempts: int = 3, target_path=None) -> Path:
+        """
+        Convert `pptx_path` into `output_dir`/<basename>.<fmt> (or `target_path`) on a pooled worker.
+
+        A private scratch directory is used per call so concurrent renders of
+        files that share a basename (poster_v1.pptx of different jobs) never
+        clobber each other.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        pptx_path = str(Path(pptx_path).resolve())
+        target = self._target(pptx_path, output_dir, fmt, target_path)
+
+        last_err: Optional[Exception] = None
+        for attempt in range(1, attempts + 1):
+            worker = self._checkout(timeout)
+            scratch = tempfile.mkdtemp(prefix="lo_out_")
+            try:
+                produced = worker.convert(pptx_path, scratch, fmt, timeout)
+                shutil.move(str(produced), str(target))
+                return target
+            except subprocess.TimeoutExpired as e:
+                last_err = e
+                print(f"[WARN] soffice worker #{worker.index} hung (>{timeout:.0f}s), restarting (attempt {attempt}/{attempts})")
+                worker.stop()
+            except (subprocess.CalledProcessError, RenderError) as e:
+                last_err = e
+                stderr = getattr(e, "stderr", "") or ""
+                print(f"[WARN] soffice 转换失败 (attempt {attempt}/{attempts}). {e}\n{stderr}")
+                worker.stop()
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+                self._checkin(worker)
+        raise last_err  # type: ignore[misc]
+
+    def _async_sem(self) -> asyncio.Semaphore:
+        # One semaphore per event loop: asyncio primitives cannot be shared across loops.
+        loop = asyncio.get_running_loop()
+        sem = self._async_sems.get(loop)
+        if sem is None:
+            sem = self._async_sems[loop] = asyncio.Semaphore(self.size)
+        return sem
+
+    async def aconvert(self, pptx_path, output_dir, fmt: str = "png", timeout: Optional[float] = None, attempts: int = 3, target_path=None) -> Path:
+        """
+        Async `convert` that never blocks the event loop.
+
+        Concurrency is bounded by the pool size, so waiting renders queue on
+        the semaphore instead of parking executor threads. Worker checkout (which
+        may have to start soffice) and teardown run in a thread.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        pptx_path = str(Path(pptx_path).resolve())
+        target = self._target(pptx_path, output_dir, fmt, target_path)
+
+        last_err: Optional[Exception] = None
+        async with self._async_sem():
+            for attempt in range(1, attempts + 1):
+                worker = await self._acheckout(timeout)
+                scratch = tempfile.mkdtemp(prefix="lo_out_")
+                stopping = False
+                try:
+                    produced = await worker.aconvert(pptx_path, scratch, fmt, timeout)
+                    shutil.move(str(produced), str(target))
+                    return target
+                except subprocess.TimeoutExpired as e:
+                    last_err = e
+                    print(f"[WARN] soffice worker #{worker.index} hung (>{timeout:.0f}s), restarting (attempt {attempt}/{attempts})")
+                    await asyncio.to_thread(worker.stop)
+                except (subprocess.CalledProcessError, RenderError) as e:
+                    last_err = e
+                    stderr = getattr(e, "stderr", "") or ""
+                    print(f"[WARN] soffice 转换失败 (attempt {attempt}/{attempts}). {e}\n{stderr}")
+                    await asyncio.to_thread(worker.stop)
+                except asyncio.CancelledError:
+                    # The warm instance may still be busy with the abandoned document: stop it off the
+                    # loop (a cancelled task cannot await) and check it in once it is down
+                    stopping = True
+                    threading.Thread(target=self._stop_and_checkin, args=(worker,),
+                                     name=f"render-worker-{worker.index}-stop", daemon=True).start()
+                    raise
+                finally:
+                    shutil.rmtree(scratch, ignore_errors=True)
+                    if not stopping:
+                        self._checkin(worker)
+        raise last_err  # type: ignore[misc]
+
+    def health_check(self) -> Dict[int, bool]:
+        """Restart idle workers whose process died. Busy workers are checked on their next checkout."""
+        status = {}
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if worker.proc is not None and not worker.is_alive():
+                    print(f"[WARN] soffice worker #{worker.index} crashed, restarting")
+                    worker.restart()
+                status[worker.index] = worker.is_alive()
+            except Exception as e:
+                print(f"[WARN] soffice worker #{worker.index} restart failed: {e}")
+                status[worker.index] = False
+            finally:
+                self._idle.put(worker)
+        return status
+
+    def _monitor_loop(self):
+        while not self._stop_event.wait(RENDER_HEALTH_INTERVAL_S):
+            self.health_check()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "alive": sum(w.is_alive() for w in self._workers),
+            "jobs_done": sum(w.jobs_done for w in self._workers),
+            "restarts": sum(w.restarts for w in self._workers),
+        }
+
+    def shutdown(self):
+        self._closed = True
+        self._stop_event.set()
+        for w in self._workers:
+            w.cleanup()
+
+
+_POOL: Optional[RenderPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    """Process-wide pool, created on first use."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = RenderPool()
+                atexit.register(_POOL.shutdown)
+    return _POOL
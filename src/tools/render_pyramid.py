@@ -0,0 +1,115 @@
+"""
+Multi-resolution render pyramid and compact VLM image payloads.
+
+A full LibreOffice render of a poster is several MB of PNG, i.e. megabytes of
+base64 per message, which dominates upload time and VLM prefill. Every render
+therefore gets a pyramid:
+
+    thumb   long side PYRAMID_THUMB_PX   (layout at a glance)
+    review  long side PYRAMID_REVIEW_PX  (text readable; what agents normally get)
+    full    native resolution
+
+each encodable as WebP, JPEG or 256-color quantized PNG. A variant is encoded
+on first request and stored in the render cache (keyed by the hash of the
+source image, level, format and quality), under the same LRU size bound as
+the renders, so a render shared through the cache is only downscaled and
+encoded once per variant actually sent.
+
+Agents ask for a level and a byte budget through `image_data_url`; if the
+encoded image is over budget, quality is lowered first, then resolution.
+"""
+import base64
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+from ..config import (
+    PYRAMID_THUMB_PX,
+    PYRAMID_REVIEW_PX,
+    VLM_IMAGE_FORMAT,
+    VLM_IMAGE_QUALITY,
+)
+from .render_cache import get_render_cache
+
+LEVELS = ["full", "review", "thumb"]  # largest first
+_LEVEL_PX = {"thumb": PYRAMID_THUMB_PX, "review": PYRAMID_REVIEW_PX, "full": None}
+_MIME = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+_QUALITY_STEPS = [90, 80, 70, 55, 40]
+
+
+def _image_key(image_path) -> str:
+    h = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = BytesIO()
+    if fmt == "webp":
+        img.convert("RGB").save(buf, format="WEBP", quality=quality, method=4)
+    elif fmt == "jpeg":
+        img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    elif fmt == "png":
+        img.convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG", optimize=True)
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return buf.getvalue()
+
+
+def _resize(img: Image.Image, level: str) -> Image.Image:
+    max_px = _LEVEL_PX[level]
+    if max_px is None or max(img.size) <= max_px:
+        return img
+    scale = max_px / max(img.size)
+    return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+
+
+def pyramid_variant(image_path, level: str = "review", fmt: str = VLM_IMAGE_FORMAT, quality: int = VLM_IMAGE_QUALITY, _key: Optional[str] = None) -> bytes:
+    """Encoded bytes of one pyramid level, served from / written to the render cache."""
+    if level not in _LEVEL_PX:
+        raise ValueError(f"Unknown pyramid level: {level} (expected one of {LEVELS})")
+    q = quality if fmt != "png" else 0
+    key = f"{_key or _image_key(image_path)}.{level}.q{q}"
+    cache = get_render_cache()
+    data = cache.read_bytes(key, fmt)
+    if data is not None:
+        return data
+
+    with Image.open(image_path) as img:
+        data = _encode(_resize(img, level), fmt, quality)
+    cache.store_bytes(key, data, fmt)
+    return data
+
+
+def encode_image_payload(image_path, level: str = "review", max_bytes: Optional[int] = None, fmt: Optional[str] = None):
+    """
+    Pick the best variant within budget.
+
+    Starts at `level` and VLM_IMAGE_QUALITY; over budget, lower the quality
+    (lossy formats) and then step down the pyramid. The smallest variant is
+    returned if nothing fits.
+
+    Returns:
+        (bytes, mime type, level actually used)
+    """
+    fmt = fmt or VLM_IMAGE_FORMAT
+    key = _image_key(image_path)
+    qualities = ([VLM_IMAGE_QUALITY] + [q for q in _QUALITY_STEPS if q < VLM_IMAGE_QUALITY]) if fmt != "png" else [0]
+
+    data, used = b"", level
+    for lvl in LEVELS[LEVELS.index(level):]:
+        for q in qualities:
+            data, used = pyramid_variant(image_path, lvl, fmt, q, _key=key), lvl
+            if max_bytes is None or len(data) <= max_bytes:
+                return data, _MIME[fmt], used
+    return data, _MIME[fmt], used
+
+
+def image_data_url(image_path, level: str = "review", max_bytes: Optional[int] = None, fmt: Optional[str] = None) -> str:
+    """`data:` URL of the poster image at the requested level and byte budget, for image_url message parts."""
+    data, mime, _ = encode_image_payload(image_path, level, max_bytes, fmt)
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
@@ -0,0 +1,235 @@
+"""
+Text measurement with real font metrics.
+
+Fonts are located on the system (Arial falls back to the metric-compatible
+Liberation Sans, then DejaVu Sans / Helvetica) and loaded through Pillow.
+Each font face gets one advance table in em units, filled lazily per
+character and per word. Advances scale linearly with the font size, so a
+single table serves every size. Kerning is ignored, as in PowerPoint text
+boxes by default.
+
+`layout_text` wraps paragraphs the way PowerPoint does:
+- break at spaces, with trailing spaces not counted against the line width;
+- break between CJK characters;
+- split words wider than a line by character;
+- an empty paragraph still takes one line.
+It returns the exact line count and the text-frame height. When no font file
+is found at all, it falls back to the old average-width estimate
+(0.55 em per character).
+"""
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import ImageFont
+
+_FONT_DIRS = [
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+]
+_FALLBACK_FAMILIES = ["Arial", "Liberation Sans", "DejaVu Sans", "Helvetica"]
+_STYLE_SUFFIXES = {
+    (False, False): ["", "regular", "r"],
+    (True, False): ["bold", "bd", "b"],
+    (False, True): ["italic", "oblique", "i"],
+    (True, True): ["bolditalic", "boldoblique", "bi", "z"],
+}
+
+# PowerPoint defaults for a text box
+INSET_LR_IN = 0.1          # bodyPr lIns / rIns
+INSET_TB_IN = 0.05         # bodyPr tIns / bIns
+LINE_SPACING = 1.2         # single line spacing, as a multiple of the font size
+LEVEL_INDENT_IN = 0.5      # marL per outline level (default text style)
+_FALLBACK_EM_PER_CHAR = 0.55
+_REF_PX = 2048             # advances are measured once at this size and kept in em
+
+_TOKEN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]|[^\s\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]+\s*|\s+")
+
+
+def _norm(name: str) -> str:
+    return re.sub(r"[\s_\-]", "", name).lower()
+
+
+@lru_cache(maxsize=1)
+def _font_index() -> Dict[str, str]:
+    """Normalized font file stem -> path, for every TrueType/OpenType file on the system."""
+    index = {}
+    for root_dir in _FONT_DIRS:
+        if not os.path.isdir(root_dir):
+            continue
+        for root, _, files in os.walk(root_dir):
+            for f in files:
+                stem, ext = os.path.splitext(f)
+                if ext.lower() in (".ttf", ".otf", ".ttc"):
+                    index.setdefault(_norm(stem), os.path.join(root, f))
+    return index
+
+
+@lru_cache(maxsize=256)
+def _find_font_file(family: Optional[str], bold: bool, italic: bool) -> Optional[str]:
+    index = _font_index()
+    families = ([family] if family else []) + _FALLBACK_FAMILIES
+    for fam in families:
+        base = _norm(fam)
+        for suffix in _STYLE_SUFFIXES[(bold, italic)]:
+            path = index.get(base + suffix)
+            if path:
+                return path
+    if bold or italic:
+        return _find_font_file(family, False, False)
+    return None
+
+
+@lru_cache(maxsize=1024)
+def get_font(family: Optional[str], size_px: int, bold: bool = False, italic: bool = False) -> ImageFont.ImageFont:
+    """Pillow font for a (family, pixel size, style); falls back to a sans font, then Pillow's built-in one."""
+    size_px = max(1, size_px)
+    path = _find_font_file(family, bold, italic)
+    if path:
+        try:
+            return ImageFont.truetype(path, size_px)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size=size_px)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+class FontMetrics:
+    """Advance widths (in em) of one font face; per-character and per-token tables are filled on first use."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._font = ImageFont.truetype(path, _REF_PX) if path else None
+        self._chars: Dict[str, float] = {}
+        self._tokens: Dict[str, float] = {}
+
+    def char_em(self, ch: str) -> float:
+        em = self._chars.get(ch)
+        if em is None:
+            if self._font is None:
+                em = _FALLBACK_EM_PER_CHAR
+            elif unicodedata.east_asian_width(ch) in ("W", "F") and not self._has_glyph(ch):
+                em = 1.0  # full-width glyph missing from this face: PowerPoint substitutes a CJK font
+            else:
+                em = self._font.getlength(ch) / _REF_PX
+            self._chars[ch] = em
+        return em
+
+    def _has_glyph(self, ch: str) -> bool:
+        try:
+            return self._font.getmask(ch).getbbox() is not None
+        except Exception:
+            return False
+
+    def text_em(self, text: str) -> float:
+        em = self._tokens.get(text)
+        if em is None:
+            em = sum(self.char_em(c) for c in text)
+            if len(self._tokens) < 50000:
+                self._tokens[text] = em
+        return em
+
+
+@lru_cache(maxsize=256)
+def font_metrics(family: Optional[str], bold: bool = False, italic: bool = False) -> FontMetrics:
+    path = _find_font_file(family, bold, italic)
+    try:
+        return FontMetrics(path)
+    except OSError:
+        return FontMetrics(None)
+
+
+# ----------------------------------------------------------------------------
+# layout
+# ----------------------------------------------------------------------------
+
+Run = Tuple[str, bool]  # (text, bold)
+Paragraph = Union[str, Sequence[Run]]
+
+
+@dataclass
+class TextLayout:
+    lines: int
+    line_counts: List[int]  # lines per paragraph
+    text_height_pt: float   # lines * line height
+    height_in: float        # text height plus top/bottom insets: the height of a shape that fits the text
+
+
+def markdown_runs(line: str) -> List[Run]:
+    """Split '**bold**' markup into (text, bold) runs, as _apply_markdown_bold writes them."""
+    return [(part[2:-2], True) if part.startswith("**") and part.endswith("**") and len(part) >= 4 else (part, False)
+            for part in re.split(r"(\*\*.*?\*\*)", line) if part]
+
+
+def paragraph_level(line: str) -> int:
+    """Outline level the text APIs assign from a leading bullet marker."""
+    return 1 if line.lstrip().startswith("◦") else 0
+
+
+def count_lines(runs: Sequence[Run], avail_pt: float, font_size: float, font_name: Optional[str] = "Arial",
+                italic: bool = False) -> int:
+    """Lines one paragraph wraps to in `avail_pt` of width."""
+    avail_em = max(avail_pt / font_size, 1e-6)
+    lines, line_em = 1, 0.0
+    for text, bold in runs:
+        metrics = font_metrics(font_name, bool(bold), italic)
+        for tok in _TOKEN.findall(text):
+            w = metrics.text_em(tok)
+            w_trim = metrics.text_em(tok.rstrip()) if tok[-1:].isspace() else w
+            if line_em > 0 and line_em + w_trim > avail_em:
+                lines += 1
+                line_em = 0.0
+                if not w_trim:
+                    continue  # spaces at a break are swallowed
+            if w_trim > avail_em:
+                # word wider than a line: break between characters
+                for ch in tok:
+                    cw = metrics.char_em(ch)
+                    if line_em > 0 and line_em + cw > avail_em and not ch.isspace():
+                        lines += 1
+                        line_em = 0.0
+                    line_em += cw
+                continue
+            line_em += w
+    return lines
+
+
+def layout_text(paragraphs: Sequence[Paragraph], width_in: float, font_size: float,
+                font_name: Optional[str] = "Arial", bold: bool = False, italic: bool = False,
+                levels: Optional[Sequence[int]] = None, line_spacing: float = LINE_SPACING,
+                inset_lr_in: float = INSET_LR_IN, inset_tb_in: float = INSET_TB_IN) -> TextLayout:
+    """
+    Wrap paragraphs into a text box `width_in` wide.
+
+    Each paragraph is a plain string (styled with `bold`) or a list of (text, bold) runs.
+    """
+    font_size = font_size or 18.0
+    counts = []
+    for k, para in enumerate(paragraphs):
+        runs = [(para, bold)] if isinstance(para, str) else list(para)
+        level = levels[k] if levels is not None else 0
+        avail_pt = max((width_in - 2 * inset_lr_in - level * LEVEL_INDENT_IN) * 72, 1.0)
+        counts.append(count_lines(runs, avail_pt, font_size, font_name, italic))
+    total = sum(counts)
+    text_height_pt = total * font_size * line_spacing
+    return TextLayout(lines=total, line_counts=counts, text_height_pt=text_height_pt,
+                      height_in=text_height_pt / 72.0 + 2 * inset_tb_in)
+
+
+def layout_markdown_text(text: str, width_in: float, font_size: float, font_name: Optional[str] = "Arial",
+                         bold: bool = False, italic: bool = False) -> TextLayout:
+    """layout_text for the '\\n'-separated, '**bold**'-marked text the text APIs accept."""
+    lines = text.split("\n")
+    paragraphs = [[(t, b or bold) for t, b in markdown_runs(line)] for line in lines]
+    return layout_text(paragraphs, width_in, font_size, font_name, italic=italic,
+                       levels=[paragraph_level(line) for line in lines])
@@ -3,10 +3,14 @@ import os
 import json
 import time
 import random
+import sqlite3
 import asyncio
 import json_repair
 from pydantic import parse_obj_as
 
+from .llm_cache import get_llm_cache
+from .llm_limiter import get_limiter
+
 _MAX_INVOKE_RETRIES = int(os.getenv("MAX_INVOKE_RETRIES", "10"))
 _INVOKE_BACKOFF_BASE_S = float(os.getenv("INVOKE_BACKOFF_BASE_S", "1.0"))
 _INVOKE_BACKOFF_MAX_S = float(os.getenv("INVOKE_BACKOFF_MAX_S", "8.0"))
@@ -59,12 +63,35 @@ def _backoff_sleep_s(attempt: int) -> float:
     jitter = random.uniform(0.4, 0.6 * base)
     return base + jitter
 
+def _cached_response(llm, prompt):
+    """(cache key, cached response) for this call; key None when LLM_CACHE_MODE is off."""
+    cache = get_llm_cache()
+    if not cache.enabled:
+        return None, None
+    key = cache.key(llm, prompt)
+    return key, cache.lookup(key)
+
+
+def _store_response(key, response):
+    if key is not None:
+        try:
+            get_llm_cache().store(key, response)
+        except (sqlite3.Error, OSError) as e:
+            print(f"[WARN] LLM 响应缓存写入失败: {e}")
+    return response
+
+
 def _invoke_with_retries(llm, prompt, *, logger=None, max_retries: int | None = None, config=None):
+    key, cached = _cached_response(llm, prompt)
+    if cached is not None:
+        return cached
     n = _MAX_INVOKE_RETRIES if max_retries is None else max_retries
     last_err: Exception | None = None
     for attempt in range(n):
         try:
-            return llm.invoke(prompt, config=config)
+            with get_limiter(llm).slot(prompt) as slot:
+                response = slot.record(llm.invoke(prompt, config=config))
+            return _store_response(key, response)
         except Exception as e:
             last_err = e
             status = _get_http_status_code(e)
@@ -90,11 +117,16 @@ def _invoke_with_retries(llm, prompt, *, logger=None, max_retries: int | None =
 
 
 async def _ainvoke_with_retries(llm, prompt, *, logger=None, max_retries: int | None = None, config=None):
+    key, cached = _cached_response(llm, prompt)
+    if cached is not None:
+        return cached
     n = _MAX_INVOKE_RETRIES if max_retries is None else max_retries
     last_err: Exception | None = None
     for attempt in range(n):
         try:
-            return await llm.ainvoke(prompt, config=config)
+            async with get_limiter(llm).slot(prompt) as slot:
+                response = slot.record(await llm.ainvoke(prompt, config=config))
+            return _store_response(key, response)
         except Exception as e:
             last_err = e
             status = _get_http_status_code(e)
@@ -267,12 +299,44 @@ def extract_llm_result(model, prompt, llm, Schema, logger=None,):
     
     return result
 
+async def aextract_llm_result(model, prompt, llm, Schema, logger=None):
+    """
+    Async-native extract_llm_result: same model branches and JSON repair, but the
+    call is awaited (_ainvoke_with_retries, asyncio.sleep backoff) instead of
+    blocking a thread. Raises when the response cannot be parsed into `Schema`.
+    """
+    if model == 'glm-4.5v':
+        response = await _ainvoke_with_retries(llm, prompt, logger=logger, max_retries=_MAX_INVOKE_RETRIES)
+        if logger:
+            logger.info(f"Raw model output{response.content}")
+        return parse_obj_as(Schema, extract_json_from_glm_output(response.content))
+    if 'qwen' in model or 'Qwen' in model or model in ['qvq-max-latest', 'gemini-3-flash-preview']:
+        response = await _ainvoke_with_retries(llm, prompt, logger=logger, max_retries=_MAX_INVOKE_RETRIES)
+        if logger:
+            logger.info(f"Raw model output{response}")
+        try:
+            result_json = extract_json_from_qwen_output(_response_to_text(response))
+        except Exception as e:
+            print(f"aextract_llm_result: error in extract_json_from_qwen_output: {e}")
+            raise
+        return parse_obj_as(Schema, result_json)
+
+    structured_llm = llm.with_structured_output(Schema, method='json_schema')
+    try:
+        return await structured_llm.ainvoke(prompt)
+    except Exception:
+        if logger:
+            logger.info("aextract_llm_result: error, retry")
+        return await structured_llm.ainvoke(prompt)
+
+
 def _invoke_with_retries_judge(llm, prompt, *, logger=None, max_retries: int | None = None, Schema=None, config=None):
     n = _MAX_INVOKE_RETRIES if max_retries is None else max_retries
     last_err: Exception | None = None
     for attempt in range(n):
         try:
-            response_text =  llm.invoke(prompt, config=config)
+            with get_limiter(llm).slot(prompt) as slot:
+                response_text = slot.record(llm.invoke(prompt, config=config))
             # result_json = extract_json_from_qwen_output(response_text.content)
             # result = parse_obj_as(Schema, result_json)
             return response_text
@@ -311,6 +375,16 @@ def extract_llm_result_judge(model, prompt, llm, Schema, logger=None,):
             return response_text
     return result
 
+async def aextract_llm_result_judge(model, prompt, llm, Schema, logger=None):
+    """Async-native extract_llm_result_judge: the raw response is returned when it cannot be parsed."""
+    response = await _ainvoke_with_retries(llm, prompt, logger=logger, max_retries=10)
+    try:
+        return parse_obj_as(Schema, extract_json_from_qwen_output(_response_to_text(response)))
+    except Exception as e:
+        print(f"aextract_llm_result_judge: error in extract_json_from_qwen_output: {e}")
+        print(response)
+        return response
+
 if __name__ == "__main__":
     raw_output = """
     ```json
@@ -319,4 +393,4 @@ if __name__ == "__main__":
     """
     extracted_output = extract_json_from_qwen_output(raw_output)
 
-    print(extracted_output)
\ No newline at end of file
+    print(extracted_output)
@@ -6,7 +6,6 @@ import re
 import argparse
 import tempfile
 import uvicorn
-import subprocess
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
@@ -18,6 +17,8 @@ from pydantic import BaseModel
 # from .src.tools.pptx_execuator import _state_context_var, PosterState
 from src.tools.pptx_execuator import _state_context_var, PosterState
 from src.config import MAX_ITERATIONS
+from src.tools.render_pool import find_soffice
+from src.tools.image_tools import aconvert_pptx_to_png
 # Add src to path so we can import from src
 sys.path.insert(0, str(Path(__file__).parent))
 
@@ -57,30 +58,6 @@ edit_jobs: Dict[str, Dict[str, Any]] = {}
 edit_logs: Dict[str, List[str]] = {}
 previews: Dict[str, Path] = {}
 
-def find_soffice() -> Optional[str]:
-    """Find LibreOffice soffice executable."""
-    env_path = os.environ.get("LIBREOFFICE_PATH")
-    candidates = []
-    
-    if env_path:
-        candidates.append(env_path)
-    
-    if sys.platform.startswith("win"):
-        candidates += [
-            r"C:\Program Files\LibreOffice\program\soffice.exe",
-            r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-        ]
-    else:
-        candidates += ["soffice", "/usr/bin/soffice", "/usr/local/bin/soffice"]
-    
-    for c in candidates:
-        if Path(c).exists():
-            return str(Path(c))
-        which = shutil.which(c)
-        if which:
-            return which
-    return None
-
 def add_log(job_id: str, message: str):
     """Helper to append logs to a job."""
     if job_id not in edit_logs:
@@ -107,21 +84,9 @@ async def upload_pptx_preview(file: UploadFile = File(...)):
         if not soffice_path:
             raise Exception("LibreOffice not found in system paths")
 
-        # Command to convert PPTX to PNG using LibreOffice with robust flags
-        subprocess_cmd = [
-            soffice_path, "--headless", "--invisible", "--nologo", 
-            "--nofirststartwizard", "--norestore", "--convert-to", "png", 
-            "--outdir", str(PREVIEW_DIR), str(pptx_path)
-        ]
-        
-        # Run conversion with timeout
-        subprocess.run(subprocess_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120)
-        
-        # LibreOffice names output as filename.png
-        generated_png = PREVIEW_DIR / (pptx_path.stem + ".png")
-        if generated_png.exists():
-            shutil.move(generated_png, png_path)
-        else:
+        # Convert through the shared render cache / warm LibreOffice pool
+        await aconvert_pptx_to_png(pptx_path, output_path=str(png_path))
+        if not png_path.exists():
             raise Exception("Preview generation failed - output file not found")
             
     except Exception as e:
@@ -354,12 +319,7 @@ async def run_apex_task(job_id: str, pptx_path: Path, instruction: str, pdf_path
                 # Generate PNG if not exists
                 if soffice_path and not png_path.exists():
                     try:
-                        subprocess.run(
-                            [soffice_path, "--headless", "--invisible", "--nologo",
-                             "--nofirststartwizard", "--norestore", "--convert-to", "png",
-                             "--outdir", str(job_dir), str(pptx_file)],
-                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120
-                        )
+                        await aconvert_pptx_to_png(pptx_file)
                     except Exception as e:
                         add_log(job_id, f"Warning: PNG generation failed for {pptx_file.name}: {e}")
                 